@@ -0,0 +1,555 @@
+# core/api.py
+"""Optional JSON API over the calc and storage core (stdlib ``http.server``).
+
+    python -m core.api --port 8765
+
+Endpoints (JSON in and out; after login send ``Authorization: Bearer <token>``):
+
+    POST   /api/login                {"username", "password"} -> {"token", "user"}
+    GET    /api/session              -> {"user", "unread", "version"}
+    POST   /api/logout
+    GET    /api/entries              -> {"entries", "version"}
+    POST   /api/entries              entry fields -> {"entry", "version"}
+    PUT    /api/entries/<id>         changed fields; ``If-Match: <version>`` for a CAS
+    DELETE /api/entries/<id>
+    GET    /api/metrics              per-entry rate/progress/next due + monthly total
+    GET    /api/saldo                ?category=&account= -> {"month": [...], "saldo": [...]}
+    GET    /api/notifications        ?limit=&entry_id= -> newest first, rendered
+    POST   /api/notifications/read
+    POST   /api/batch                {"requests": [{"method", "path", "body"}]}, one transaction;
+                                     the first failing call (status >= 400) rolls back all of them
+
+Connections are HTTP/1.1 keep-alive, one thread each. Tokens and data keys
+live only in this process (:class:`SessionKeyStore`). Derived values are cached
+per entries version and month, so repeated reads neither decrypt nor recompute.
+No TLS: bind to localhost or put it behind the app's reverse proxy, and list
+that proxy in ``"api_trusted_proxies"`` so its ``X-Real-IP``/``X-Forwarded-For``
+is used for the login backoff (other clients cannot set their address).
+"""
+from __future__ import annotations
+import argparse, hashlib, json, re, threading, uuid
+from datetime import date
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from i18n import get_text
+from .auth import (
+    find_user, get_user_prefs, kdf_verify_password, login_backoff_remaining, note_login,
+    record_login_result, unlock_user,
+)
+from .calc import calculate_saldo_over_time, entry_metrics
+from .config import load_settings
+from .crypto import KDFBusyError
+from .cycles import turnus_label
+from .due_index import drop_calendars
+from .fileio import ConflictError, run_in_transaction
+from .notify import (
+    NOTIF_RETENTION_MONTHS, notify_on_add, notify_on_delete, notify_on_update, render_note,
+    run_notification_pass,
+)
+from .sessions import SESSION_IDLE_TTL_S, SessionKeyStore, client_binding, forwarded_client_ip
+from .storage import (
+    UserStore, append_notifications, entries_version, iter_notifications, load_entries,
+    load_entries_versioned, mark_notifications_read, purge_entry_notifications, save_entries,
+    unread_notifications, update_entries,
+)
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_MAX_BODY = 1 << 20
+API_BATCH_MAX = 50
+API_CACHE_MAX = 256
+API_WRITE_RETRIES = 3
+API_KEEPALIVE_S = 30.0
+NOTES_PAGE_MAX = 500
+
+_MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+_ENTRY_FIELDS: Dict[str, tuple] = {
+    "name": (str,), "amount": (int, float), "konto": (str,), "category": (str,), "cycle": (str,),
+    "custom_cycle": (int, type(None)), "due_month": (int,), "start_date": (str,), "end_date": (str, type(None)),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _BatchAborted(Exception):
+    """A batch call failed; raised inside the transaction so nothing of the batch is committed."""
+
+
+@dataclass
+class Call:
+    """One request as seen by a route handler."""
+
+    server: "ApiServer"
+    method: str
+    params: Tuple[str, ...]
+    query: Dict[str, str]
+    body: Any
+    headers: Dict[str, str]
+    client_ip: Optional[str] = None
+    user: Dict = field(default_factory=dict)
+    key: Optional[bytes] = None
+
+    @property
+    def username(self) -> str:
+        return self.user["username"]
+
+    def prefs(self) -> Dict:
+        settings = load_settings()
+        prefs = get_user_prefs(self.username)
+        return {"language": settings.get("language", "de"), "currency": settings.get("currency", "€"), **prefs}
+
+
+_ROUTES: List[Tuple[str, re.Pattern, Callable[[Call], Tuple[int, Any]], bool]] = []
+
+
+def _route(method: str, pattern: str, auth: bool = True):
+    def deco(fn):
+        _ROUTES.append((method, re.compile(f"^{pattern}$"), fn, auth))
+        return fn
+    return deco
+
+
+def _pw_tag(user: Dict) -> str:
+    # Passwortwechsel macht den Schlüssel des Tokens ungültig
+    return hashlib.sha256(str(user.get("pw_hash", "")).encode("utf-8")).hexdigest()[:16]
+
+
+# --------- Cache abgeleiteter Werte (pro Prozess, je Entries-Version) ---------
+class _Cache:
+    def __init__(self, max_items: int = API_CACHE_MAX):
+        self.max_items = max_items
+        self._items: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        value = build()
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def drop_user(self, username: str) -> None:
+        with self._lock:
+            for k in [k for k in self._items if k[0] == username]:
+                del self._items[k]
+
+
+def _month() -> str:
+    # Raten, Fälligkeiten und Saldo hängen vom aktuellen Monat ab
+    return date.today().strftime("%Y-%m")
+
+
+def _forget_user(server: "ApiServer", username: str) -> None:
+    server.cache.drop_user(username)
+    drop_calendars(UserStore(username).cache_key)
+
+
+def _entries(c: Call) -> Tuple[List[Dict], Optional[str]]:
+    version = entries_version(c.username)
+    entries = c.server.cache.get((c.username, version, "entries"), lambda: load_entries(c.username, c.key))
+    return entries, version
+
+
+def _metrics(entries: List[Dict], lang: str) -> Dict:
+    custom = get_text(lang, "custom_cycle_label")
+    items = [{**entry_metrics(e, lang), "turnus": turnus_label(e, lang, custom)} for e in entries]
+    return {"entries": items, "monthly_total": round(sum(m["rate"] for m in items), 2)}
+
+
+# --------- Login / Session ---------
+@_route("POST", "/api/login", auth=False)
+def _login(c: Call):
+    body = c.body if isinstance(c.body, dict) else {}
+    username, pw = str(body.get("username") or ""), str(body.get("password") or "")
+    wait = login_backoff_remaining(username, c.client_ip)
+    if wait > 0:
+        return 429, {"error": "login backoff", "retry_after": int(wait) + 1}
+    u = find_user(username)
+    ok = bool(u and u.get("active") and kdf_verify_password(pw, u.get("pw_hash", "")))
+    record_login_result(username, c.client_ip, ok)
+    if not ok:
+        raise ApiError(401, "login failed")
+    note_login(u["username"])
+    _kek, data_key = unlock_user(u, pw)
+    user = {"username": u["username"], "role": u.get("role", "user"), "pw": _pw_tag(find_user(username) or u)}
+    token = c.server.sessions.create(user, data_key, client_binding(c.headers.get("user-agent")))
+    return 200, {"token": token, "user": {k: user[k] for k in ("username", "role")}}
+
+
+@_route("GET", "/api/session")
+def _session(c: Call):
+    return 200, {
+        "user": {k: c.user[k] for k in ("username", "role")},
+        "unread": unread_notifications(c.username, c.key),
+        "version": entries_version(c.username),
+    }
+
+
+@_route("POST", "/api/logout")
+def _logout(c: Call):
+    c.server.sessions.drop(_bearer(c.headers))
+    _forget_user(c.server, c.username)
+    return 200, {"ok": True}
+
+
+# --------- Entries ---------
+def _entry_from_body(body: Any, base: Optional[Dict] = None) -> Dict:
+    if not isinstance(body, dict):
+        raise ApiError(400, "JSON object expected")
+    entry = dict(base or {"konto": "", "category": "", "custom_cycle": None, "end_date": None})
+    for k, v in body.items():
+        if k == "id":
+            continue
+        if k not in _ENTRY_FIELDS or isinstance(v, bool) or not isinstance(v, _ENTRY_FIELDS[k]):
+            raise ApiError(400, f"invalid field: {k}")
+        entry[k] = v
+    missing = [k for k in ("name", "amount", "cycle", "start_date") if k not in entry]
+    if missing:
+        raise ApiError(400, f"missing fields: {', '.join(missing)}")
+    entry["name"] = entry["name"].strip()
+    if not entry["name"] or entry["amount"] < 0:
+        raise ApiError(400, "invalid name or amount")
+    entry["amount"] = float(entry["amount"])
+    for k in ("start_date", "end_date"):
+        if entry.get(k) is not None and not _MONTH_RE.match(entry[k]):
+            raise ApiError(400, f"{k} must be YYYY-MM")
+    entry.setdefault("due_month", int(entry["start_date"][5:7]))
+    if not 1 <= entry["due_month"] <= 12:
+        raise ApiError(400, "due_month must be 1-12")
+    return entry
+
+
+def _write_entries(c: Call, mutate: Callable[[List[Dict]], List[Dict]]) -> None:
+    """``If-Match`` present: compare-and-swap against that version, otherwise retrying update."""
+    expected = c.headers.get("if-match")
+    if not expected:
+        update_entries(c.username, mutate, c.key)
+        return
+    entries, version = load_entries_versioned(c.username, c.key)
+    if version != expected.strip('"'):
+        raise ConflictError(c.username)
+    save_entries(c.username, mutate(entries), c.key, expected_etag=version)
+
+
+def _in_transaction(c: Call, work: Callable[[], Any]) -> Any:
+    """Run a write in one transaction; without ``If-Match`` a commit conflict repeats it."""
+    return run_in_transaction(work, retries=0 if c.headers.get("if-match") else API_WRITE_RETRIES)
+
+
+def _append(c: Call) -> Callable[[List[Dict]], None]:
+    return lambda notes: append_notifications(c.username, notes, c.key)
+
+
+@_route("GET", "/api/entries")
+def _list_entries(c: Call):
+    entries, version = _entries(c)
+    return 200, {"entries": entries, "version": version}
+
+
+@_route("POST", "/api/entries")
+def _create_entry(c: Call):
+    entry = {**_entry_from_body(c.body), "id": str(uuid.uuid4())}
+    lang = c.prefs()["language"]
+
+    def _work() -> None:
+        _write_entries(c, lambda es: es + [entry])
+        notify_on_add(_append(c), entry, lang)
+
+    _in_transaction(c, _work)
+    return 201, {"entry": entry, "version": entries_version(c.username)}
+
+
+@_route("PUT", r"/api/entries/([\w-]+)")
+def _update_entry(c: Call):
+    eid = c.params[0]
+    found: Dict[str, Dict] = {}
+
+    def _replace(es: List[Dict]) -> List[Dict]:
+        out = []
+        for e in es:
+            if e.get("id") == eid:
+                found["old"], e = e, {**_entry_from_body(c.body, base=e), "id": eid}
+                found["new"] = e
+            out.append(e)
+        if "old" not in found:
+            raise ApiError(404, "entry not found")
+        return out
+
+    prefs = c.prefs()
+
+    def _work() -> None:
+        found.clear()
+        _write_entries(c, _replace)
+        notify_on_update(_append(c), found["old"], found["new"], prefs["language"], prefs)
+
+    _in_transaction(c, _work)
+    return 200, {"entry": found["new"], "version": entries_version(c.username)}
+
+
+@_route("DELETE", r"/api/entries/([\w-]+)")
+def _delete_entry(c: Call):
+    eid = c.params[0]
+    deleted: List[Dict] = []
+
+    def _remove(es: List[Dict]) -> List[Dict]:
+        deleted[:] = [e for e in es if e.get("id") == eid]
+        if not deleted:
+            raise ApiError(404, "entry not found")
+        return [e for e in es if e.get("id") != eid]
+
+    def _work() -> None:
+        _write_entries(c, _remove)
+        purge_entry_notifications(c.username, eid, c.key)
+        notify_on_delete(_append(c), deleted[-1])
+
+    _in_transaction(c, _work)
+    return 200, {"deleted": eid, "version": entries_version(c.username)}
+
+
+# --------- abgeleitete Werte ---------
+@_route("GET", "/api/metrics")
+def _get_metrics(c: Call):
+    entries, version = _entries(c)
+    lang = c.prefs()["language"]
+    payload = c.server.cache.get((c.username, version, "metrics", lang, _month()), lambda: _metrics(entries, lang))
+    return 200, {**payload, "version": version}
+
+
+@_route("GET", "/api/saldo")
+def _get_saldo(c: Call):
+    entries, version = _entries(c)
+    lang = c.prefs()["language"]
+    category, account = c.query.get("category"), c.query.get("account")
+
+    def _build() -> Dict:
+        chosen = [e for e in entries
+                  if (category is None or e.get("category", "") == category)
+                  and (account is None or e.get("konto", "") == account)]
+        df = calculate_saldo_over_time(chosen, lang)
+        return {"month": df["month"].tolist(), "saldo": [round(float(x), 2) for x in df["saldo"]]}
+
+    payload = c.server.cache.get((c.username, version, "saldo", lang, _month(), category, account), _build)
+    return 200, {**payload, "version": version}
+
+
+# --------- Notifications ---------
+@_route("GET", "/api/notifications")
+def _get_notifications(c: Call):
+    prefs = c.prefs()
+    settings = load_settings()
+    # wie in der App ohne Scheduler: Watermarks machen den Pass meist zum No-op
+    run_in_transaction(lambda: run_notification_pass(
+        UserStore(c.username, c.key), prefs["language"], prefs=prefs,
+        retention_months=int(settings.get("notif_retention_months", NOTIF_RETENTION_MONTHS)),
+    ), retries=API_WRITE_RETRIES)
+    try:
+        limit = max(1, min(NOTES_PAGE_MAX, int(c.query.get("limit", 50))))
+    except ValueError:
+        raise ApiError(400, "limit must be an integer")
+    notes = islice(iter_notifications(c.username, c.key, c.query.get("entry_id")), limit)
+    return 200, {
+        "notifications": [{**n, "text": render_note(n, prefs["language"], prefs["currency"])} for n in notes],
+        "unread": unread_notifications(c.username, c.key),
+    }
+
+
+@_route("POST", "/api/notifications/read")
+def _read_notifications(c: Call):
+    mark_notifications_read(c.username, c.key)
+    return 200, {"unread": 0}
+
+
+@_route("POST", "/api/batch")
+def _batch(c: Call):
+    reqs = (c.body or {}).get("requests") if isinstance(c.body, dict) else None
+    if not isinstance(reqs, list) or len(reqs) > API_BATCH_MAX:
+        raise ApiError(400, f"'requests' must be a list of at most {API_BATCH_MAX} calls")
+    out: List[Dict] = []
+
+    def _work() -> None:
+        out.clear()
+        for r in reqs:
+            r = r if isinstance(r, dict) else {}
+            method, path = str(r.get("method", "GET")).upper(), str(r.get("path", ""))
+            if urlsplit(path).path == "/api/batch":
+                status, body = 400, {"error": "nested batch"}
+            else:
+                status, body = dispatch(c.server, method, path, r.get("body"), c.headers, c.client_ip)
+            out.append({"status": status, "body": body})
+            if status >= 400:
+                # bereits gestagte Schreibzugriffe (auch des fehlgeschlagenen Aufrufs) verwerfen
+                raise _BatchAborted()
+
+    # ein Commit (und eine fsync-Runde) für alle Schreibzugriffe des Batches
+    try:
+        _in_transaction(c, _work)
+    except _BatchAborted:
+        return out[-1]["status"], {"error": "batch rolled back", "failed": len(out) - 1, "responses": out}
+    return 200, {"responses": out}
+
+
+# --------- Dispatch ---------
+def _bearer(headers: Dict[str, str]) -> str:
+    auth = headers.get("authorization", "")
+    return auth[7:].strip() if auth[:7].lower() == "bearer " else ""
+
+
+def _authenticate(c: Call) -> None:
+    token = _bearer(c.headers)
+    found = c.server.sessions.resume(token, client_binding(c.headers.get("user-agent"))) if token else None
+    if found is None:
+        raise ApiError(401, "not logged in")
+    user, key = found
+    u = find_user(user["username"])
+    if not u or not u.get("active") or _pw_tag(u) != user.get("pw"):
+        # deaktiviert, gelöscht oder Passwort geändert
+        c.server.sessions.drop(token)
+        _forget_user(c.server, user["username"])
+        raise ApiError(401, "session revoked")
+    c.user, c.key = user, key
+
+
+def dispatch(server: "ApiServer", method: str, path: str, body: Any, headers: Dict[str, str],
+             client_ip: Optional[str] = None) -> Tuple[int, Any]:
+    """Route one call; returns ``(status, payload)``. ``headers`` keys are lower-case."""
+    parts = urlsplit(path)
+    query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+    known_path = False
+    for m, pattern, fn, auth in _ROUTES:
+        match = pattern.match(parts.path)
+        if not match:
+            continue
+        known_path = True
+        if m != method:
+            continue
+        c = Call(server, method, match.groups(), query, body, headers, client_ip)
+        try:
+            if auth:
+                _authenticate(c)
+            return fn(c)
+        except ApiError as ex:
+            return ex.status, {"error": str(ex)}
+        except ConflictError:
+            return 409, {"error": "conflict", "version": entries_version(c.username) if c.user else None}
+        except KDFBusyError:
+            return 503, {"error": "server busy"}
+        except Exception as ex:
+            server.log_error(f"{method} {parts.path}: {ex!r}")
+            return 500, {"error": "internal error"}
+    return (405, {"error": "method not allowed"}) if known_path else (404, {"error": "not found"})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, Antworten immer mit Content-Length
+    server_version = "ruecklagenplaner-api"
+    timeout = API_KEEPALIVE_S
+    disable_nagle_algorithm = True  # Header und Body sind getrennte Writes (sonst ~40 ms Delayed-ACK)
+
+    def _handle(self) -> None:
+        server: ApiServer = self.server  # type: ignore[assignment]
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Rest des Streams ist nicht abgrenzbar: Verbindung schließen
+            self.close_connection = True
+            return self._send(400, {"error": "invalid Content-Length"})
+        if length > API_MAX_BODY:
+            self.close_connection = True
+            return self._send(413, {"error": "body too large"})
+        raw = self.rfile.read(length) if length else b""
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        try:
+            body = json.loads(raw.decode("utf-8")) if raw else None
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON"})
+        ip = server.client_ip(self.client_address[0], headers)
+        self._send(*dispatch(server, self.command, self.path, body, headers, ip))
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def _send(self, status: int, payload: Any) -> None:
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:  # type: ignore[attr-defined]
+            super().log_message(format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """JSON API server; ``sessions`` defaults to a private :class:`SessionKeyStore`.
+
+    ``trusted_proxies`` (default: ``"api_trusted_proxies"``) are the peer
+    addresses whose forwarding headers are believed.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = API_HOST, port: int = API_PORT,
+                 sessions: Optional[SessionKeyStore] = None, verbose: bool = False,
+                 trusted_proxies: Optional[List[str]] = None):
+        super().__init__((host, port), _Handler)
+        settings = load_settings()
+        idle = float(settings.get("session_idle_ttl_min", SESSION_IDLE_TTL_S / 60)) * 60
+        self.sessions = sessions if sessions is not None else SessionKeyStore(idle_ttl=idle)
+        self.cache = _Cache()
+        self.verbose = verbose
+        if trusted_proxies is None:
+            trusted_proxies = settings.get("api_trusted_proxies") or []
+        self.trusted_proxies = frozenset(str(p) for p in trusted_proxies)
+
+    def client_ip(self, peer: str, headers: Dict[str, str]) -> str:
+        return forwarded_client_ip(peer, headers, self.trusted_proxies)
+
+    def log_error(self, format: str, *args) -> None:
+        if self.verbose:
+            print(format % args if args else format, flush=True)
+
+    def start(self) -> threading.Thread:
+        th = threading.Thread(target=self.serve_forever, name="json-api", daemon=True)
+        th.start()
+        return th
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    settings = load_settings()
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default=settings.get("api_host", API_HOST))
+    ap.add_argument("--port", type=int, default=int(settings.get("api_port", API_PORT)))
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    server = ApiServer(args.host, args.port, verbose=args.verbose)
+    print(f"JSON API on http://{args.host}:{server.server_address[1]}/api", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,402 @@
 # core/auth.py
-import json, base64, hmac, hashlib, secrets
+import copy, json, base64, hmac, secrets, threading, time
 from datetime import datetime
-from pathlib import Path
-from typing import List, Dict, Optional
-from .config import USERS_FILE
-from .crypto import make_salt, PBKDF2_ITERS_DEFAULT
+from typing import Callable, List, Dict, Optional, Tuple
+from .config import USERS_FILE, load_settings
+from .fileio import ConflictError, file_etag, locked, read_bytes, write_atomic
+from . import usermeta
+from .crypto import (
+    make_salt, derive_raw_key, derive_fernet_key, calibrate_kdf, kdf_params_stale, wrap_key, unwrap_key,
+    KDFService, PBKDF2_ITERS_DEFAULT, KDF_PBKDF2, KDF_SCRYPT, KDF_TARGET_MS_DEFAULT,
+)
 
 def _b64(x): return base64.b64encode(x).decode('ascii')
 def _b64d(s): return base64.b64decode(s.encode('ascii'))
 
-def make_hash(password: str, iterations: int = PBKDF2_ITERS_DEFAULT) -> str:
+# Kalibrierte Ziel-Parameter, einmal pro Prozess gemessen
+_KDF_TARGET: Optional[Dict] = None
+
+def current_kdf_params() -> Dict:
+    """Return the calibrated KDF parameters for this host.
+
+    ``settings.json`` may choose the KDF (``"kdf": "pbkdf2" | "scrypt"``) and the
+    login latency (``"kdf_target_ms"``); measuring happens once per process.
+    """
+    global _KDF_TARGET
+    if _KDF_TARGET is None:
+        settings = load_settings()
+        kdf = settings.get("kdf", KDF_PBKDF2)
+        if kdf not in (KDF_PBKDF2, KDF_SCRYPT):
+            kdf = KDF_PBKDF2
+        _KDF_TARGET = calibrate_kdf(kdf, int(settings.get("kdf_target_ms", KDF_TARGET_MS_DEFAULT)))
+    return dict(_KDF_TARGET)
+
+# --------- KDF-Service & Login-Backoff ---------
+_KDF_SERVICE: Optional[KDFService] = None
+_KDF_SERVICE_LOCK = threading.Lock()
+
+def kdf_service() -> KDFService:
+    """Process-wide KDF pool (``"kdf_workers"`` / ``"kdf_queue"`` in ``settings.json``)."""
+    global _KDF_SERVICE
+    with _KDF_SERVICE_LOCK:
+        if _KDF_SERVICE is None:
+            settings = load_settings()
+            _KDF_SERVICE = KDFService(
+                max_workers=int(settings.get("kdf_workers", 2)),
+                max_queue=int(settings.get("kdf_queue", 8)),
+            )
+        return _KDF_SERVICE
+
+def kdf_verify_password(password: str, stored: str) -> bool:
+    return kdf_service().run(verify_password, password, stored)
+
+def kdf_derive_fernet_key(password: str, salt: bytes, params: Dict) -> bytes:
+    return kdf_service().run(derive_fernet_key, password, salt, PBKDF2_ITERS_DEFAULT, params)
+
+def kdf_make_hash(password: str) -> str:
+    # Ziel-Parameter im Hauptprozess bestimmen, damit Worker nicht selbst kalibrieren
+    return kdf_service().run(make_hash, password, None, current_kdf_params())
+
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 300.0
+_BACKOFF_MAX_KEYS = 10_000
+_backoff: Dict[str, tuple] = {}  # key -> (failures, blocked_until)
+_backoff_lock = threading.Lock()
+
+def _backoff_keys(username: str, ip: Optional[str]) -> List[str]:
+    keys = [f"user:{username}"]
+    if ip:
+        keys.append(f"ip:{ip}")
+    return keys
+
+def login_backoff_remaining(username: str, ip: Optional[str] = None) -> float:
+    """Seconds until the next login attempt for ``username``/``ip`` is allowed."""
+    now = time.monotonic()
+    with _backoff_lock:
+        until = max((_backoff.get(k, (0, 0.0))[1] for k in _backoff_keys(username, ip)), default=0.0)
+    return max(0.0, until - now)
+
+def record_login_result(username: str, ip: Optional[str], ok: bool) -> None:
+    """Reset the backoff after a success, otherwise double it (capped at ``BACKOFF_MAX_S``)."""
+    now = time.monotonic()
+    with _backoff_lock:
+        for k in _backoff_keys(username, ip):
+            if ok:
+                _backoff.pop(k, None)
+                continue
+            failures = _backoff.get(k, (0, 0.0))[0] + 1
+            _backoff[k] = (failures, now + min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (failures - 1)))
+        if len(_backoff) > _BACKOFF_MAX_KEYS:
+            # abgelaufene Sperren verwerfen, damit Scans den Speicher nicht füllen
+            for k in [k for k, (_f, until) in _backoff.items() if until + BACKOFF_MAX_S < now]:
+                del _backoff[k]
+
+def _hash_params_str(params: Dict) -> str:
+    if params["kdf"] == KDF_SCRYPT:
+        return f"{params['n']}:{params['r']}:{params['p']}"
+    return str(params["iters"])
+
+def parse_hash_params(stored: str) -> Optional[Dict]:
+    """Return the KDF parameters encoded in a stored password hash."""
+    try:
+        method, cost = stored.split('$', 2)[:2]
+        if method == KDF_PBKDF2:
+            return {"kdf": KDF_PBKDF2, "iters": int(cost)}
+        if method == KDF_SCRYPT:
+            n, r, p = (int(x) for x in cost.split(':'))
+            return {"kdf": KDF_SCRYPT, "n": n, "r": r, "p": p}
+    except Exception:
+        pass
+    return None
+
+def make_hash(password: str, iterations: Optional[int] = None, params: Optional[Dict] = None) -> str:
+    if params is None:
+        params = {"kdf": KDF_PBKDF2, "iters": iterations} if iterations else current_kdf_params()
     salt = secrets.token_bytes(16)
-    dk = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
-    return f"pbkdf2${iterations}${_b64(salt)}${_b64(dk)}"
+    dk = derive_raw_key(password, salt, params)
+    return f"{params['kdf']}${_hash_params_str(params)}${_b64(salt)}${_b64(dk)}"
 
 def verify_password(password: str, stored: str) -> bool:
     try:
-        method, iters, salt_b64, hash_b64 = stored.split('$', 3)
-        if method != 'pbkdf2': return False
-        iters = int(iters)
+        params = parse_hash_params(stored)
+        if not params: return False
+        _method, _cost, salt_b64, hash_b64 = stored.split('$', 3)
         salt = _b64d(salt_b64)
         expected = _b64d(hash_b64)
-        dk = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iters)
+        dk = derive_raw_key(password, salt, params, len(expected))
         return hmac.compare_digest(dk, expected)
     except Exception:
         return False
 
+def password_needs_rehash(stored: str) -> bool:
+    return kdf_params_stale(parse_hash_params(stored), current_kdf_params())
+
+def new_enc_params() -> Dict:
+    """Fresh, JSON-safe ``enc`` block with a new salt and the current KDF parameters."""
+    return {"salt": _b64(make_salt()), **_enc_kdf_fields(current_kdf_params())}
+
+def _enc_kdf_fields(params: Dict) -> Dict:
+    fields = dict(params)
+    # "iters" bleibt für ältere Leser immer gesetzt
+    fields.setdefault("iters", PBKDF2_ITERS_DEFAULT)
+    return fields
+
+def _enc_kdf_params(enc: Dict) -> Dict:
+    kdf = enc.get("kdf") or KDF_PBKDF2
+    if kdf == KDF_SCRYPT:
+        return {"kdf": KDF_SCRYPT, "n": int(enc["n"]), "r": int(enc["r"]), "p": int(enc["p"])}
+    return {"kdf": KDF_PBKDF2, "iters": int(enc.get("iters") or PBKDF2_ITERS_DEFAULT)}
+
+def upgrade_user_kdf(user: Dict, password: str, data_key: bytes) -> bool:
+    """Rehash ``user`` in place if its KDF parameters are stale (call after a successful login).
+
+    The password hash is recomputed, and the data key is re-wrapped under a KEK
+    derived with a fresh salt and the current parameters. Data files are untouched.
+    Returns True if the record was changed.
+    """
+    mutated = False
+    if password_needs_rehash(user.get("pw_hash", "")):
+        user["pw_hash"] = kdf_make_hash(password)
+        mutated = True
+    enc = user.get("enc") or {}
+    if kdf_params_stale(_enc_kdf_params(enc), current_kdf_params()):
+        new_enc = new_enc_params()
+        kek = kdf_derive_fernet_key(password, _b64d(new_enc["salt"]), _enc_kdf_params(new_enc))
+        new_enc["wrapped_data_key"] = wrap_key(data_key, kek)
+        user["enc"] = new_enc
+        mutated = True
+    return mutated
+
+def unlock_user(user: Dict, password: str) -> Tuple[bytes, bytes]:
+    """Return ``(kek, data_key)`` for ``user`` after its password was verified.
+
+    Creates a missing ``enc`` block or key wrap, upgrades stale KDF parameters
+    and writes such changes back with :func:`update_user`.
+    """
+    mutated = False
+    params = get_enc_params_from_record(user)
+    if not params:
+        # enc-Block neu anlegen (salt als base64-STRING, KDF-Parameter des Hosts)
+        user["enc"] = new_enc_params()
+        mutated = True
+        params = get_enc_params_from_record(user)
+    assert params is not None
+    kek = kdf_derive_fernet_key(password, params["salt"], params["kdf"])
+
+    enc = user.setdefault("enc", {})
+    if not isinstance(enc.get("wrapped_data_key"), str):
+        # Migration: DataKey = kek, gespeichert wird nur der Wrap
+        enc["wrapped_data_key"] = wrap_key(kek, kek)
+        mutated = True
+    try:
+        data_key = unwrap_key(enc["wrapped_data_key"], kek)
+    except Exception:
+        # Wrap von einem früheren Passwort (ältere Passwortänderung, Admin-Reset):
+        # DataKey = kek und den Wrap reparieren, damit er ab jetzt stabil bleibt
+        data_key = kek
+        enc["wrapped_data_key"] = wrap_key(kek, kek)
+        mutated = True
+
+    if upgrade_user_kdf(user, password, data_key):
+        mutated = True
+    if mutated:
+        changed = {k: user[k] for k in ("pw_hash", "enc") if k in user}
+        update_user(user["username"], lambda rec: rec.update(changed))
+    return kek, data_key
+
 def _ensure_users_file():
     USERS_FILE.parent.mkdir(parents=True, exist_ok=True)
 
-def load_users() -> List[Dict]:
-    _ensure_users_file()
-    if not USERS_FILE.exists(): return []
+def _parse_users(raw: bytes) -> List[Dict]:
     try:
-        return json.loads(USERS_FILE.read_text(encoding="utf-8"))
+        users = json.loads(raw.decode("utf-8"))
+        return users if isinstance(users, list) else []
     except Exception:
         return []
 
-def save_users(users: List[Dict]):
+# Prozessweiter Cache von users.json: gilt, solange die etag (inode/mtime/size) gleich bleibt
+_registry: Dict = {"etag": None, "users": [], "index": {}}
+_registry_lock = threading.Lock()
+
+def _index(users: List[Dict]) -> Dict[str, int]:
+    return {u.get("username"): i for i, u in enumerate(users) if isinstance(u, dict)}
+
+def _registry_snapshot() -> Tuple[List[Dict], Dict[str, int], Optional[str]]:
+    """Cached ``(users, index, etag)``; re-parses ``users.json`` only after it changed.
+
+    The returned objects are shared – callers must copy before mutating.
+    """
+    etag = file_etag(USERS_FILE)
+    with _registry_lock:
+        if etag == _registry["etag"]:
+            return _registry["users"], _registry["index"], etag
+    if etag is None:
+        users: List[Dict] = []
+    else:
+        with locked(USERS_FILE):
+            etag = file_etag(USERS_FILE)
+            raw = read_bytes(USERS_FILE)
+            users = _parse_users(raw) if raw is not None else []
+    return _remember(users, etag)
+
+def _remember(users: List[Dict], etag: Optional[str]) -> Tuple[List[Dict], Dict[str, int], Optional[str]]:
+    index = _index(users)
+    with _registry_lock:
+        _registry.update({"etag": etag, "users": users, "index": index})
+    return users, index, etag
+
+def load_users() -> List[Dict]:
+    _ensure_users_file()
+    return copy.deepcopy(_registry_snapshot()[0])
+
+def has_users() -> bool:
+    return bool(_registry_snapshot()[0])
+
+def load_users_versioned() -> Tuple[List[Dict], Optional[str]]:
+    """Return ``(users, etag)`` for a compare-and-swap via :func:`save_users`."""
+    _ensure_users_file()
+    users, _idx, etag = _registry_snapshot()
+    return copy.deepcopy(users), etag
+
+def save_users(users: List[Dict], expected_etag: Optional[str] = "*") -> str:
     _ensure_users_file()
-    tmp: Path = USERS_FILE.with_suffix(USERS_FILE.suffix + ".tmp")
-    tmp.write_text(json.dumps(users, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp.replace(USERS_FILE)
+    data = json.dumps(users, ensure_ascii=False, indent=2).encode("utf-8")
+    etag = write_atomic(USERS_FILE, data, expected_etag)
+    # Cache direkt aktualisieren statt beim nächsten Zugriff neu zu parsen
+    _remember(json.loads(data), etag)
+    return etag
+
+def update_users(mutate: Callable[[List[Dict]], Optional[List[Dict]]], retries: int = 3) -> List[Dict]:
+    """Read-modify-write of ``users.json`` as compare-and-swap; repeats ``mutate`` on conflicts.
+
+    Exceptions raised by ``mutate`` (e.g. ``ValueError``) abort without writing.
+    """
+    attempt = 0
+    while True:
+        users, etag = load_users_versioned()
+        result = mutate(users)
+        new = users if result is None else result
+        try:
+            save_users(new, expected_etag=etag)
+            return new
+        except ConflictError:
+            attempt += 1
+            if attempt > retries:
+                raise
+
+def _position(users: List[Dict], username: str) -> Optional[int]:
+    i = _registry_snapshot()[1].get(username)
+    if i is not None and i < len(users) and users[i].get("username") == username:
+        return i
+    # Index gehört zu einer anderen Version -> linear suchen
+    return next((j for j, u in enumerate(users) if u.get("username") == username), None)
+
+def update_user(username: str, mutate: Callable[[Dict], None]) -> None:
+    """Apply ``mutate`` to a single user record; raises ``ValueError`` if it does not exist."""
+    def _apply(users: List[Dict]) -> None:
+        i = _position(users, username)
+        if i is None:
+            raise ValueError("User nicht gefunden")
+        mutate(users[i])
+    update_users(_apply)
 
 def add_user(username: str, password: str, role: str = "user"):
-    users = load_users()
-    if any(u.get("username") == username for u in users):
+    if find_user(username):
         raise ValueError("User existiert bereits")
-    enc_salt = make_salt()
-    users.append({
+    record = {
         "username": username,
         "role": role,
         "active": True,
-        "pw_hash": make_hash(password),
+        "pw_hash": kdf_make_hash(password),
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "last_login": None,
         # neu: Verschlüsselungs-Metadaten pro Nutzer
-        "enc": {
-            "salt": base64.b64encode(enc_salt).decode("ascii"),
-            "iters": PBKDF2_ITERS_DEFAULT,
-        },
-    })
-    save_users(users)
+        "enc": new_enc_params(),
+    }
+    def _append(users: List[Dict]) -> None:
+        if any(u.get("username") == username for u in users):
+            raise ValueError("User existiert bereits")
+        users.append(record)
+    update_users(_append)
 
 def find_user(username: str) -> Optional[Dict]:
-    for u in load_users():
-        if u.get("username") == username:
-            return u
-    return None
+    users, index, _etag = _registry_snapshot()
+    i = index.get(username)
+    return copy.deepcopy(users[i]) if i is not None else None
+
+def set_user_password(username: str, new_password: str, data_key: Optional[bytes] = None):
+    """Set a new password; with ``data_key`` it is re-wrapped under a KEK from the new password.
 
-def set_user_password(username: str, new_password: str):
-    users = load_users()
-    for u in users:
-        if u.get("username") == username:
-            u["pw_hash"] = make_hash(new_password)
-            # Salt kann bleiben; alternativ hier neues Salt generieren:
-            # u["enc"]["salt"] = base64.b64encode(make_salt()).decode("ascii")
-            save_users(users)
-            return
-    raise ValueError("User nicht gefunden")
+    The data key (and with it every file and backup) stays the same. Without it
+    (admin reset) the existing data cannot be decrypted with the new password.
+    """
+    changed = {"pw_hash": kdf_make_hash(new_password)}
+    if data_key is not None:
+        enc = new_enc_params()
+        kek = kdf_derive_fernet_key(new_password, _b64d(enc["salt"]), _enc_kdf_params(enc))
+        enc["wrapped_data_key"] = wrap_key(data_key, kek)
+        changed["enc"] = enc
+    update_user(username, lambda u: u.update(changed))
 
 def set_user_role(username: str, role: str):
-    users = load_users()
-    for u in users:
-        if u.get("username") == username:
-            u["role"] = role
-            save_users(users); return
-    raise ValueError("User nicht gefunden")
+    update_user(username, lambda u: u.update({"role": role}))
 
 def set_user_active(username: str, active: bool):
-    users = load_users()
-    for u in users:
-        if u.get("username") == username:
-            u["active"] = active
-            save_users(users); return
-    raise ValueError("User nicht gefunden")
+    update_user(username, lambda u: u.update({"active": active}))
+
+def get_user_prefs(username: str) -> Dict:
+    """Prefs from ``users.json`` (Altbestand) overlaid with the metadata log."""
+    u = find_user(username)
+    base = (u or {}).get("prefs", {})
+    return {**base, **usermeta.get(username).get("prefs", {})}
+
+def update_user_prefs(username: str, updates: Dict):
+    # landet im Metadaten-Log, users.json bleibt unverändert
+    usermeta.update_prefs(username, updates)
+
+def note_login(username: str) -> None:
+    usermeta.touch_login(username, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+def merge_user_meta(u: Dict, meta: Dict) -> Dict:
+    merged = {**u, **{k: v for k, v in meta.items() if k != "prefs"}}
+    if "prefs" in meta:
+        merged["prefs"] = {**u.get("prefs", {}), **meta["prefs"]}
+    return merged
+
+def load_users_merged() -> List[Dict]:
+    """Users incl. ``last_login``/``login_count``/``prefs`` from the metadata log (read-only view)."""
+    meta = usermeta.snapshot()
+    return [merge_user_meta(u, meta.get(u.get("username"), {})) for u in load_users()]
 
 def delete_user(requesting_username: str, target_username: str):
-    users = load_users()
     if requesting_username == target_username:
         raise ValueError("Du kannst dich nicht selbst löschen")
 
-    target = next((u for u in users if u.get("username") == target_username), None)
-    if not target:
-        raise ValueError("User nicht gefunden")
+    def _delete(users: List[Dict]) -> List[Dict]:
+        target = next((u for u in users if u.get("username") == target_username), None)
+        if not target:
+            raise ValueError("User nicht gefunden")
 
-    # Wenn Ziel ein Admin ist: bleiben danach noch andere Admins übrig?
-    if target.get("role") == "admin":
-        remaining_admins = [u for u in users if u.get("role") == "admin" and u.get("username") != target_username]
-        if not remaining_admins:
-            raise ValueError("Mindestens ein Admin muss verbleiben")
+        # Wenn Ziel ein Admin ist: bleiben danach noch andere Admins übrig?
+        if target.get("role") == "admin":
+            remaining_admins = [u for u in users if u.get("role") == "admin" and u.get("username") != target_username]
+            if not remaining_admins:
+                raise ValueError("Mindestens ein Admin muss verbleiben")
 
-    users = [u for u in users if u.get("username") != target_username]
-    save_users(users)
+        return [u for u in users if u.get("username") != target_username]
+    update_users(_delete)
+    usermeta.forget(target_username)
 
 def get_user_enc_params(username: str) -> Optional[dict]:
     u = find_user(username)
     if not u: return None
+    return get_enc_params_from_record(u)
+
+def get_enc_params_from_record(u: Dict) -> Optional[dict]:
     enc = u.get("enc") or {}
     try:
         salt = base64.b64decode(enc.get("salt",""))
         iters = int(enc.get("iters") or PBKDF2_ITERS_DEFAULT)
-        return {"salt": salt, "iters": iters}
+        return {"salt": salt, "iters": iters, "kdf": _enc_kdf_params(enc)}
     except Exception:
         return None
\ No newline at end of file
@@ -1,6 +1,6 @@
 # core/calc.py
 from __future__ import annotations
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd  # <- wichtig!
@@ -15,6 +15,12 @@ def _month_add(base: datetime, months: int) -> datetime:
     return datetime(year, month, 1)
 
 
+def _now(today: Optional[date] = None) -> datetime:
+    """``datetime.now()``, optionally moved to the day ``today`` (CLI ``--today``, tests)."""
+    now = datetime.now()
+    return now if today is None else datetime.combine(today, now.time())
+
+
 def _safe_cycle_months(entry: Dict[str, Any], lang: str) -> int:
     label = str(entry.get("cycle") or "").strip()
     lang_map: Dict[str, Optional[int]] = CYCLES.get(lang, CYCLES["de"])
@@ -33,8 +39,8 @@ def _safe_cycle_months(entry: Dict[str, Any], lang: str) -> int:
     return 12
 
 
-def get_next_due_date(entry: Dict[str, Any], lang: str) -> Optional[datetime]:
-    today = datetime.now().replace(day=1)
+def get_next_due_date(entry: Dict[str, Any], lang: str, today: Optional[date] = None) -> Optional[datetime]:
+    today = _now(today).replace(day=1)
     contract_start = datetime.strptime(entry["start_date"], "%Y-%m")
 
     try:
@@ -64,6 +70,39 @@ def get_next_due_date(entry: Dict[str, Any], lang: str) -> Optional[datetime]:
     return next_due
 
 
+def next_due_on_or_after(entry: Dict[str, Any], on: date, lang: str) -> Optional[date]:
+    """First due date (1st of the due month) on or after ``on``, by month arithmetic.
+
+    Same schedule as :func:`get_next_due_date`, but exact to the day and
+    without stepping through every cycle.
+    """
+    try:
+        sy, sm = map(int, str(entry["start_date"]).split("-")[:2])
+    except Exception:
+        return None
+    try:
+        due_month = int(entry["due_month"])
+    except Exception:
+        due_month = sm
+    cycle = int(_safe_cycle_months(entry, lang))
+    start_idx = sy * 12 + sm - 1
+    first = sy * 12 + due_month - 1
+    if first < start_idx:
+        first += 12
+    if first == start_idx:
+        first += cycle  # Start im Fälligkeitsmonat -> erste Abbuchung nach einem Zyklus
+    target = on.year * 12 + on.month - 1 + (1 if on.day > 1 else 0)
+    nxt = first if first >= target else first + -(-(target - first) // cycle) * cycle
+    if entry.get("end_date"):
+        try:
+            ey, em = map(int, str(entry["end_date"]).split("-")[:2])
+        except Exception:
+            ey, em = None, None
+        if ey is not None and nxt > ey * 12 + em - 1:
+            return None
+    return date(nxt // 12, nxt % 12 + 1, 1)
+
+
 def get_next_due_text(entry: Dict, lang: str) -> str:
     nd = get_next_due_date(entry, lang)
     if not nd:
@@ -72,8 +111,10 @@ def get_next_due_text(entry: Dict, lang: str) -> str:
     return f"{MONTHS[lang][nd.month]} {nd.year}"
 
 
-def calculate_monthly_saving_and_progress(entry: Dict[str, Any], lang: str) -> Tuple[float, float, float, Optional[str]]:
-    today = datetime.now().replace(day=1)
+def calculate_monthly_saving_and_progress(
+    entry: Dict[str, Any], lang: str, today: Optional[date] = None,
+) -> Tuple[float, float, float, Optional[str]]:
+    today = _now(today).replace(day=1)
     contract_start = datetime.strptime(entry["start_date"], "%Y-%m")
     contract_end = None
     if entry.get("end_date"):
@@ -162,18 +203,32 @@ def calculate_monthly_saving_and_progress(entry: Dict[str, Any], lang: str) -> T
     return rate, min(1.0, percent), saved, None
 
 
-def calculate_saldo_over_time(entries: List[Dict[str, Any]], lang: str, months_before: int = 36, months_after: int = 36) -> pd.DataFrame:
+def entry_metrics(entry: Dict[str, Any], lang: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """Rate, progress and next due month of one entry as plain JSON/CSV values (as of ``today``)."""
+    rate, percent, saved, info = calculate_monthly_saving_and_progress(entry, lang, today)
+    nd = get_next_due_date(entry, lang, today)
+    return {
+        "id": entry.get("id"), "name": entry.get("name", ""), "rate": round(rate, 2),
+        "percent": round(percent, 4), "saved": round(saved, 2), "not_started": info,
+        "next_due": nd.strftime("%Y-%m") if nd else None,
+    }
+
+
+def calculate_saldo_over_time(entries: List[Dict[str, Any]], lang: str, months_before: int = 36, months_after: int = 36,
+                              today: Optional[date] = None) -> pd.DataFrame:
     if not entries:
         return pd.DataFrame({"month": [], "saldo": []})
 
     earliest_start = min(datetime.strptime(e["start_date"], "%Y-%m") for e in entries)
-    today = datetime.now().replace(day=1)
+    today = _now(today).replace(day=1)
     base_start = min(today, earliest_start)
     start_candidate = base_start - pd.DateOffset(months=months_before)
     start_date = earliest_start if start_candidate < earliest_start else start_candidate
     end_date = today + pd.DateOffset(months=months_after)
 
     months = pd.date_range(start=start_date, end=end_date, freq="MS")
+    if len(months) == 0:  # alle Einträge beginnen erst nach dem Horizont
+        return pd.DataFrame({"month": [], "saldo": []})
     saldo: Dict[str, float] = {}
     account = 0.0
 
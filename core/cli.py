@@ -0,0 +1,251 @@
+# core/cli.py
+"""Command-line reports and batch jobs over the calc and storage core.
+
+    python -m core.cli project --user anna --months 120 > saldo.csv
+    python -m core.cli metrics --user anna --format jsonl
+    python -m core.cli due --all --credentials creds.json --days 30
+    python -m core.cli notify --all --credentials creds.json --jobs 4
+    python -m core.cli deliver
+
+Entries are encrypted with each user's data key, so every user needs a
+password. It comes from ``--credentials`` (JSON ``{"user": "password"}``,
+should be readable only by the cron user), from ``RP_PASSWORD`` (one user only),
+or from a prompt. Users without a password are skipped and reported on stderr.
+Rows are written while they are produced. With ``--jobs N`` users run in N
+processes, and at most N users' results are held at once. ``deliver`` needs
+no user: it queues ended e-mail digests and sends the outbox (for cron when
+the scheduler is off).
+"""
+from __future__ import annotations
+import argparse, csv, getpass, json, os, sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from .auth import find_user, get_user_prefs, kdf_verify_password, load_users, unlock_user
+from .calc import calculate_saldo_over_time, entry_metrics, next_due_on_or_after
+from .config import load_settings
+from .digest import deliver_outbox, digest_enabled
+from .fileio import transaction
+from .notify import NOTIF_RETENTION_MONTHS, run_notification_pass
+from .storage import UserStore, load_entries
+
+FIELDS: Dict[str, List[str]] = {
+    "project": ["user", "month", "saldo"],
+    "metrics": ["user", "id", "name", "rate", "percent", "saved", "not_started", "next_due"],
+    "due": ["user", "date", "days", "id", "name", "amount"],
+    "notify": ["user", "new"],
+    "deliver": ["sent", "deferred", "failed"],
+}
+FORMATS = ("csv", "jsonl", "json")
+
+
+class CliError(Exception):
+    pass
+
+
+def _user_key(username: str, password: str) -> bytes:
+    u = find_user(username)
+    if not u or not u.get("active"):
+        raise CliError("unknown or inactive user")
+    if not kdf_verify_password(password, u.get("pw_hash", "")):
+        raise CliError("wrong password")
+    return unlock_user(u, password)[1]
+
+
+def _lang(username: str) -> Tuple[str, Dict]:
+    prefs = get_user_prefs(username)
+    return prefs.get("language") or load_settings().get("language", "de"), prefs
+
+
+def _filtered(entries: List[Dict], opts: Dict) -> List[Dict]:
+    return [e for e in entries
+            if (opts.get("category") is None or e.get("category", "") == opts["category"])
+            and (opts.get("account") is None or e.get("konto", "") == opts["account"])]
+
+
+def rows(command: str, username: str, key: Optional[bytes], opts: Dict) -> Iterator[Dict]:
+    """Report rows of one user; ``opts`` are the parsed command-line options."""
+    lang, prefs = _lang(username)
+    today = date.fromisoformat(opts["today"]) if opts.get("today") else date.today()
+    if command == "notify":
+        retention = int(load_settings().get("notif_retention_months", NOTIF_RETENTION_MONTHS))
+        with transaction():
+            new = run_notification_pass(UserStore(username, key), lang, today=today, prefs=prefs,
+                                        retention_months=retention)
+        yield {"user": username, "new": new}
+        return
+    entries = _filtered(load_entries(username, key), opts)
+    if command == "project":
+        df = calculate_saldo_over_time(entries, lang, months_before=opts["before"], months_after=opts["months"],
+                                       today=today)
+        for month, saldo in zip(df["month"], df["saldo"]):
+            yield {"user": username, "month": month, "saldo": round(float(saldo), 2)}
+    elif command == "metrics":
+        for e in entries:
+            yield {"user": username, **entry_metrics(e, lang, today)}
+    elif command == "due":
+        until = today + timedelta(days=opts["days"])
+        due = []
+        for e in entries:
+            d = next_due_on_or_after(e, today, lang)
+            if d is not None and d <= until:
+                due.append((d, e))
+        for d, e in sorted(due, key=lambda x: (x[0], x[1].get("name", ""))):
+            yield {"user": username, "date": d.isoformat(), "days": (d - today).days,
+                   "id": e.get("id"), "name": e.get("name", ""), "amount": float(e.get("amount") or 0)}
+
+
+def _job(command: str, username: str, password: str, opts: Dict) -> Tuple[str, List[Dict], Optional[str]]:
+    """Worker entry point: one user, all rows (or the error)."""
+    try:
+        return username, list(rows(command, username, _user_key(username, password), opts)), None
+    except Exception as ex:
+        return username, [], str(ex) or type(ex).__name__
+
+
+class _Writer:
+    def __init__(self, out: IO[str], fmt: str, fields: List[str]):
+        self.out, self.fmt, self.first = out, fmt, True
+        if fmt == "csv":
+            self._csv = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+            self._csv.writeheader()
+        elif fmt == "json":
+            out.write("[")
+
+    def write(self, row: Dict) -> None:
+        if self.fmt == "csv":
+            self._csv.writerow(row)
+        elif self.fmt == "jsonl":
+            self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self.out.write(("\n" if self.first else ",\n") + json.dumps(row, ensure_ascii=False))
+        self.first = False
+
+    def close(self) -> None:
+        if self.fmt == "json":
+            self.out.write("\n]\n" if not self.first else "]\n")
+        self.out.flush()
+
+
+def _credentials(args: argparse.Namespace, users: List[str]) -> Dict[str, str]:
+    creds: Dict[str, str] = {}
+    if args.credentials:
+        with open(args.credentials, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise CliError("credentials file must be a JSON object {user: password}")
+        creds = {str(k): str(v) for k, v in data.items()}
+    elif len(users) == 1 and os.environ.get("RP_PASSWORD") is not None:
+        creds = {users[0]: os.environ["RP_PASSWORD"]}
+    elif len(users) == 1 and sys.stdin.isatty():
+        creds = {users[0]: getpass.getpass(f"Passwort für {users[0]}: ")}
+    return creds
+
+
+def _parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m core.cli", description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=FORMATS, default="csv")
+    output.add_argument("-o", "--output", help="output file (default: stdout)")
+    output.add_argument("--today", help="reference day YYYY-MM-DD (default: today)")
+    common = argparse.ArgumentParser(add_help=False, parents=[output])
+    who = common.add_mutually_exclusive_group(required=True)
+    who.add_argument("--user", action="append", help="username (repeatable)")
+    who.add_argument("--all", action="store_true", help="every active user")
+    common.add_argument("--credentials", help="JSON file {user: password}")
+    common.add_argument("--jobs", type=int, default=1, help="users processed in parallel")
+    filt = argparse.ArgumentParser(add_help=False)
+    filt.add_argument("--category")
+    filt.add_argument("--account")
+
+    p = sub.add_parser("project", parents=[common, filt], help="saldo series per month")
+    p.add_argument("--months", type=int, default=36, help="months after the --today month")
+    p.add_argument("--before", type=int, default=0, help="months before the --today month")
+    sub.add_parser("metrics", parents=[common, filt], help="rate/percent/saved per entry")
+    p = sub.add_parser("due", parents=[common, filt], help="upcoming due dates")
+    p.add_argument("--days", type=int, default=30)
+    sub.add_parser("notify", parents=[common], help="run the notification rules")
+    sub.add_parser("deliver", parents=[output], help="queue ended digests and send the outbox")
+    return ap
+
+
+def _deliver(args: argparse.Namespace) -> int:
+    if not digest_enabled():
+        print('error: no "smtp_host" in settings.json', file=sys.stderr)
+        return 2
+    stats = deliver_outbox(today=date.fromisoformat(args.today) if args.today else None)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = _Writer(out, args.format, FIELDS["deliver"])
+    try:
+        writer.write(stats)
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+    # zurückgestellte Mails kommen beim nächsten Lauf dran; aufgegebene melden
+    return 1 if stats["failed"] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    if args.command == "deliver":
+        return _deliver(args)
+    opts = {k: v for k, v in vars(args).items() if k in ("months", "before", "days", "category", "account", "today")}
+    users = [u["username"] for u in load_users() if u.get("active")] if args.all else list(dict.fromkeys(args.user))
+    try:
+        creds = _credentials(args, users)
+    except (OSError, ValueError, CliError) as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 2
+
+    failed = 0
+    todo = []
+    for name in users:
+        if name in creds:
+            todo.append(name)
+        else:
+            print(f"{name}: no password, skipped", file=sys.stderr)
+            failed += 1
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = _Writer(out, args.format, FIELDS[args.command])
+    try:
+        if args.jobs <= 1:
+            for name in todo:
+                try:
+                    for row in rows(args.command, name, _user_key(name, creds[name]), opts):
+                        writer.write(row)
+                except Exception as ex:
+                    print(f"{name}: {ex or type(ex).__name__}", file=sys.stderr)
+                    failed += 1
+        else:
+            # höchstens ``jobs`` Ergebnisse gleichzeitig im Speicher; Ausgabe in Benutzer-Reihenfolge
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                pending: deque[Future] = deque()
+                queue = iter(todo)
+                for name in queue:
+                    pending.append(pool.submit(_job, args.command, name, creds[name], opts))
+                    if len(pending) >= args.jobs:
+                        break
+                while pending:
+                    name, result, error = pending.popleft().result()
+                    nxt = next(queue, None)
+                    if nxt is not None:
+                        pending.append(pool.submit(_job, args.command, nxt, creds[nxt], opts))
+                    if error:
+                        print(f"{name}: {error}", file=sys.stderr)
+                        failed += 1
+                    for row in result:
+                        writer.write(row)
+    finally:
+        writer.close()
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
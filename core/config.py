@@ -1,7 +1,9 @@
 # core/config.py
 import json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Set
+
+from .fileio import file_etag, read_bytes, write_atomic
 
 # Projekt-Root (Ordner, in dem Ruecklagenplaner.py liegt)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -11,24 +13,38 @@ SETTINGS_FILE = DATA_DIR / "settings.json"
 USERS_FILE = DATA_DIR / "users.json"
 VERSION_FILE = BASE_DIR / "VERSION"
 
+_ENSURED: Set[Path] = set()
+# (etag, Pfad, Settings) der zuletzt gelesenen settings.json; neu gelesen, wenn sich die Datei ändert
+_SETTINGS_CACHE: Optional[tuple] = None
+
 def ensure_dirs():
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    """Create the data directory (once per process)."""
+    if DATA_DIR not in _ENSURED:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _ENSURED.add(DATA_DIR)
 
 def load_settings() -> Dict:
+    """Settings merged over the defaults; re-read only when ``settings.json`` changed (etag)."""
+    global _SETTINGS_CACHE
     ensure_dirs()
+    etag = file_etag(SETTINGS_FILE)
+    cached = _SETTINGS_CACHE
+    if cached is not None and cached[0] == etag and cached[1] == SETTINGS_FILE:
+        return dict(cached[2])
     default = {"language": "de", "currency": "€"}
-    if not SETTINGS_FILE.exists():
-        return default
-    try:
-        return {**default, **json.loads(SETTINGS_FILE.read_text(encoding="utf-8"))}
-    except Exception:
-        return default
+    raw = read_bytes(SETTINGS_FILE)
+    settings = default
+    if raw is not None:
+        try:
+            settings = {**default, **json.loads(raw.decode("utf-8"))}
+        except Exception:
+            settings = default
+    _SETTINGS_CACHE = (etag, SETTINGS_FILE, settings)
+    return dict(settings)
 
 def save_settings(settings: Dict):
     ensure_dirs()
-    tmp = SETTINGS_FILE.with_suffix(SETTINGS_FILE.suffix + ".tmp")
-    tmp.write_text(json.dumps(settings, ensure_ascii=False, indent=2), encoding="utf-8")
-    tmp.replace(SETTINGS_FILE)
+    write_atomic(SETTINGS_FILE, json.dumps(settings, ensure_ascii=False, indent=2).encode("utf-8"))
 
 def get_version() -> str:
     try:
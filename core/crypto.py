@@ -1,28 +1,226 @@
 from __future__ import annotations
-import base64, os
-from typing import Tuple
+import base64, io, os, threading, time
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import hashes
 from cryptography.fernet import Fernet
 
 
 PBKDF2_ITERS_DEFAULT = 200_000
+PBKDF2_ITERS_MIN = 100_000
+SCRYPT_N_DEFAULT = 2 ** 15
+SCRYPT_N_MIN = 2 ** 14
+SCRYPT_N_MAX = 2 ** 17  # 128 MiB bei r=8 – mehr verträgt die kleinste Box nicht
+SCRYPT_R = 8
+SCRYPT_P = 1
 SALT_LEN = 16  # bytes
 
+KDF_PBKDF2 = "pbkdf2"
+KDF_SCRYPT = "scrypt"
+KDF_TARGET_MS_DEFAULT = 250
+STALE_BELOW = 0.5  # Rehash erst unter halben Zielkosten
+
 
 def make_salt(n: int = SALT_LEN) -> bytes:
     return os.urandom(n)
 
 
-def derive_fernet_key(password: str, salt: bytes, iterations: int = PBKDF2_ITERS_DEFAULT) -> bytes:
-    """Leitet aus Passwort+Salt einen 32-Byte-Key ab und verpackt ihn als Fernet-Key (urlsafe base64)."""
-    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
-    raw = kdf.derive(password.encode("utf-8"))
+# --------- KDF-Registry ---------
+def _derive_pbkdf2(password: bytes, salt: bytes, params: Dict, length: int) -> bytes:
+    iters = int(params.get("iters") or PBKDF2_ITERS_DEFAULT)
+    return PBKDF2HMAC(algorithm=hashes.SHA256(), length=length, salt=salt, iterations=iters).derive(password)
+
+
+def _derive_scrypt(password: bytes, salt: bytes, params: Dict, length: int) -> bytes:
+    n = int(params.get("n") or SCRYPT_N_DEFAULT)
+    r = int(params.get("r") or SCRYPT_R)
+    p = int(params.get("p") or SCRYPT_P)
+    return Scrypt(salt=salt, length=length, n=n, r=r, p=p).derive(password)
+
+
+def _cost_pbkdf2(params: Dict) -> float:
+    return float(params.get("iters") or PBKDF2_ITERS_DEFAULT)
+
+
+def _cost_scrypt(params: Dict) -> float:
+    return float(params.get("n") or SCRYPT_N_DEFAULT) * float(params.get("r") or SCRYPT_R) * float(params.get("p") or SCRYPT_P)
+
+
+# name -> (derive, relative cost)
+KDFS: Dict[str, Tuple[Callable[[bytes, bytes, Dict, int], bytes], Callable[[Dict], float]]] = {
+    KDF_PBKDF2: (_derive_pbkdf2, _cost_pbkdf2),
+    KDF_SCRYPT: (_derive_scrypt, _cost_scrypt),
+}
+
+
+def derive_raw_key(password: str, salt: bytes, params: Dict, length: int = 32) -> bytes:
+    """Leitet ``length`` Bytes mit der in ``params["kdf"]`` benannten KDF ab."""
+    name = params.get("kdf") or KDF_PBKDF2
+    if name not in KDFS:
+        raise ValueError(f"Unbekannte KDF: {name}")
+    derive, _cost = KDFS[name]
+    return derive(password.encode("utf-8"), salt, params, length)
+
+
+def derive_fernet_key(
+    password: str,
+    salt: bytes,
+    iterations: int = PBKDF2_ITERS_DEFAULT,
+    params: Dict | None = None,
+) -> bytes:
+    """Leitet aus Passwort+Salt einen 32-Byte-Key ab und verpackt ihn als Fernet-Key (urlsafe base64).
+
+    Ohne ``params`` wird wie bisher PBKDF2 mit ``iterations`` verwendet.
+    """
+    if params is None:
+        params = {"kdf": KDF_PBKDF2, "iters": iterations}
+    raw = derive_raw_key(password, salt, params)
     return base64.urlsafe_b64encode(raw)  # Fernet erwartet base64url-encoded 32B
 
 
+def kdf_cost(params: Dict) -> float:
+    name = params.get("kdf") or KDF_PBKDF2
+    if name not in KDFS:
+        return 0.0
+    return KDFS[name][1](params)
+
+
+def _time_derive(params: Dict) -> float:
+    salt = make_salt()
+    t0 = time.perf_counter()
+    derive_raw_key("calibration", salt, params)
+    return time.perf_counter() - t0
+
+
+def calibrate_kdf(kdf: str = KDF_PBKDF2, target_ms: int = KDF_TARGET_MS_DEFAULT) -> Dict:
+    """Misst die KDF auf diesem Host und wählt Parameter für ``target_ms`` Login-Latenz.
+
+    Die Parameter werden nie unter die Mindestwerte gesenkt.
+    """
+    target = max(1, int(target_ms)) / 1000.0
+    if kdf == KDF_SCRYPT:
+        n = SCRYPT_N_MIN
+        elapsed = _time_derive({"kdf": KDF_SCRYPT, "n": n, "r": SCRYPT_R, "p": SCRYPT_P})
+        # scrypt skaliert linear in n -> verdoppeln, solange das Ziel nicht überschritten wird
+        while n < SCRYPT_N_MAX and elapsed * 2 <= target:
+            n *= 2
+            elapsed *= 2
+        return {"kdf": KDF_SCRYPT, "n": n, "r": SCRYPT_R, "p": SCRYPT_P}
+    if kdf != KDF_PBKDF2:
+        raise ValueError(f"Unbekannte KDF: {kdf}")
+    probe = 20_000
+    elapsed = max(_time_derive({"kdf": KDF_PBKDF2, "iters": probe}), 1e-6)
+    iters = int(probe * target / elapsed) // 10_000 * 10_000
+    return {"kdf": KDF_PBKDF2, "iters": max(PBKDF2_ITERS_MIN, iters)}
+
+
+def kdf_params_stale(params: Dict | None, target: Dict) -> bool:
+    """True, wenn ``params`` nicht (mehr) zum kalibrierten ``target`` passen.
+
+    Veraltet ist: andere KDF oder deutlich schwächer als das Ziel (unter
+    ``STALE_BELOW`` × Ziel). Die Kalibrierung schwankt pro Prozess, daher
+    die Hysterese; teurere Parameter werden nie automatisch herabgestuft.
+    """
+    if not params:
+        return True
+    if (params.get("kdf") or KDF_PBKDF2) != target.get("kdf"):
+        return True
+    return kdf_cost(params) < STALE_BELOW * kdf_cost(target)
+
+
+# --------- KDF-Executor ---------
+class KDFBusyError(RuntimeError):
+    """Raised when the KDF queue is full; the caller should ask the user to retry."""
+
+
+class KDFService:
+    """Runs expensive key derivations on a bounded process pool.
+
+    At most ``max_workers`` derivations run at once and at most ``max_queue``
+    more may wait; anything beyond that is rejected with :class:`KDFBusyError`
+    instead of tying up the server's script threads. ``max_workers=0`` runs
+    inline (tests, single-user setups).
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8):
+        self.max_workers = max(0, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._slots = threading.BoundedSemaphore(max(1, self.max_workers) + self.max_queue)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latencies: deque = deque(maxlen=256)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn statt fork: der Streamlit-Server ist multithreaded
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context("spawn"))
+            return self._pool
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run ``fn(*args)`` (a picklable module-level function) and return its result."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise KDFBusyError("KDF queue full")
+        with self._lock:
+            self._in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            if self.max_workers == 0:
+                return fn(*args)
+            try:
+                return self._executor().submit(fn, *args).result(timeout)
+            except BrokenProcessPool:
+                # Worker gestorben (OOM o.ä.) -> Pool einmal neu aufbauen
+                with self._lock:
+                    self._pool = None
+                return self._executor().submit(fn, *args).result(timeout)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - t0)
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        """Queue depth and latency (ms) of recent derivations."""
+        with self._lock:
+            lat = sorted(self._latencies)
+            in_flight = self._in_flight
+            completed, rejected = self._completed, self._rejected
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            # inline läuft alles im aufrufenden Thread, gewartet wird nie
+            "queued": max(0, in_flight - self.max_workers) if self.max_workers else 0,
+            "completed": completed,
+            "rejected": rejected,
+            "avg_ms": round(1000 * sum(lat) / len(lat), 1) if lat else 0.0,
+            "p95_ms": round(1000 * lat[int(0.95 * (len(lat) - 1))], 1) if lat else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
 def make_fernet(key: bytes) -> Fernet:
+    # bewusst ohne Cache: ein Cache hielte Data-Keys über den Logout hinaus am Leben
     return Fernet(key)
 
 
@@ -51,3 +249,136 @@ def unwrap_key(wrapped: bytes | str, kek: bytes) -> bytes:
     aes = AESGCM(kek[:32])
     nonce, ct = wrapped_bytes[:12], wrapped_bytes[12:]
     return aes.decrypt(nonce, ct, None)
+
+
+# --------- Streaming-AEAD (große Backups/Exporte) ---------
+# Format: MAGIC | chunk_size (u32 BE) | salt (16B) | Chunks...
+# Jeder Chunk ist AES-GCM(plaintext <= chunk_size) + 16B Tag. Der Dateischlüssel
+# wird per HKDF aus dem Fernet-Key und dem Salt abgeleitet; die Nonce ist
+# 3x0 | Zähler (u64 BE) | Last-Flag, der Header ist AAD jedes Chunks.
+# Damit fallen Vertauschen, Abschneiden und Anhängen von Chunks auf.
+STREAM_MAGIC = b"RPS1"
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE_MAX = 16 * 1024 * 1024
+_STREAM_HEADER_LEN = len(STREAM_MAGIC) + 4 + SALT_LEN
+_GCM_TAG_LEN = 16
+
+
+class StreamDecryptError(ValueError):
+    """Ciphertext stream is malformed, truncated, reordered or was tampered with."""
+
+
+def is_stream_ciphertext(head: bytes) -> bool:
+    return head[:len(STREAM_MAGIC)] == STREAM_MAGIC
+
+
+def _stream_aead(fkey: bytes, salt: bytes) -> AESGCM:
+    raw = base64.urlsafe_b64decode(fkey)
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"rp-stream-v1").derive(raw)
+    return AESGCM(key)
+
+
+def _stream_nonce(counter: int, last: bool) -> bytes:
+    return b"\x00\x00\x00" + counter.to_bytes(8, "big") + (b"\x01" if last else b"\x00")
+
+
+def _read_full(src: BinaryIO, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        part = src.read(n - len(buf))
+        if not part:
+            break
+        buf += part
+    return buf
+
+
+def encrypt_stream(src: BinaryIO, dst: BinaryIO, fkey: bytes, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    """Encrypt ``src`` into ``dst`` chunk by chunk; returns the number of bytes written.
+
+    Peak memory is about two chunks regardless of the input size.
+    """
+    if not 0 < chunk_size <= STREAM_CHUNK_SIZE_MAX:
+        raise ValueError("chunk_size out of range")
+    salt = make_salt()
+    header = STREAM_MAGIC + int(chunk_size).to_bytes(4, "big") + salt
+    aead = _stream_aead(fkey, salt)
+    dst.write(header)
+    written = len(header)
+    counter = 0
+    cur = _read_full(src, chunk_size)
+    while True:
+        nxt = _read_full(src, chunk_size)
+        last = not nxt
+        ct = aead.encrypt(_stream_nonce(counter, last), cur, header)
+        dst.write(ct)
+        written += len(ct)
+        if last:
+            return written
+        counter += 1
+        cur = nxt
+
+
+def iter_decrypt_stream(src: BinaryIO, fkey: bytes) -> Iterator[bytes]:
+    """Yield authenticated plaintext chunks; stopping early only reads a prefix."""
+    header = _read_full(src, _STREAM_HEADER_LEN)
+    if len(header) != _STREAM_HEADER_LEN or not is_stream_ciphertext(header):
+        raise StreamDecryptError("Kein verschlüsselter Stream")
+    chunk_size = int.from_bytes(header[len(STREAM_MAGIC):len(STREAM_MAGIC) + 4], "big")
+    if not 0 < chunk_size <= STREAM_CHUNK_SIZE_MAX:
+        raise StreamDecryptError("Ungültige Chunk-Größe")
+    aead = _stream_aead(fkey, header[len(STREAM_MAGIC) + 4:])
+    block = chunk_size + _GCM_TAG_LEN
+    counter = 0
+    cur = _read_full(src, block)
+    while True:
+        nxt = _read_full(src, block) if len(cur) == block else b""
+        last = not nxt
+        try:
+            yield aead.decrypt(_stream_nonce(counter, last), cur, header)
+        except InvalidTag:
+            raise StreamDecryptError("Stream beschädigt, abgeschnitten oder falscher Schlüssel") from None
+        if last:
+            if src.read(1):
+                raise StreamDecryptError("Daten nach dem letzten Chunk")
+            return
+        counter += 1
+        cur = nxt
+
+
+class IterStream(io.RawIOBase):
+    """Read-only file over an iterator of byte chunks, e.g. a generator.
+
+    Lets producers such as ``json.JSONEncoder.iterencode`` or
+    :func:`iter_decrypt_stream` feed file-based consumers without a buffer
+    of the whole payload.
+    """
+
+    def __init__(self, chunks):
+        self._it = iter(chunks)
+        self._rest = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = len(b)
+        parts, size = [self._rest], len(self._rest)
+        while size < n:
+            part = next(self._it, None)
+            if part is None:
+                break
+            parts.append(part)
+            size += len(part)
+        data = b"".join(parts)
+        out, self._rest = data[:n], data[n:]
+        b[:len(out)] = out
+        return len(out)
+
+
+def decrypt_stream(src: BinaryIO, dst: BinaryIO, fkey: bytes) -> int:
+    """Decrypt ``src`` into ``dst``; returns the number of plaintext bytes written."""
+    written = 0
+    for chunk in iter_decrypt_stream(src, fkey):
+        dst.write(chunk)
+        written += len(chunk)
+    return written
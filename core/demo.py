@@ -1,43 +1,117 @@
 from __future__ import annotations
 import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
-
-from .auth import add_user, find_user, get_user_enc_params, set_user_password
-from .crypto import derive_fernet_key
-from .storage import save_entries
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, List, Dict, Mapping, Optional, Tuple
 
 DEMO_USERNAME = "demo"
-DEMO_PASSWORD = "demo"
-
-def ensure_demo_user(password: str = DEMO_PASSWORD) -> None:
-    u = find_user(DEMO_USERNAME)
-    if not u:
-        add_user(DEMO_USERNAME, password, role="user")
 
 def _mk(name, amount, konto, cat, cycle, due_month, start, end=None, custom_cycle=None):
     return {
-        "id": str(uuid.uuid4()),
+        # stabile IDs, damit Bearbeiten/Löschen über Reruns hinweg dieselben Einträge trifft
+        "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"ruecklagenplaner-demo/{name}")),
         "name": name, "amount": float(amount), "konto": konto, "category": cat,
         "cycle": cycle, "custom_cycle": custom_cycle,
         "due_month": int(due_month), "start_date": start, "end_date": end,
     }
 
-def demo_entries() -> list[dict]:
-    y = datetime.now().year
-    return [
+@lru_cache(maxsize=2)
+def _demo_dataset(year: int) -> Tuple[Mapping[str, Any], ...]:
+    y = year
+    return tuple(MappingProxyType(e) for e in (
         _mk("Kfz-Versicherung", 600, "Giro", "Versicherungen", "Jährlich", 12, f"{y}-01"),
         _mk("Hausrat",          240, "Giro", "Versicherungen", "Jährlich",  6, f"{y}-02"),
         _mk("Wartung Heizung",  300, "Nebenkosten", "Wartung", "Vierteljährlich", 3, f"{y}-01"),
         _mk("Urlaub",          1800, "Tagesgeld", "Urlaub", "Benutzerdefiniert", 8, f"{y}-01", end=f"{y+1}-08", custom_cycle=18),
         _mk("Rücklage Geräte",  900, "Tagesgeld", "Haushalt", "Halbjährlich", 1, f"{y}-01"),
-    ]
-
-def login_as_demo_and_seed() -> tuple[str, bytes | None]:
-    """Sorgt für Demo-User + Demo-Daten (verschlüsselt) und gibt (username, fkey) zurück."""
-    ensure_demo_user(DEMO_PASSWORD)
-    params = get_user_enc_params(DEMO_USERNAME)
-    fkey = derive_fernet_key(DEMO_PASSWORD, params["salt"], params["iters"]) if params else None
-    # überschreibt bewusst die Demo-Einträge (Demo-Usecase)
-    save_entries(DEMO_USERNAME, demo_entries(), fkey)
-    return DEMO_USERNAME, fkey
\ No newline at end of file
+    ))
+
+def demo_dataset() -> Tuple[Mapping[str, Any], ...]:
+    """Shared, read-only demo portfolio (built once per process and year)."""
+    return _demo_dataset(datetime.now().year)
+
+def demo_entries() -> list[dict]:
+    return [dict(e) for e in demo_dataset()]
+
+class DemoWorkspace:
+    """Per-session copy-on-write view of the demo portfolio.
+
+    Reads come from the shared dataset until the session writes; edits,
+    notifications and prefs then live only in this object (i.e. in
+    ``st.session_state``) and are gone when the session ends. No key, no disk.
+    """
+
+    sends_mail = False  # keine E-Mails an frei eingetragene Adressen
+
+    def __init__(self) -> None:
+        self._entries: Optional[List[Dict]] = None  # None = unverändertes Demo-Portfolio
+        self._notes: List[Dict] = []
+        self.prefs: Dict = {}
+        self.notify_state: Dict = {}
+        self.version = 0  # ersetzt die etag von entries.json
+        self.uid = uuid.uuid4().hex  # trennt die Caches der Demo-Sessions
+
+    def load_entries(self) -> List[Dict]:
+        if self._entries is None:
+            return demo_entries()
+        return [dict(e) for e in self._entries]
+
+    def save_entries(self, entries: List[Dict]) -> None:
+        self._entries = [dict(e) for e in entries]
+        self.version += 1
+
+    def update_entries(self, mutate: Callable[[List[Dict]], Optional[List[Dict]]]) -> List[Dict]:
+        entries = self.load_entries()
+        result = mutate(entries)
+        self.save_entries(entries if result is None else result)
+        return self.load_entries()
+
+    def import_entries(self, data: Any, replace: bool) -> bool:
+        if not isinstance(data, list) or not all(isinstance(e, dict) for e in data):
+            return False  # u. a. verschlüsselte Exporte: Demo hat keinen Schlüssel
+        data = [{**e, "id": e.get("id") or str(uuid.uuid4())} for e in data]
+        if replace:
+            self.save_entries(data)
+        else:
+            def _merge(current: List[Dict]) -> List[Dict]:
+                have = {e.get("id") for e in current}
+                return current + [e for e in data if e.get("id") not in have]
+            self.update_entries(_merge)
+        return True
+
+    def entries_version(self) -> int:
+        return self.version
+
+    def load_notify_state(self) -> Dict:
+        return self.notify_state
+
+    def save_notify_state(self, state: Dict) -> None:
+        self.notify_state = state
+
+    def load_notes(self) -> List[Dict]:
+        return [dict(n) for n in self._notes]
+
+    def save_notes(self, notes: List[Dict]) -> None:
+        self._notes = [dict(n) for n in notes]
+
+    def append_notes(self, new_notes: List[Dict]) -> None:
+        self._notes.extend(dict(n) for n in new_notes or [])
+
+    def archive_notes(self, before_month: str) -> int:
+        return 0  # lebt nur in der Session, nichts auszulagern
+
+    def unread_notes(self) -> int:
+        return sum(1 for n in self._notes if not n.get("read"))
+
+    def mark_notes_read(self) -> None:
+        for n in self._notes:
+            n["read"] = True
+
+    def purge_entry_notes(self, entry_id: str) -> int:
+        before = len(self._notes)
+        self._notes = [n for n in self._notes if n.get("entry_id") != entry_id]
+        return before - len(self._notes)
+
+    def iter_notes(self, entry_id: Optional[str] = None) -> Iterator[Dict]:
+        return (dict(n) for n in reversed(self._notes) if entry_id is None or n.get("entry_id") == entry_id)
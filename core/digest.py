@@ -0,0 +1,241 @@
+# core/digest.py
+"""Daily/weekly e-mail digests of a user's notifications, queued in a durable outbox.
+
+The notification pass renders each user's new notes in their language into a
+per-user draft in ``data/outbox/pending/``, in the same transaction as the
+notify state. When the digest period changes, the draft is queued as one
+message file in ``data/outbox/``: by the next pass of that user, or by
+:func:`deliver_outbox`, which needs no user key and so also mails users who do
+not come back. It sends due messages over one SMTP connection per batch and
+retries failures with exponential backoff. Drafts and outbox files hold the
+rendered mail in plaintext, like the mail itself; without ``"smtp_host"`` no
+drafts are kept. Delivery runs in the scheduler or via ``python -m core.cli
+deliver`` (cron).
+"""
+from __future__ import annotations
+import hashlib, itertools, json, os, smtplib, time, uuid
+from datetime import date
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from i18n import get_text
+from .config import DATA_DIR, load_settings
+from .fileio import ConflictError, file_etag, locked, read_bytes, transaction, write_atomic
+
+OUTBOX_DIR = DATA_DIR / "outbox"
+DIGEST_MODES = ("off", "daily", "weekly")
+SMTP_BATCH = 100
+SMTP_MAX_ATTEMPTS = 6
+SMTP_BACKOFF_S = 60.0
+SMTP_BACKOFF_MAX_S = 6 * 3600.0
+SMTP_TIMEOUT_S = 10.0
+
+_seq = itertools.count()  # hält die Reihenfolge innerhalb derselben Millisekunde
+
+
+def digest_period(mode: str, today: date) -> str:
+    if mode == "weekly":
+        year, week, _ = today.isocalendar()
+        return f"{year}-W{week:02d}"
+    return today.isoformat()
+
+
+def digest_enabled(settings: Optional[Dict] = None) -> bool:
+    """Digests need a mail server: without ``"smtp_host"`` they are neither offered nor queued."""
+    settings = load_settings() if settings is None else settings
+    return bool(settings.get("smtp_host"))
+
+
+def _draft_path(username: str) -> Path:
+    # Dateiname ohne Klartext-Benutzernamen
+    return OUTBOX_DIR / "pending" / f"{hashlib.sha256(username.encode('utf-8')).hexdigest()[:32]}.json"
+
+
+def _read_draft(path: Path) -> Tuple[Dict, Optional[str]]:
+    with locked(path):
+        raw, etag = read_bytes(path), file_etag(path)
+    try:
+        draft = json.loads(raw.decode("utf-8")) if raw is not None else {}
+    except ValueError:
+        draft = {}
+    return (draft if isinstance(draft, dict) else {}), etag
+
+
+def _write_draft(path: Path, draft: Dict, etag: Optional[str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, json.dumps(draft, ensure_ascii=False).encode("utf-8"), expected_etag=etag)
+
+
+def collect_digest(username: str, state: Dict, new_notes: List[Dict], prefs: Dict, lang: str, today: date) -> Dict:
+    """Render ``new_notes`` into the user's pending digest; queue it when the period changed.
+
+    Returns ``state`` itself, or a copy without the in-state digest of older
+    versions (its notes move into the draft).
+    """
+    legacy = list((state.get("digest") or {}).get("pending") or [])
+    if "digest" in state:
+        state = {k: v for k, v in state.items() if k != "digest"}
+    mode = prefs.get("notif_digest", "off")
+    to = str(prefs.get("notif_email") or "").strip()
+    path = _draft_path(username)
+    if mode not in DIGEST_MODES or mode == "off" or not to or not digest_enabled():
+        if path.exists():
+            draft, etag = _read_draft(path)
+            if draft.get("lines") or draft.get("mode") != "off":
+                _write_draft(path, {"mode": "off", "lines": []}, etag)  # abgeschaltet -> Entwurf verworfen
+        return state
+    draft, etag = _read_draft(path)
+    period = digest_period(mode, today)
+    lines = list(draft.get("lines") or [])
+    if draft.get("period") not in (None, period) and lines:
+        enqueue(draft.get("to") or to, *_compose(lines, draft.get("lang") or lang))
+        lines = []
+    notes = legacy + list(new_notes)
+    if notes:
+        from .notify import render_note
+        currency = prefs.get("currency") or load_settings().get("currency", "€")
+        lines += [render_note(n, lang, currency) for n in notes]
+    new_draft = {"to": to, "mode": mode, "period": period, "lang": lang, "lines": lines}
+    if new_draft != draft:
+        _write_draft(path, new_draft, etag)
+    return state
+
+
+def roll_over_drafts(today: Optional[date] = None) -> int:
+    """Queue every pending digest whose period has ended; returns the number of queued messages."""
+    pending_dir = OUTBOX_DIR / "pending"
+    if not pending_dir.exists():
+        return 0
+    today = today or date.today()
+    queued = 0
+    for path in sorted(pending_dir.glob("*.json")):
+        draft, etag = _read_draft(path)
+        mode = draft.get("mode")
+        if not draft.get("lines") or mode not in DIGEST_MODES or mode == "off" or not draft.get("to"):
+            continue
+        period = digest_period(mode, today)
+        if str(draft.get("period") or "") >= period:
+            continue
+        try:
+            with transaction():
+                enqueue(draft["to"], *_compose(draft["lines"], draft.get("lang") or "de"))
+                _write_draft(path, {**draft, "period": period, "lines": []}, etag)
+        except ConflictError:
+            continue  # gerade vom Pass des Benutzers geändert, der rollt selbst über
+        queued += 1
+    return queued
+
+
+def _compose(lines: List[str], lang: str) -> Tuple[str, str]:
+    subject = get_text(lang, "digest_subject").format(count=len(lines))
+    body = [get_text(lang, "digest_intro"), ""] + [f"• {line}" for line in lines]
+    return subject, "\n".join(body) + "\n"
+
+
+def enqueue(to: str, subject: str, body: str) -> Path:
+    """Queue one message; inside a transaction it is written together with the other changes."""
+    OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+    path = OUTBOX_DIR / f"{int(time.time() * 1000):013d}-{next(_seq) % 1000000:06d}-{uuid.uuid4().hex[:8]}.json"
+    msg = {"to": to, "subject": subject, "body": body, "attempts": 0, "next_try": 0.0}
+    write_atomic(path, json.dumps(msg, ensure_ascii=False).encode("utf-8"))
+    return path
+
+
+def _due_messages(now: float, limit: int) -> List[Tuple[Path, Dict]]:
+    if not OUTBOX_DIR.exists():
+        return []
+    due = []
+    for p in sorted(OUTBOX_DIR.glob("*.json")):
+        raw = read_bytes(p)
+        try:
+            msg = json.loads(raw.decode("utf-8")) if raw is not None else None
+        except ValueError:
+            msg = None
+        if msg is not None and float(msg.get("next_try", 0)) <= now:
+            due.append((p, msg))
+            if len(due) >= limit:
+                break
+    return due
+
+
+def _connect(settings: Dict, smtp_factory: Callable[..., smtplib.SMTP]) -> smtplib.SMTP:
+    conn = smtp_factory(settings["smtp_host"], int(settings.get("smtp_port", 25)),
+                        timeout=float(settings.get("smtp_timeout_s", SMTP_TIMEOUT_S)))
+    if settings.get("smtp_starttls"):
+        conn.starttls()
+    if settings.get("smtp_user"):
+        conn.login(settings["smtp_user"], settings.get("smtp_password", ""))
+    return conn
+
+
+def _defer(path: Path, msg: Dict, now: float, settings: Dict, error: str) -> bool:
+    """Back off a failed message; returns True when it was given up (moved to ``failed/``)."""
+    msg = {**msg, "attempts": int(msg.get("attempts", 0)) + 1, "error": error[:200]}
+    if msg["attempts"] >= int(settings.get("smtp_max_attempts", SMTP_MAX_ATTEMPTS)):
+        failed = OUTBOX_DIR / "failed"
+        failed.mkdir(exist_ok=True)
+        write_atomic(path, json.dumps(msg, ensure_ascii=False).encode("utf-8"))
+        os.replace(path, failed / path.name)
+        return True
+    base = float(settings.get("smtp_backoff_s", SMTP_BACKOFF_S))
+    msg["next_try"] = now + min(SMTP_BACKOFF_MAX_S, base * 2 ** (msg["attempts"] - 1))
+    write_atomic(path, json.dumps(msg, ensure_ascii=False).encode("utf-8"))
+    return False
+
+
+def deliver_outbox(
+    settings: Optional[Dict] = None,
+    now: Optional[float] = None,
+    limit: int = SMTP_BATCH,
+    smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+    today: Optional[date] = None,
+) -> Dict:
+    """Send due outbox messages over one SMTP connection; returns ``sent``/``deferred``/``failed`` counts.
+
+    Pending digests whose period has ended are queued first. Without
+    ``"smtp_host"`` in the settings nothing is sent. A refused message only
+    backs off itself; if the server cannot be reached, the whole batch does.
+    """
+    settings = load_settings() if settings is None else settings
+    stats = {"sent": 0, "deferred": 0, "failed": 0}
+    if not settings.get("smtp_host"):
+        return stats
+    now = time.time() if now is None else now
+    sender = settings.get("smtp_sender", "ruecklagenplaner@localhost")
+    OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+    with locked(OUTBOX_DIR / ".deliver"):  # ein Zusteller pro Datenverzeichnis
+        roll_over_drafts(today or date.fromtimestamp(now))
+        due = _due_messages(now, limit)
+        conn = None
+        try:
+            for i, (path, msg) in enumerate(due):
+                email = EmailMessage()
+                email["From"], email["To"], email["Subject"] = sender, msg["to"], msg["subject"]
+                email.set_content(msg["body"])
+                try:
+                    if conn is None:
+                        conn = _connect(settings, smtp_factory)
+                    conn.send_message(email)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as ex:
+                    stats["failed" if _defer(path, msg, now, settings, repr(ex)) else "deferred"] += 1
+                    continue
+                except (smtplib.SMTPException, OSError) as ex:
+                    # Server weg: Rest des Batches später erneut versuchen
+                    for p, m in due[i:]:
+                        stats["failed" if _defer(p, m, now, settings, repr(ex)) else "deferred"] += 1
+                    conn = None
+                    break
+                path.unlink()
+                stats["sent"] += 1
+        finally:
+            if conn is not None:
+                try:
+                    conn.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+    return stats
+
+
+def outbox_size() -> int:
+    return len(list(OUTBOX_DIR.glob("*.json"))) if OUTBOX_DIR.exists() else 0
@@ -0,0 +1,163 @@
+# core/due_index.py
+"""Per-user due calendar: sorted ``(date, entry_id)`` arrays for next due dates and end dates.
+
+Rule evaluation becomes two range queries (``bisect``) instead of simulating
+every entry's schedule. When the day moves on, only entries whose due date has
+passed are advanced to their next occurrence.
+"""
+from __future__ import annotations
+import threading, time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .calc import next_due_on_or_after
+from .cycles import safe_cycle_months
+
+_MAX_ID = "\U0010ffff"
+
+
+def _month_start(ym: str) -> Optional[date]:
+    try:
+        y, m = map(int, str(ym).split("-")[:2])
+        return date(y, m, 1)
+    except Exception:
+        return None
+
+
+def _rate(entry: Dict, amount: float, lang: str) -> float:
+    cm = safe_cycle_months(entry, lang, "Benutzerdefiniert" if lang == "de" else "Custom")
+    return amount / cm if cm > 0 else 0.0
+
+
+class DueCalendar:
+    """Next due date and end date of every entry, ordered by date."""
+
+    def __init__(self, entries: List[Dict], lang: str, today: date):
+        self.lang = lang
+        self.today = today
+        self._lock = threading.Lock()  # advance() ändert die Arrays
+        self._entries: Dict[str, Dict] = {}
+        self._next: Dict[str, date] = {}
+        self._due: List[Tuple[date, str]] = []
+        self._end: List[Tuple[date, str]] = []
+        rows = []
+        for e in entries:
+            eid = e.get("id")
+            if not eid or eid in self._entries:
+                continue
+            self._entries[eid] = dict(e)
+            nd = next_due_on_or_after(e, today, lang)
+            if nd is not None:
+                self._next[eid] = nd
+                self._due.append((nd, eid))
+            ed = _month_start(e.get("end_date")) if e.get("end_date") else None
+            if ed is not None:
+                self._end.append((ed, eid))
+            amount = float(e.get("amount") or 0)
+            rows.append((eid, str(e.get("name") or ""), amount, _rate(e, amount, lang),
+                         str(e.get("category") or ""), str(e.get("konto") or ""),
+                         ed.toordinal() if ed is not None else float("nan")))
+        self._due.sort()
+        self._end.sort()
+        # spaltenweiser Schnappschuss des Portfolios für die Regel-Auswertung
+        self._base = pd.DataFrame(
+            rows, columns=["id", "name", "amount", "rate", "category", "konto", "end_ord"]
+        ).set_index("id")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entry(self, eid: str) -> Dict:
+        return self._entries[eid]
+
+    def advance(self, today: date) -> None:
+        """Move entries whose due date lies before ``today`` to their next occurrence."""
+        if today <= self.today:
+            return
+        self.today = today
+        cut = bisect_left(self._due, (today, ""))
+        passed, self._due = self._due[:cut], self._due[cut:]
+        for _d, eid in passed:
+            nd = next_due_on_or_after(self._entries[eid], today, self.lang)
+            if nd is not None:
+                self._next[eid] = nd
+                insort(self._due, (nd, eid))
+            else:
+                self._next.pop(eid, None)
+
+    def due_within(self, today: date, days: int) -> List[Tuple[date, str]]:
+        """Entries due in ``[today, today + days]`` (exact days)."""
+        with self._lock:
+            self.advance(today)
+            return self._range(self._due, today, days)
+
+    def ending_within(self, today: date, days: int) -> List[Tuple[date, str]]:
+        """Entries whose end date lies in ``[today, today + days]``."""
+        return self._range(self._end, today, days)
+
+    def snapshot(self, ids: Iterable[str], today: date) -> pd.DataFrame:
+        """Columnar view of ``ids`` with ``due_days``/``end_days`` relative to ``today``."""
+        t = today.toordinal()
+        df = self._base.loc[[i for i in ids if i in self._entries]].copy()
+        with self._lock:
+            self.advance(today)
+            df["due_days"] = [self._next[i].toordinal() - t if i in self._next else float("nan") for i in df.index]
+        df["end_days"] = df["end_ord"] - t
+        return df
+
+    def monthly_total(self, today: date, category: Optional[str] = None) -> float:
+        """Sum of the monthly rates of all entries that have not ended yet."""
+        base = self._base
+        mask = base["end_ord"].isna() | (base["end_ord"] >= today.toordinal())
+        if category:
+            mask &= base["category"].str.casefold() == category.casefold()
+        return float(base.loc[mask, "rate"].sum())
+
+    @staticmethod
+    def _range(items: List[Tuple[date, str]], today: date, days: int) -> List[Tuple[date, str]]:
+        lo = bisect_left(items, (today, ""))
+        hi = bisect_right(items, (today + timedelta(days=days), _MAX_ID))
+        return items[lo:hi]
+
+
+_CACHE_MAX = 1024
+# Kalender enthalten Klartext (Namen, Beträge): nach 15 min ohne Zugriff verwerfen
+CALENDAR_TTL_S = 900.0
+_cache: "OrderedDict[Hashable, Tuple[object, DueCalendar, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cached_calendar(key: Optional[Hashable], version, load_entries_fn, lang: str, today: date) -> DueCalendar:
+    """Calendar for ``key`` (e.g. username); rebuilt only when the entries ``version`` changed.
+
+    Every entry write changes the version (file etag), so the index follows the
+    writes without reloading or decrypting entries on unchanged days.
+    """
+    if key is None:
+        return DueCalendar(load_entries_fn(), lang, today)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get((key, lang))
+        if hit is not None and hit[0] == version and now - hit[2] <= CALENDAR_TTL_S:
+            _cache[(key, lang)] = (version, hit[1], now)
+            _cache.move_to_end((key, lang))
+            return hit[1]
+    cal = DueCalendar(load_entries_fn(), lang, today)
+    with _cache_lock:
+        _cache[(key, lang)] = (version, cal, now)
+        _cache.move_to_end((key, lang))
+        # LRU-Reihenfolge = Zugriffszeit: vorne liegen die abgelaufenen
+        while _cache and (len(_cache) > _CACHE_MAX or now - next(iter(_cache.values()))[2] > CALENDAR_TTL_S):
+            _cache.popitem(last=False)
+    return cal
+
+
+def drop_calendars(key: Hashable) -> None:
+    """Forget the cached calendars of ``key`` in every language (logout, key expiry)."""
+    with _cache_lock:
+        for k in [k for k in _cache if k[0] == key]:
+            del _cache[k]
@@ -0,0 +1,447 @@
+# core/fileio.py
+"""Low-level file helpers shared by storage, auth and config: locks, etags, atomic writes."""
+from __future__ import annotations
+import io, itertools, os, threading, time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:  # POSIX; unter Windows bleibt es bei den prozessinternen Locks
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+
+class ConflictError(RuntimeError):
+    """The file was changed by someone else since it was read (etag mismatch)."""
+
+
+# Wie hart wird nach dem Schreiben synchronisiert?
+#   none      – nur rename (schnell, bei Stromausfall evtl. alter/leerer Stand)
+#   file      – fsync der Datei vor dem rename
+#   file+dir  – zusätzlich fsync des Verzeichnisses nach dem rename (crash-sicher)
+#   group     – wie file+dir, aber gleichzeitige Schreiber teilen sich eine fsync-Runde
+DURABILITY_MODES = ("none", "file", "file+dir", "group")
+DURABILITY_DEFAULT = "file+dir"
+GROUP_WINDOW_MS_DEFAULT = 5.0
+
+_durability: Dict = {"mode": DURABILITY_DEFAULT, "window_ms": GROUP_WINDOW_MS_DEFAULT}
+_stats_lock = threading.Lock()
+_latencies: Dict[str, deque] = {m: deque(maxlen=512) for m in DURABILITY_MODES}
+_counts: Dict[str, int] = {m: 0 for m in DURABILITY_MODES}
+
+
+_thread_locks: Dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()  # path -> [fd, depth] je Thread (fcntl ist nicht reentrant)
+
+
+def _key(path: Path) -> str:
+    return os.path.abspath(path)
+
+
+def _thread_lock(key: str) -> threading.RLock:
+    with _thread_locks_guard:
+        lock = _thread_locks.get(key)
+        if lock is None:
+            lock = _thread_locks[key] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """Exclusive, reentrant lock for a read-modify-write of ``path``.
+
+    Combines a per-path in-process lock (Streamlit threads) with an fcntl
+    advisory lock on ``<path>.lock`` (several workers on one data directory).
+    """
+    key = _key(path)
+    held: Dict[str, list] = getattr(_held, "paths", None) or {}
+    _held.paths = held
+    with _thread_lock(key):
+        if key in held:
+            held[key][1] += 1
+            try:
+                yield
+            finally:
+                held[key][1] -= 1
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(f"{key}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            held[key] = [fd, 1]
+            try:
+                yield
+            finally:
+                del held[key]
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _disk_etag(path: Path) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def file_etag(path: Path) -> Optional[str]:
+    """Cheap version tag of ``path`` (None if missing).
+
+    Every write replaces the file, so inode, mtime and size change together.
+    Inside a :func:`transaction` a staged file reports its staged version.
+    """
+    tx = current_transaction()
+    if tx is not None:
+        staged = tx._writes.get(_key(path))
+        if staged is not None:
+            return staged.etag
+    return _disk_etag(path)
+
+
+def read_bytes(path: Path) -> Optional[bytes]:
+    """Content of ``path`` (None if missing), including writes staged by the current transaction."""
+    tx = current_transaction()
+    if tx is not None:
+        staged = tx._writes.get(_key(path))
+        if staged is not None:
+            return staged.data
+    try:
+        return Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def open_read(path: Path) -> Optional[BinaryIO]:
+    """Like :func:`read_bytes`, but as a file object so large files can be streamed."""
+    tx = current_transaction()
+    if tx is not None:
+        staged = tx._writes.get(_key(path))
+        if staged is not None:
+            return io.BytesIO(staged.data)
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def configure_durability(mode: Optional[str] = None, group_window_ms: Optional[float] = None) -> str:
+    """Select the durability mode (see ``DURABILITY_MODES``); returns the active mode.
+
+    ``RP_DURABILITY`` / ``RP_DURABILITY_WINDOW_MS`` in the environment override
+    the arguments (usually ``settings.json``); unknown modes fall back to the default.
+    """
+    mode = os.environ.get("RP_DURABILITY") or mode or DURABILITY_DEFAULT
+    if mode not in DURABILITY_MODES:
+        mode = DURABILITY_DEFAULT
+    window = os.environ.get("RP_DURABILITY_WINDOW_MS") or group_window_ms
+    _durability["mode"] = mode
+    _durability["window_ms"] = max(0.0, float(window)) if window is not None else GROUP_WINDOW_MS_DEFAULT
+    return mode
+
+
+def _fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace_now(pairs: Iterable[Tuple[Path, Path]], mode: str) -> None:
+    pairs = list(pairs)
+    if mode != "none":
+        for tmp, _path in pairs:
+            _fsync_path(tmp)
+    for tmp, path in pairs:
+        tmp.replace(path)
+    if mode in ("file+dir", "group"):
+        for d in sorted({str(path.parent) for _tmp, path in pairs}):
+            _fsync_dir(d)
+
+
+class GroupCommitter:
+    """Background thread that lets concurrent writers share one fsync round.
+
+    Writers hand over their already written temp files and wait; after a short
+    window the thread fsyncs all of them, renames them into place and fsyncs
+    every affected directory once for the whole batch.
+    """
+
+    def __init__(self, window_ms: float = GROUP_WINDOW_MS_DEFAULT):
+        self.window_ms = float(window_ms)
+        self._cond = threading.Condition()
+        self._queue: List[Dict] = []
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.batched = 0
+
+    def submit(self, pairs: List[Tuple[Path, Path]]) -> None:
+        req: Dict = {"pairs": pairs, "done": threading.Event(), "error": None}
+        with self._cond:
+            self._queue.append(req)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        req["done"].wait()
+        if req["error"] is not None:
+            raise req["error"]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            time.sleep(self.window_ms / 1000.0)  # weitere Schreiber einsammeln
+            with self._cond:
+                batch, self._queue = self._queue, []
+            self._commit(batch)
+
+    def _commit(self, batch: List[Dict]) -> None:
+        ok: List[Dict] = []
+        for req in batch:
+            try:
+                for tmp, _path in req["pairs"]:
+                    _fsync_path(tmp)
+                for tmp, path in req["pairs"]:
+                    tmp.replace(path)
+                ok.append(req)
+            except BaseException as ex:
+                req["error"] = ex
+        try:
+            for d in sorted({str(path.parent) for req in ok for _tmp, path in req["pairs"]}):
+                _fsync_dir(d)
+        except BaseException as ex:
+            for req in ok:
+                req["error"] = ex
+        with self._cond:
+            self.batches += 1
+            self.batched += len(batch)
+        for req in batch:
+            req["done"].set()
+
+
+_GROUP: Optional[GroupCommitter] = None
+_GROUP_LOCK = threading.Lock()
+
+
+def _group() -> GroupCommitter:
+    global _GROUP
+    with _GROUP_LOCK:
+        if _GROUP is None:
+            _GROUP = GroupCommitter(_durability["window_ms"])
+        _GROUP.window_ms = _durability["window_ms"]
+        return _GROUP
+
+
+def _replace_durably(pairs: List[Tuple[Path, Path]]) -> None:
+    """Rename written temp files into place with the configured durability."""
+    mode = _durability["mode"]
+    t0 = time.perf_counter()
+    if mode == "group":
+        _group().submit(pairs)
+    else:
+        _replace_now(pairs, mode)
+    with _stats_lock:
+        _counts[mode] += 1
+        _latencies[mode].append(time.perf_counter() - t0)
+
+
+def write_stats() -> Dict:
+    """Active durability mode plus count and sync latency (ms) per mode."""
+    with _stats_lock:
+        per_mode = {m: (_counts[m], sorted(_latencies[m])) for m in DURABILITY_MODES}
+    out: Dict = {"mode": _durability["mode"], "group_window_ms": _durability["window_ms"]}
+    for m, (count, lat) in per_mode.items():
+        out[m] = {
+            "writes": count,
+            "avg_ms": round(1000 * sum(lat) / len(lat), 2) if lat else 0.0,
+            "p95_ms": round(1000 * lat[int(0.95 * (len(lat) - 1))], 2) if lat else 0.0,
+        }
+    if _GROUP is not None:
+        out["group"]["batches"] = _GROUP.batches
+        out["group"]["avg_batch"] = round(_GROUP.batched / _GROUP.batches, 2) if _GROUP.batches else 0.0
+    return out
+
+
+def write_atomic(path: Path, data: bytes, expected_etag: Optional[str] = "*", transactional: bool = True) -> str:
+    """Atomically replace ``path`` with ``data`` and return the new etag.
+
+    ``expected_etag`` turns the write into a compare-and-swap: ``"*"`` writes
+    unconditionally, ``None`` requires that the file does not exist yet, any
+    other value must match :func:`file_etag`, else :class:`ConflictError`.
+    Inside a :func:`transaction` the write is only staged (unless
+    ``transactional=False``, e.g. for logs with their own consistency).
+    """
+    tx = current_transaction() if transactional else None
+    if tx is not None:
+        return tx.stage(path, data, expected_etag)
+    with locked(path):
+        if expected_etag != "*" and _disk_etag(path) != expected_etag:
+            raise ConflictError(str(path))
+        tmp = _tmp_path(path)
+        tmp.write_bytes(data)
+        try:
+            _replace_durably([(tmp, path)])
+        finally:
+            tmp.unlink(missing_ok=True)
+        return _disk_etag(path) or ""
+
+
+class _Staged:
+    __slots__ = ("path", "data", "base", "etag")
+
+    def __init__(self, path: Path, data: bytes, base: Optional[str], etag: str):
+        self.path, self.data, self.base, self.etag = path, data, base, etag
+
+
+_tx_ids = itertools.count(1)
+_tx_local = threading.local()
+
+
+class Transaction:
+    """Writes collected during one user action, applied together by :meth:`commit`.
+
+    Several writes to the same file coalesce into one. On commit all files are
+    locked (sorted, so two commits cannot deadlock), their base versions are
+    checked, the new contents are written and then synced and renamed into place
+    as one batch (see :func:`configure_durability`); if anything fails, already
+    replaced files are restored.
+    """
+
+    def __init__(self) -> None:
+        self._id = next(_tx_ids)
+        self._seq = itertools.count(1)
+        self._writes: Dict[str, _Staged] = {}
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def stage(self, path: Path, data: bytes, expected_etag: Optional[str] = "*") -> str:
+        key = _key(path)
+        prev = self._writes.get(key)
+        current = prev.etag if prev is not None else _disk_etag(path)
+        if expected_etag != "*" and current != expected_etag:
+            raise ConflictError(str(path))
+        # beim Commit gilt die Version, auf der die erste Änderung aufgesetzt hat
+        if prev is not None:
+            base = prev.base
+        else:
+            base = "*" if expected_etag == "*" else current
+        etag = f"tx{self._id}-{next(self._seq)}"
+        self._writes[key] = _Staged(Path(path), bytes(data), base, etag)
+        return etag
+
+    def rollback(self) -> None:
+        self._writes.clear()
+
+    def commit(self) -> Dict[str, str]:
+        """Apply all staged writes; returns ``{path: new etag}``."""
+        staged = [w for _k, w in sorted(self._writes.items())]
+        self._writes = {}
+        if not staged:
+            return {}
+        with ExitStack() as stack:
+            for w in staged:
+                stack.enter_context(locked(w.path))
+            for w in staged:
+                if w.base != "*" and _disk_etag(w.path) != w.base:
+                    raise ConflictError(str(w.path))
+            pairs: List[Tuple[Path, Path]] = []
+            old: Dict[Path, Optional[bytes]] = {}
+            try:
+                for w in staged:
+                    old[w.path] = w.path.read_bytes() if w.path.exists() else None
+                    tmp = _tmp_path(w.path)
+                    tmp.write_bytes(w.data)
+                    pairs.append((tmp, w.path))
+                _replace_durably(pairs)
+            except BaseException:
+                for tmp, path in reversed(pairs):
+                    if tmp.exists():  # nicht umbenannt -> Ziel unverändert
+                        tmp.unlink()
+                    elif old[path] is None:
+                        path.unlink(missing_ok=True)
+                    else:
+                        restore = _tmp_path(path)
+                        restore.write_bytes(old[path])
+                        restore.replace(path)
+                raise
+            return {str(w.path): _disk_etag(w.path) or "" for w in staged}
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # pragma: no cover - z. B. Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover
+        pass
+    finally:
+        os.close(fd)
+
+
+def current_transaction() -> Optional[Transaction]:
+    return getattr(_tx_local, "tx", None)
+
+
+@contextmanager
+def transaction() -> Iterator[Transaction]:
+    """Collect the writes of one action (this thread) and commit them at the end.
+
+    Nested calls join the outer transaction. Exceptions roll everything back.
+    Keep ``st.rerun()``/``st.stop()`` outside the block – they raise, too.
+    """
+    outer = current_transaction()
+    if outer is not None:
+        yield outer
+        return
+    tx = Transaction()
+    _tx_local.tx = tx
+    try:
+        yield tx
+    except BaseException:
+        tx.rollback()
+        raise
+    finally:
+        _tx_local.tx = None
+    tx.commit()
+
+
+def run_in_transaction(work: Callable[[], Any], retries: int = 3) -> Any:
+    """Run ``work`` in a :func:`transaction`, repeating it on a commit conflict.
+
+    Staged writes are CAS-checked only at commit, so the retry loops of the
+    ``update_*`` helpers do not apply inside a transaction; the whole action is
+    repeated instead (``work`` has to re-read what it changes). Raises
+    :class:`ConflictError` after ``retries`` repeats. Inside an outer
+    transaction ``work`` just runs once.
+    """
+    if current_transaction() is not None:
+        return work()
+    attempt = 0
+    while True:
+        try:
+            with transaction():
+                result = work()
+            return result
+        except ConflictError:
+            attempt += 1
+            if attempt > retries:
+                raise
+
+
+configure_durability()
@@ -1,169 +1,301 @@
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from i18n import MONTHS, get_text
-from .calc import get_next_due_text
-from .cycles import safe_cycle_months, months_to_next_occurrence
+from .calc import get_next_due_date, next_due_on_or_after
+from .digest import collect_digest
+from .cycles import get_turnus_mapping, safe_cycle_months, turnus_label
+from .due_index import DueCalendar, cached_calendar
+from .notify_rules import Rule, compile_rule, enabled_rules, rules_fingerprint, rules_from_prefs
+
+# Notifications are stored as compact typed records: ``type``, ``entry_id``,
+# ``name`` and numeric ``params`` (money in cents, months as ``year * 12 + month - 1``,
+# cycles in months). The sentence is rendered at display time by :func:`render_note`
+# in the current language; records from older versions still carry a ready ``text``.
+
+def _custom(lang: str) -> str:
+    return "Benutzerdefiniert" if lang == "de" else "Custom"
 
 def _monthly_rate(entry: Dict, lang: str) -> float:
     amt = float(entry.get("amount", 0) or 0)
-    cm = safe_cycle_months(entry, lang, "Benutzerdefiniert" if lang=="de" else "Custom")
+    cm = safe_cycle_months(entry, lang, _custom(lang))
     return amt / cm if cm > 0 else 0.0
 
-def notify_on_add(append_fn, entry: Dict, currency: str, lang: str, t):
+def _cents(value) -> int:
+    return int(round(float(value or 0) * 100))
+
+def _month_index(d) -> Optional[int]:
+    return d.year * 12 + d.month - 1 if d else None
+
+def _note(type_: str, entry: Dict, **params) -> Dict:
+    now = datetime.now()
+    return {
+        "entry_id": entry.get("id"),
+        "type": type_,
+        "name": entry.get("name", ""),
+        "params": params,
+        "effective_month": now.strftime("%Y-%m"),
+        "read": False,
+        "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def notify_on_add(append_fn, entry: Dict, lang: str):
     try:
-        txt = t("notif_new_entry").format(
-            name=entry.get("name", ""),
-            rate=f"{_monthly_rate(entry, lang):.2f} {currency}",
-            amount=f"{float(entry.get('amount',0)):.2f} {currency}",
-            due=get_next_due_text(entry, lang),
-        )
-        append_fn([{
-            "entry_id": entry.get("id"),
-            "type": "new_entry",
-            "effective_month": datetime.now().strftime("%Y-%m"),
-            "text": txt,
-            "read": False,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }])
+        append_fn([_note(
+            "new_entry", entry,
+            rate=_cents(_monthly_rate(entry, lang)),
+            amount=_cents(entry.get("amount")),
+            due=_month_index(get_next_due_date(entry, lang)),
+        )])
     except Exception:
         pass
 
-def notify_on_update(append_fn, old: Dict, new: Dict, currency: str, lang: str, t, prefs: Dict):
+def notify_on_update(append_fn, old: Dict, new: Dict, lang: str, prefs: Dict):
     try:
         notes = []
-        r_old, r_new = _monthly_rate(old, lang), _monthly_rate(new, lang)
-        if prefs.get("notif_event_rate", True) and abs(r_old - r_new) > 1e-6:
-            notes.append({
-                "entry_id": new.get("id"),
-                "type": "rate_changed",
-                "effective_month": datetime.now().strftime("%Y-%m"),
-                "text": t("notif_rate_changed").format(
-                    name=new.get("name",""),
-                    old=f"{r_old:.2f} {currency}",
-                    new=f"{r_new:.2f} {currency}",
-                ),
-                "read": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            })
-        nd_old, nd_new = get_next_due_text(old, lang), get_next_due_text(new, lang)
+        r_old, r_new = _cents(_monthly_rate(old, lang)), _cents(_monthly_rate(new, lang))
+        if prefs.get("notif_event_rate", True) and r_old != r_new:
+            notes.append(_note("rate_changed", new, old=r_old, new=r_new))
+        nd_old, nd_new = _month_index(get_next_due_date(old, lang)), _month_index(get_next_due_date(new, lang))
         if prefs.get("notif_event_due", True) and nd_old != nd_new:
-            notes.append({
-                "entry_id": new.get("id"),
-                "type": "due_changed",
-                "effective_month": datetime.now().strftime("%Y-%m"),
-                "text": t("notif_due_changed").format(name=new.get("name",""), old=nd_old, new=nd_new),
-                "read": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            })
-        amt_old, amt_new = float(old.get("amount",0) or 0), float(new.get("amount",0) or 0)
-        if prefs.get("notif_event_amount", True) and abs(amt_old - amt_new) > 1e-6:
-            notes.append({
-                "entry_id": new.get("id"),
-                "type": "amount_changed",
-                "effective_month": datetime.now().strftime("%Y-%m"),
-                "text": t("notif_amount_changed").format(
-                    name=new.get("name",""),
-                    old=f"{amt_old:.2f} {currency}",
-                    new=f"{amt_new:.2f} {currency}",
-                ),
-                "read": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            })
-        # cycle text wird im UI gerendert, hier genügt Typ
+            notes.append(_note("due_changed", new, old=nd_old, new=nd_new))
+        amt_old, amt_new = _cents(old.get("amount")), _cents(new.get("amount"))
+        if prefs.get("notif_event_amount", True) and amt_old != amt_new:
+            notes.append(_note("amount_changed", new, old=amt_old, new=amt_new))
         if prefs.get("notif_event_cycle", True) and (old.get("cycle"), old.get("custom_cycle")) != (new.get("cycle"), new.get("custom_cycle")):
-            notes.append({
-                "entry_id": new.get("id"),
-                "type": "cycle_changed",
-                "effective_month": datetime.now().strftime("%Y-%m"),
-                "text": t("notif_cycle_changed").format(name=new.get("name",""), old="-", new="-"),
-                "read": False,
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            })
+            notes.append(_note(
+                "cycle_changed", new,
+                old=safe_cycle_months(old, lang, _custom(lang)), new=safe_cycle_months(new, lang, _custom(lang)),
+            ))
         append_fn(notes)
     except Exception:
         pass
 
-def notify_on_delete(append_fn, entry: Dict, t):
+def notify_on_delete(append_fn, entry: Dict):
+    # ohne entry_id: der Vertrag ist weg, die Notiz soll nicht wieder im by_entry-Index landen
     try:
-        append_fn([{
-            "entry_id": entry.get("id"),
-            "type": "entry_deleted",
-            "effective_month": datetime.now().strftime("%Y-%m"),
-            "text": t("notif_deleted").format(name=entry.get("name","")),
-            "read": False,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }])
+        append_fn([{**_note("entry_deleted", entry), "entry_id": None}])
     except Exception:
         pass
 
-def ensure_monthly_notifications(load_entries_fn, load_notes_fn, save_notes_fn, lang: str, currency: str, t):
-    prefs = {}  # prefs check erfolgt im Aufrufer; hier einfache Variante
+def ensure_monthly_notifications(load_entries_fn, load_notes_fn, save_notes_fn, lang: str, today: Optional[date] = None):
     notes = load_notes_fn()
     existing = {(n.get("entry_id"), n.get("effective_month"), n.get("type")) for n in notes}
-    now = datetime.now().replace(day=1)
-    ym = now.strftime("%Y-%m")
+    month = (today or date.today()).replace(day=1)
+    ym = month.strftime("%Y-%m")
     new = []
     for e in load_entries_fn():
-        from .calc import get_next_due_date
-        nd = get_next_due_date(e, lang)
-        if nd and nd.year == now.year and nd.month == now.month:
-            key = (e["id"], ym, "due")
-            if key not in existing:
-                txt = t("notif_due_this_month").format(
-                    name=e.get("name",""),
-                    amount=f"{float(e.get('amount',0)):.2f} {currency}",
-                    due=f"{MONTHS[lang][nd.month]} {nd.year}",
-                    rate=f"{_monthly_rate(e, lang):.2f} {currency}",
+        nd = next_due_on_or_after(e, month, lang)
+        if nd and nd == month:
+            if (e["id"], ym, "due") not in existing:
+                note = _note(
+                    "due", e,
+                    amount=_cents(e.get("amount")), due=_month_index(nd), rate=_cents(_monthly_rate(e, lang)),
                 )
-                new.append({
-                    "entry_id": e["id"],
-                    "type": "due",
-                    "effective_month": ym,
-                    "text": txt,
-                    "read": False,
-                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                })
+                note["effective_month"] = ym
+                new.append(note)
     if new:
         save_notes_fn(notes + new)
+    return new
+
+def _month_text(idx, lang: str) -> str:
+    if idx is None:
+        return "—"
+    y, m = divmod(int(idx), 12)
+    return f"{MONTHS[lang][m + 1]} {y}"
+
+def _money(cents, currency: str) -> str:
+    return f"{int(cents or 0) / 100:.2f} {currency}"
+
+def _cycle_text(months, lang: str) -> str:
+    label = next((k for k, v in get_turnus_mapping(lang).items() if v == months), None)
+    if label is None:
+        return turnus_label({"cycle": _custom(lang), "custom_cycle": months}, lang, _custom(lang))
+    return turnus_label({"cycle": label}, lang, _custom(lang))
+
+# type -> (i18n key, {param: formatter}); formatter(value, lang, currency)
+_MONEY = lambda v, lang, cur: _money(v, cur)
+_MONTH = lambda v, lang, cur: _month_text(v, lang)
+_CYCLE = lambda v, lang, cur: _cycle_text(v, lang)
+_RAW = lambda v, lang, cur: v
+_RENDER = {
+    "new_entry": ("notif_new_entry", {"rate": _MONEY, "amount": _MONEY, "due": _MONTH}),
+    "rate_changed": ("notif_rate_changed", {"old": _MONEY, "new": _MONEY}),
+    "due_changed": ("notif_due_changed", {"old": _MONTH, "new": _MONTH}),
+    "amount_changed": ("notif_amount_changed", {"old": _MONEY, "new": _MONEY}),
+    "cycle_changed": ("notif_cycle_changed", {"old": _CYCLE, "new": _CYCLE}),
+    "entry_deleted": ("notif_deleted", {}),
+    "due": ("notif_due_this_month", {"amount": _MONEY, "due": _MONTH, "rate": _MONEY}),
+    "due_upcoming": ("notif_due_upcoming_title", {"due": _MONTH}),
+    "end_upcoming": ("notif_end_upcoming_title", {"end": _MONTH}),
+    "rule_due": ("notif_rule_due_title", {"due": _MONTH, "label": _RAW}),
+    "rule_end": ("notif_rule_end_title", {"end": _MONTH, "label": _RAW}),
+    "rule_budget": ("notif_rule_budget_title", {"total": _MONEY, "budget": _MONEY, "label": _RAW}),
+}
+
+def render_note(note: Dict, lang: str, currency: str) -> str:
+    """Localized sentence for a stored notification.
+
+    Legacy records keep their ready ``text``, or a ``title`` and no ``params``
+    (due/end reminders of older versions).
+    """
+    if note.get("text"):
+        return note["text"]
+    if "params" not in note and note.get("title"):
+        return note["title"]
+    spec = _RENDER.get(note.get("type"))
+    if spec is None:
+        return note.get("title") or str(note.get("type", "event"))
+    key, fmt = spec
+    params = note.get("params") or {}
+    values = {k: f(params.get(k), lang, currency) for k, f in fmt.items()}
+    try:
+        return get_text(lang, key).format(name=note.get("name", ""), **values)
+    except (KeyError, IndexError, ValueError):
+        return str(note.get("type"))
+
+def event_key(ev: Dict) -> Tuple:
+    """Dedup key of a generated event: ``(entry_id, rule, period)``; built-in rules use their type."""
+    return (ev.get("entry_id"), ev.get("rule_id") or ev.get("type"), ev.get("period"))
+
+_BUILTIN_TYPES = {"due_upcoming", "end_upcoming"}
+
+def _rule_event(rule: Rule, eid, row, today: date) -> Dict:
+    if rule.kind == "due":
+        when = today + timedelta(days=int(row["due_days"]))
+        params = {"due": _month_index(when)}
+    elif rule.kind == "end":
+        when = today + timedelta(days=int(row["end_days"]))
+        params = {"end": _month_index(when)}
+    else:  # budget: row ist die Summe der Monatsraten
+        when = today
+        params = {"total": _cents(row), "budget": _cents(rule.budget)}
+    ev = {"type": rule.id if rule.id in _BUILTIN_TYPES else f"rule_{rule.kind}", "entry_id": eid,
+          "period": when.strftime("%Y-%m"), "name": row["name"] if rule.kind != "budget" else "", "params": params}
+    if rule.id not in _BUILTIN_TYPES:
+        ev["rule_id"] = rule.id
+        params["label"] = rule.label or rule.id
+    ev.update(read=False, ts=today.isoformat())
+    return ev
 
-def evaluate_events(entries: list[dict], rules, lang: str, today: date | None = None) -> list[dict]:
-    """Create per-entry notification events based on upcoming dues and end dates."""
+def evaluate_calendar(cal: DueCalendar, rules: Dict[str, Rule], today: date, seen=None) -> list[dict]:
+    """Evaluate all enabled rules in one pass over the due calendar.
+
+    Candidates come from two range queries (largest due/end lead); the compiled
+    rule predicates then run as vectorized masks over one columnar snapshot of
+    those entries, so more rules cost a mask each, not a loop over entries.
+    """
+    seen = seen or set()
+    active = enabled_rules(rules)
+    per_entry = [r for r in active if r.kind in ("due", "end")]
+    out = []
+    if per_entry:
+        ids = {}
+        due_lead = max((r.lead_days for r in per_entry if r.kind == "due"), default=None)
+        end_lead = max((r.end_lead_days for r in per_entry if r.kind == "end"), default=None)
+        if due_lead is not None:
+            ids.update((eid, None) for _d, eid in cal.due_within(today, due_lead))
+        if end_lead is not None:
+            ids.update((eid, None) for _d, eid in cal.ending_within(today, end_lead))
+        snap = cal.snapshot(ids, today) if ids else None
+        if snap is not None and len(snap):
+            for rule in per_entry:
+                col = "due_days" if rule.kind == "due" else "end_days"
+                hits = snap.loc[compile_rule(rule)(snap)].sort_values(col, kind="stable")
+                out.extend(_rule_event(rule, eid, row, today) for eid, row in hits.iterrows())
+    for rule in active:
+        if rule.kind == "budget":
+            total = cal.monthly_total(today, rule.category)
+            if total > rule.budget:
+                out.append(_rule_event(rule, None, total, today))
+    return [ev for ev in out if event_key(ev) not in seen]
+
+def evaluate_events(entries: list[dict], rules, lang: str, today: date | None = None, seen=None) -> list[dict]:
+    """Create per-entry notification events based on upcoming dues and end dates.
+
+    ``period`` is the month the event refers to (due month / end month); events
+    whose :func:`event_key` is in ``seen`` are skipped.
+    """
     if today is None:
         today = date.today()
-    out = []
-    for e in entries:
-        # Nächste Fälligkeit
-        if rules["due_upcoming"].enabled:
-            months = months_to_next_occurrence(e, lang)
-            if months is not None:
-                # Einfacher Ansatz: wenn innerhalb lead_days
-                # (aus months grob in Tage umrechnen):
-                days = int(months * 30)  # pragmatisch
-                if 0 <= days <= rules["due_upcoming"].lead_days:
-                    out.append({
-                        "type": "due_upcoming",
-                        "entry_id": e["id"],
-                        "title": get_text(lang, "notif_due_upcoming_title").format(name=e["name"]),
-                        "read": False,
-                        "ts": today.isoformat(),
-                    })
-
-        # Enddatum
-        if rules["end_upcoming"].enabled and (end := e.get("end_date")):
-            try:
-                y, m = map(int, end.split("-")[:2])
-                # setze Enddatum auf den 1. des Monats
-                from datetime import date as _d
-                ed = _d(y, m, 1)
-                if 0 <= (ed - today).days <= rules["end_upcoming"].end_lead_days:
-                    out.append({
-                        "type": "end_upcoming",
-                        "entry_id": e["id"],
-                        "title": get_text(lang, "notif_end_upcoming_title").format(name=e["name"], end=end),
-                        "read": False,
-                        "ts": today.isoformat(),
-                    })
-            except Exception:
-                pass
-
-    return out
+    return evaluate_calendar(DueCalendar(entries, lang, today), rules, today, seen)
+
+def run_event_pass(
+    load_entries_fn: Callable[[], List[Dict]],
+    entries_version,
+    state: Optional[Dict],
+    rules,
+    lang: str,
+    today: date | None = None,
+    cache_key=None,
+) -> Tuple[List[Dict], Optional[Dict]]:
+    """Evaluate events at most once per day and entries version, each event only once.
+
+    ``state`` is the user's notify state (``day``, ``entries_version``, the
+    ``rules`` fingerprint and the ``seen`` dedup index). Returns the new events and the state to store, or
+    ``([], None)`` when the watermark says there is nothing to do. With a
+    ``cache_key`` the due calendar is kept in memory until the entries change.
+    """
+    if today is None:
+        today = date.today()
+    state = state or {}
+    fingerprint = rules_fingerprint(rules)
+    if (state.get("day") == today.isoformat() and state.get("entries_version") == entries_version
+            and state.get("rules", fingerprint) == fingerprint):
+        return [], None
+    # Perioden vor dem aktuellen Monat können nicht wiederkommen -> Index bleibt klein
+    current = today.strftime("%Y-%m")
+    seen = {tuple(k) for k in state.get("seen", []) if len(k) == 3 and str(k[2]) >= current}
+    cal = cached_calendar(cache_key, entries_version, load_entries_fn, lang, today)
+    new = evaluate_calendar(cal, rules, today, seen)
+    seen.update(event_key(ev) for ev in new)
+    return new, {
+        **state,
+        "day": today.isoformat(),
+        "entries_version": entries_version,
+        "rules": fingerprint,
+        "seen": [list(k) for k in sorted(seen, key=repr)],
+    }
+
+NOTIF_RETENTION_MONTHS = 3
+
+def run_notification_pass(store, lang: str, today: date | None = None, prefs: Optional[Dict] = None,
+                          retention_months: int = NOTIF_RETENTION_MONTHS) -> int:
+    """Deliver rule events and the monthly due notes for one user; returns the number of new notes.
+
+    ``store`` offers ``load_entries``, ``entries_version``, ``load_notes``,
+    ``save_notes``, ``append_notes``, ``archive_notes``, ``load_notify_state`` and
+    ``save_notify_state`` (see ``storage.UserStore`` and ``demo.DemoWorkspace``).
+    Rules and the monthly switch come from the user's ``prefs`` (``notif_*``).
+    The monthly pass is gated by a per-user ``month`` watermark in the notify state;
+    it also archives read notes older than ``retention_months``. New notes are
+    collected for the e-mail digest if the store ``sends_mail``.
+    """
+    prefs = prefs or {}
+    if today is None:
+        today = date.today()
+    state = store.load_notify_state() or {}
+    new, new_state = run_event_pass(
+        store.load_entries, store.entries_version(), state, rules_from_prefs(prefs), lang, today,
+        cache_key=getattr(store, "cache_key", None),
+    )
+    if new:
+        store.append_notes(new)
+    state = new_state or dict(state)
+    count = len(new)
+    ym = today.strftime("%Y-%m")
+    if state.get("month") != ym:
+        if prefs.get("notif_monthly_due", True):
+            monthly = ensure_monthly_notifications(store.load_entries, store.load_notes, store.save_notes, lang, today)
+            new = new + monthly
+            count += len(monthly)
+        y, m = divmod(today.year * 12 + today.month - 1 - max(0, int(retention_months)), 12)
+        store.archive_notes(f"{y:04d}-{m + 1:02d}")
+        state["month"] = ym
+        new_state = state
+    if store.sends_mail:
+        digest_state = collect_digest(store.username, state, new, prefs, lang, today)
+        if digest_state is not state:
+            state = new_state = digest_state
+    if new_state is not None:
+        store.save_notify_state(state)
+    return count
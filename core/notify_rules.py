@@ -1,5 +1,10 @@
-from dataclasses import dataclass
-from datetime import date
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+RULE_KINDS = ("due", "end", "budget")
 
 @dataclass(frozen=True)
 class Rule:
@@ -7,8 +12,83 @@ class Rule:
     enabled: bool
     lead_days: int = 14   # Vorlauf für Fälligkeiten
     end_lead_days: int = 30  # Vorlauf für Enddatum
+    kind: str = "due"     # "due" | "end" | "budget"
+    min_amount: Optional[float] = None  # nur Einträge mit Betrag >= min_amount
+    category: Optional[str] = None
+    account: Optional[str] = None
+    budget: Optional[float] = None      # "budget": Summe der Monatsraten > budget
+    label: str = ""
 
 DEFAULT_RULES = {
-    "due_upcoming": Rule("due_upcoming", True, lead_days=14),
-    "end_upcoming": Rule("end_upcoming", True, end_lead_days=30),
-}
\ No newline at end of file
+    "due_upcoming": Rule("due_upcoming", True, lead_days=14, kind="due"),
+    "end_upcoming": Rule("end_upcoming", True, end_lead_days=30, kind="end"),
+}
+
+def _opt_float(v) -> Optional[float]:
+    return float(v) if v not in (None, "") else None
+
+def rule_from_dict(raw: Dict) -> Rule:
+    """User rule as stored in prefs (``notif_rules``); raises ``ValueError`` on bad input."""
+    kind = raw.get("kind")
+    if kind not in RULE_KINDS or not raw.get("id"):
+        raise ValueError(f"invalid rule: {raw!r}")
+    days = int(raw.get("days", 14))
+    rule = Rule(
+        id=str(raw["id"]),
+        enabled=bool(raw.get("enabled", True)),
+        lead_days=days,
+        end_lead_days=days,
+        kind=kind,
+        min_amount=_opt_float(raw.get("min_amount")),
+        category=(raw.get("category") or None),
+        account=(raw.get("account") or None),
+        budget=_opt_float(raw.get("budget")),
+        label=str(raw.get("label") or ""),
+    )
+    if kind == "budget" and rule.budget is None:
+        raise ValueError("budget rule without budget")
+    return rule
+
+def rules_from_prefs(prefs: Optional[Dict]) -> Dict[str, Rule]:
+    """Built-in rules (switchable via ``notif_due_upcoming``/``notif_end_upcoming``) plus user rules."""
+    prefs = prefs or {}
+    rules = {
+        "due_upcoming": replace(DEFAULT_RULES["due_upcoming"], enabled=bool(prefs.get("notif_due_upcoming", True))),
+        "end_upcoming": replace(DEFAULT_RULES["end_upcoming"], enabled=bool(prefs.get("notif_end_upcoming", True))),
+    }
+    for raw in prefs.get("notif_rules") or []:
+        try:
+            rule = rule_from_dict(raw)
+        except (TypeError, ValueError):
+            continue  # kaputte Regel nicht die ganze Auswertung kosten lassen
+        rules.setdefault(rule.id, rule)
+    return rules
+
+def rules_fingerprint(rules: Dict[str, Rule]) -> str:
+    return repr(sorted((r.id, r) for r in rules.values() if r.enabled))
+
+@lru_cache(maxsize=512)
+def compile_rule(rule: Rule) -> Callable[[pd.DataFrame], pd.Series]:
+    """Per-entry predicate of ``rule`` as a vectorized mask over a calendar snapshot.
+
+    The snapshot has the columns ``amount``, ``category``, ``konto``,
+    ``due_days`` and ``end_days`` (days from today, NaN if none).
+    """
+    col, lead = ("due_days", rule.lead_days) if rule.kind == "due" else ("end_days", rule.end_lead_days)
+    category = rule.category.casefold() if rule.category else None
+    account = rule.account.casefold() if rule.account else None
+
+    def predicate(df: pd.DataFrame) -> pd.Series:
+        mask = df[col].between(0, lead)
+        if rule.min_amount is not None:
+            mask &= df["amount"] >= rule.min_amount
+        if category is not None:
+            mask &= df["category"].str.casefold() == category
+        if account is not None:
+            mask &= df["konto"].str.casefold() == account
+        return mask
+
+    return predicate
+
+def enabled_rules(rules: Dict[str, Rule]) -> List[Rule]:
+    return [r for r in rules.values() if r.enabled]
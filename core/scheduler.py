@@ -0,0 +1,185 @@
+# core/scheduler.py
+"""Background delivery of due/end/monthly notifications for all users with a live key.
+
+Data is encrypted per user, so the scheduler can only work for users whose data
+key is known: sessions register it on every render (cheap dict update), and it
+expires after the session idle TTL. Page renders then only read notifications.
+"""
+from __future__ import annotations
+import threading, time
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+from .auth import get_user_prefs
+from .config import load_settings
+from .digest import deliver_outbox
+from .due_index import drop_calendars
+from .fileio import ConflictError, transaction
+from .notify import NOTIF_RETENTION_MONTHS, run_notification_pass
+from .sessions import SESSION_IDLE_TTL_S, _zero
+from .storage import UserStore
+
+SCHEDULER_INTERVAL_S = 300.0
+SCHEDULER_BATCH = 50
+
+
+class NotificationScheduler:
+    """Daemon thread that runs :func:`run_notification_pass` for registered users in batches.
+
+    Each user's notify state carries the watermarks (day/entries version for
+    events, ``month`` for the monthly pass), so a tick for an unchanged user is
+    a stat plus one small read. Newly registered users are processed right away.
+    """
+
+    def __init__(self, interval_s: float = SCHEDULER_INTERVAL_S, batch_size: int = SCHEDULER_BATCH,
+                 key_ttl_s: float = SESSION_IDLE_TTL_S, retention_months: int = NOTIF_RETENTION_MONTHS,
+                 deliver: Optional[Callable[[], Dict]] = None):
+        self.interval_s = float(interval_s)
+        self.batch_size = max(1, int(batch_size))
+        self.key_ttl_s = float(key_ttl_s)
+        self.retention_months = int(retention_months)
+        self.deliver = deliver  # Digest-Outbox nach jedem Lauf zustellen
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict] = {}
+        self._due: List[str] = []  # sofort zu bearbeiten (neu registriert)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._runs = 0
+        self._delivered = 0
+        self._errors = 0
+        self._last_run_ms = 0.0
+        self._mail = {"sent": 0, "deferred": 0, "failed": 0}
+
+    def register(self, username: str, fkey: Optional[bytes], lang: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._users.get(username)
+            if item is not None and bytes(item["key"]) == (fkey or b""):
+                item.update(seen=now, lang=lang)
+                return
+            if item is not None:
+                _zero(item["key"])
+            self._users[username] = {
+                "key": bytearray(fkey or b""), "lang": lang, "seen": now,
+            }
+            self._due.append(username)
+        self._wake.set()
+
+    def unregister(self, username: str) -> None:
+        with self._lock:
+            item = self._users.pop(username, None)
+            if item is not None:
+                _zero(item["key"])
+        drop_calendars(UserStore(username).cache_key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._users)
+
+    def _snapshot(self, names: Optional[List[str]] = None) -> List[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            for name in [n for n, v in self._users.items() if now - v["seen"] > self.key_ttl_s]:
+                _zero(self._users.pop(name)["key"])
+                drop_calendars(UserStore(name).cache_key)
+            wanted = self._users if names is None else [n for n in names if n in self._users]
+            return [
+                (n, bytes(self._users[n]["key"]) or None, self._users[n]["lang"]) for n in wanted
+            ]
+
+    def run_once(self, today: Optional[date] = None, names: Optional[List[str]] = None) -> int:
+        """Process the given (default: all registered) users; returns the number of new notes."""
+        t0 = time.perf_counter()
+        jobs = self._snapshot(names)
+        delivered = errors = 0
+        for i in range(0, len(jobs), self.batch_size):
+            for username, fkey, lang in jobs[i:i + self.batch_size]:
+                try:
+                    with transaction():
+                        delivered += run_notification_pass(
+                            UserStore(username, fkey), lang, today, prefs=get_user_prefs(username),
+                            retention_months=self.retention_months,
+                        )
+                except ConflictError:
+                    pass  # parallel geändert -> nächster Lauf
+                except Exception:
+                    errors += 1  # z. B. Key nach Passwortwechsel veraltet
+            if self._stop.is_set():
+                break
+        with self._lock:
+            self._runs += 1
+            self._delivered += delivered
+            self._errors += errors
+            self._last_run_ms = round(1000 * (time.perf_counter() - t0), 1)
+        if self.deliver is not None:
+            try:
+                result = self.deliver()
+            except Exception:
+                result = {}
+            with self._lock:
+                for k in self._mail:
+                    self._mail[k] += int(result.get(k, 0))
+        return delivered
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="notif-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        next_full = time.monotonic()
+        while not self._stop.is_set():
+            self._wake.wait(max(0.0, next_full - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                due, self._due = self._due, []
+            if time.monotonic() >= next_full:
+                self.run_once()
+                next_full = time.monotonic() + self.interval_s
+            elif due:
+                self.run_once(names=due)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "interval_s": self.interval_s,
+                "runs": self._runs,
+                "delivered": self._delivered,
+                "errors": self._errors,
+                "last_run_ms": self._last_run_ms,
+                "mail": dict(self._mail),
+            }
+
+
+_SCHEDULER: Optional[NotificationScheduler] = None
+_SCHEDULER_CHECKED = False
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def notification_scheduler() -> Optional[NotificationScheduler]:
+    """Process-wide scheduler (started on first use), or None unless ``"notif_scheduler": true``."""
+    global _SCHEDULER, _SCHEDULER_CHECKED
+    with _SCHEDULER_LOCK:
+        if not _SCHEDULER_CHECKED:
+            settings = load_settings()
+            if settings.get("notif_scheduler", False):
+                _SCHEDULER = NotificationScheduler(
+                    interval_s=float(settings.get("notif_scheduler_interval_s", SCHEDULER_INTERVAL_S)),
+                    key_ttl_s=float(settings.get("session_idle_ttl_min", SESSION_IDLE_TTL_S / 60)) * 60,
+                    retention_months=int(settings.get("notif_retention_months", NOTIF_RETENTION_MONTHS)),
+                    deliver=deliver_outbox if settings.get("smtp_host") else None,
+                )
+                _SCHEDULER.start()
+            _SCHEDULER_CHECKED = True
+        return _SCHEDULER
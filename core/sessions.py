@@ -0,0 +1,128 @@
+# core/sessions.py
+from __future__ import annotations
+import hashlib, hmac, secrets, threading, time
+from typing import Dict, Optional, Tuple
+
+from .config import load_settings
+
+SESSION_IDLE_TTL_S = 30 * 60
+SESSION_MAX = 1_000
+_PURGE_EVERY_S = 60.0
+
+
+def _zero(buf: bytearray) -> None:
+    """Overwrite key material in place (Python-Kopien lassen sich nicht erreichen)."""
+    buf[:] = bytes(len(buf))
+
+
+def _token_id(token: str) -> str:
+    # nur der Hash des Tokens liegt im Speicher
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionKeyStore:
+    """In-memory map of opaque session tokens to unwrapped data keys.
+
+    Entries expire after ``idle_ttl`` seconds without :meth:`resume`; dropping
+    or expiring an entry zeroes the stored key. ``binding`` (e.g. a hash of the
+    User-Agent) must match on resume so a leaked token alone is not enough.
+    """
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL_S, max_sessions: int = SESSION_MAX):
+        self.idle_ttl = float(idle_ttl)
+        self.max_sessions = int(max_sessions)
+        self._lock = threading.Lock()
+        self._items: Dict[str, Dict] = {}
+        self._last_purge = time.monotonic()
+
+    def create(self, user: Dict, data_key: bytes, binding: str = "") -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self._purge_locked(now, force=len(self._items) >= self.max_sessions)
+            if len(self._items) >= self.max_sessions:
+                # ältesten Eintrag verdrängen
+                oldest = min(self._items, key=lambda k: self._items[k]["seen"])
+                self._drop_locked(oldest)
+            self._items[_token_id(token)] = {
+                "user": dict(user),
+                "key": bytearray(data_key),
+                "binding": binding,
+                "seen": now,
+            }
+        return token
+
+    def resume(self, token: str, binding: str = "") -> Optional[Tuple[Dict, bytes]]:
+        """Return ``(user, data_key)`` for a live token and refresh its idle timer."""
+        now = time.monotonic()
+        tid = _token_id(token or "")
+        with self._lock:
+            self._purge_locked(now)
+            item = self._items.get(tid)
+            if not item or now - item["seen"] > self.idle_ttl:
+                if item:
+                    self._drop_locked(tid)
+                return None
+            if not hmac.compare_digest(item["binding"], binding):
+                return None
+            item["seen"] = now
+            return dict(item["user"]), bytes(item["key"])
+
+    def drop(self, token: str) -> None:
+        with self._lock:
+            self._drop_locked(_token_id(token or ""))
+
+    def drop_user(self, username: str) -> None:
+        """Drop every session of ``username`` (deactivation, deletion, password reset)."""
+        with self._lock:
+            for tid in [k for k, v in self._items.items() if v["user"].get("username") == username]:
+                self._drop_locked(tid)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def _drop_locked(self, tid: str) -> None:
+        item = self._items.pop(tid, None)
+        if item:
+            _zero(item["key"])
+
+    def _purge_locked(self, now: float, force: bool = False) -> None:
+        if not force and now - self._last_purge < _PURGE_EVERY_S:
+            return
+        self._last_purge = now
+        for tid in [k for k, v in self._items.items() if now - v["seen"] > self.idle_ttl]:
+            self._drop_locked(tid)
+
+
+_STORE: Optional[SessionKeyStore] = None
+_STORE_CHECKED = False
+_STORE_LOCK = threading.Lock()
+
+
+def session_store() -> Optional[SessionKeyStore]:
+    """Process-wide store, or None unless ``"session_store": true`` is set in ``settings.json``."""
+    global _STORE, _STORE_CHECKED
+    with _STORE_LOCK:
+        if not _STORE_CHECKED:
+            settings = load_settings()
+            if settings.get("session_store"):
+                _STORE = SessionKeyStore(idle_ttl=float(settings.get("session_idle_ttl_min", 30)) * 60)
+            _STORE_CHECKED = True
+        return _STORE
+
+
+def client_binding(user_agent: Optional[str]) -> str:
+    return hashlib.sha256((user_agent or "").encode("utf-8")).hexdigest()
+
+
+def forwarded_client_ip(peer: str, headers: Dict[str, str], trusted) -> str:
+    """Client address for the login backoff: forwarding headers only from a ``trusted`` proxy.
+
+    ``headers`` keys are lower-case.
+    """
+    if peer not in trusted:
+        return peer
+    # der Proxy hängt die Adresse an, die er gesehen hat; weiter links steht Client-Eingabe
+    forwarded = headers.get("x-real-ip") or (headers.get("x-forwarded-for") or "").split(",")[-1]
+    return forwarded.strip() or peer
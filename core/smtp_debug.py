@@ -0,0 +1,99 @@
+# core/smtp_debug.py
+"""Minimal local SMTP sink for trying out digest delivery (stdlib only).
+
+    python -m core.smtp_debug --port 8025
+
+prints every received message; point ``"smtp_host": "localhost"`` and
+``"smtp_port": 8025`` in ``settings.json`` at it. No TLS, no auth.
+"""
+from __future__ import annotations
+import argparse, socketserver, threading
+from typing import Callable, Dict, List, Optional
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self) -> None:
+        server: DebugSMTPServer = self.server  # type: ignore[assignment]
+        with server.lock:
+            server.connections += 1
+        self._reply("220 localhost debug SMTP")
+        mail_from, rcpt = "", []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode("utf-8", "replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb in ("HELO", "EHLO"):
+                self._reply("250 localhost")
+            elif verb == "MAIL":
+                mail_from, rcpt = cmd[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt.append(cmd[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                server.received({"from": mail_from, "to": rcpt, "data": b"".join(data).decode("utf-8", "replace")})
+                self._reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    """Collects messages in ``messages`` (and passes them to ``on_message``)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "localhost", port: int = 8025,
+                 on_message: Optional[Callable[[Dict], None]] = None):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.messages: List[Dict] = []
+        self.connections = 0
+        self.on_message = on_message
+
+    def received(self, msg: Dict) -> None:
+        with self.lock:
+            self.messages.append(msg)
+        if self.on_message is not None:
+            self.on_message(msg)
+
+    def start(self) -> threading.Thread:
+        th = threading.Thread(target=self.serve_forever, name="smtp-debug", daemon=True)
+        th.start()
+        return th
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="localhost")
+    ap.add_argument("--port", type=int, default=8025)
+    args = ap.parse_args(argv)
+    server = DebugSMTPServer(args.host, args.port, on_message=lambda m: print(f"--- {m['to']}\n{m['data']}", flush=True))
+    print(f"debug SMTP on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
-import json, base64, os
+import io, json, base64, os, threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Set, Tuple, Any
-from .config import BASE_DIR
-from .crypto import encrypt_bytes, decrypt_bytes
+from typing import BinaryIO, Callable, Iterator, List, Dict, Optional, Set, Tuple, Any
+from .config import BASE_DIR, ensure_dirs
+from .fileio import ConflictError, file_etag, locked, open_read, read_bytes, transaction, write_atomic
+from .crypto import (
+    STREAM_MAGIC, IterStream, decrypt_bytes, encrypt_stream, is_stream_ciphertext, iter_decrypt_stream,
+)
+
+_USER_DIRS: Set[Path] = set()
 
 def _user_dir(username: str) -> Path:
-    """Return/Create absolute data directory for a given user."""
+    """Return/Create absolute data directory for a given user (mkdir once per process)."""
     p = BASE_DIR / "data" / "users" / username
-    p.mkdir(parents=True, exist_ok=True)
+    if p not in _USER_DIRS:
+        p.mkdir(parents=True, exist_ok=True)
+        _USER_DIRS.add(p)
     return p
 
 def user_entries_path(username: str) -> Path:
@@ -17,6 +24,18 @@ def user_entries_path(username: str) -> Path:
 def user_notifications_path(username: str) -> Path:
     return _user_dir(username) / "notifications.json"
 
+def user_notify_state_path(username: str) -> Path:
+    return _user_dir(username) / "notify_state.json"
+
+def user_notifications_meta_path(username: str) -> Path:
+    return _user_dir(username) / "notifications.meta.json"
+
+def user_notifications_archive_dir(username: str) -> Path:
+    return _user_dir(username) / "archive"
+
+def _archive_segment_path(username: str, month: str) -> Path:
+    return user_notifications_archive_dir(username) / f"notifications-{month}.json"
+
 # --------- intern: enc-wrapper ---------
 ENC_MARK = "__rp_enc__"
 ENC_KIND = "fernet"
@@ -25,9 +44,18 @@ def _load_json_or_enc(p: Path, fkey: Optional[bytes]) -> Tuple[Optional[Any], bo
     """Load JSON file that may be plaintext or encrypted.
     Returns (payload, was_encrypted).
     """
-    if not p.exists():
+    f = open_read(p)
+    if f is None:
         return None, False  # (payload, encrypted?)
-    raw = p.read_bytes()
+    with f:
+        head = f.read(len(STREAM_MAGIC))
+        if is_stream_ciphertext(head):
+            if not fkey:
+                raise ValueError("Encrypted data present but no key provided")
+            f.seek(0)
+            # Datei -> Chunks -> JSON, ohne den Chiffretext ganz einzulesen
+            return _load_json_stream(f, fkey), True
+        raw = head + f.read()
     try:
         data = json.loads(raw.decode("utf-8"))
         if isinstance(data, dict) and data.get(ENC_MARK) == ENC_KIND:
@@ -47,50 +75,296 @@ def _load_json_or_enc(p: Path, fkey: Optional[bytes]) -> Tuple[Optional[Any], bo
          payload = json.loads(dec.decode("utf-8"))
          return payload, True
 
+def _load_json_stream(src: BinaryIO, fkey: bytes) -> Any:
+    return json.load(io.TextIOWrapper(io.BufferedReader(IterStream(iter_decrypt_stream(src, fkey))), encoding="utf-8"))
+
 def _dump_json_enc(payload: Any, fkey: Optional[bytes]) -> bytes:
-    """Dump payload to bytes, optionally encrypted with Fernet."""
+    """Dump payload to bytes; with ``fkey`` as an AES-GCM stream (no base64 wrapper)."""
+    raw = json.dumps(payload, ensure_ascii=False, indent=None if fkey else 2).encode("utf-8")
     if not fkey:
-        return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
-    ct = encrypt_bytes(json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8"), fkey)
-    wrapper = {ENC_MARK: ENC_KIND, "ct": base64.b64encode(ct).decode("ascii")}
-    return json.dumps(wrapper, ensure_ascii=False, indent=2).encode("utf-8")
+        return raw
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(raw), out, fkey)
+    return out.getvalue()
 
-# --------- öffentliche API ---------
-def load_entries(username: str, fkey: Optional[bytes] = None) -> List[Dict]:
-    p = user_entries_path(username)
+def _load_list(p: Path, fkey: Optional[bytes]) -> List[Dict]:
     payload, _enc = _load_json_or_enc(p, fkey)
     if payload is None: return []
     return payload if isinstance(payload, list) else []
 
-def save_entries(username: str, entries: List[Dict], fkey: Optional[bytes] = None) -> None:
-    p = user_entries_path(username)
-    tmp = p.with_suffix(p.suffix + ".tmp")
-    tmp.write_bytes(_dump_json_enc(entries, fkey))
-    tmp.replace(p)
+def _load_list_versioned(p: Path, fkey: Optional[bytes]) -> Tuple[List[Dict], Optional[str]]:
+    # unter Lock lesen, damit etag und Inhalt zusammenpassen
+    with locked(p):
+        return _load_list(p, fkey), file_etag(p)
+
+def _update_list(
+    p: Path,
+    mutate: Callable[[List[Dict]], Optional[List[Dict]]],
+    fkey: Optional[bytes],
+    retries: int,
+) -> List[Dict]:
+    """Optimistic read-modify-write: ``mutate`` runs without the lock, the save is a CAS.
+
+    On a concurrent change the read and ``mutate`` are repeated up to ``retries``
+    times, then :class:`ConflictError` is raised.
+    """
+    attempt = 0
+    while True:
+        items, etag = _load_list_versioned(p, fkey)
+        result = mutate(items)
+        new = items if result is None else result
+        try:
+            write_atomic(p, _dump_json_enc(new, fkey), expected_etag=etag)
+            return new
+        except ConflictError:
+            attempt += 1
+            if attempt > retries:
+                raise
+
+# --------- öffentliche API ---------
+def load_entries(username: str, fkey: Optional[bytes] = None) -> List[Dict]:
+    return _load_list(user_entries_path(username), fkey)
+
+def load_entries_versioned(username: str, fkey: Optional[bytes] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Return ``(entries, etag)``; pass the etag to :func:`save_entries` for a compare-and-swap."""
+    return _load_list_versioned(user_entries_path(username), fkey)
+
+def save_entries(username: str, entries: List[Dict], fkey: Optional[bytes] = None, expected_etag: Optional[str] = "*") -> str:
+    return write_atomic(user_entries_path(username), _dump_json_enc(entries, fkey), expected_etag)
+
+def update_entries(
+    username: str,
+    mutate: Callable[[List[Dict]], Optional[List[Dict]]],
+    fkey: Optional[bytes] = None,
+    retries: int = 3,
+) -> List[Dict]:
+    """Apply ``mutate`` (returns a new list or edits in place) to the entries without losing concurrent updates."""
+    return _update_list(user_entries_path(username), mutate, fkey, retries)
+
+# Notifications: ``notifications.json`` holds unread and recent notes; read notes older
+# than the retention are moved to monthly segments in ``archive/``. The unread
+# counter lives in a small plaintext ``notifications.meta.json`` that is written
+# together with the notes, so the topbar never has to decrypt them.
 
 def load_notifications(username: str, fkey: Optional[bytes] = None) -> List[Dict]:
-    p = user_notifications_path(username)
-    payload, _enc = _load_json_or_enc(p, fkey)
-    if payload is None: return []
-    return payload if isinstance(payload, list) else []
+    return _load_list(user_notifications_path(username), fkey)
+
+def _read_notes_meta(username: str) -> Optional[Dict]:
+    raw = read_bytes(user_notifications_meta_path(username))
+    if raw is None:
+        return None
+    try:
+        meta = json.loads(raw.decode("utf-8"))
+        return meta if isinstance(meta, dict) and "by_entry" in meta else None
+    except ValueError:
+        return None
+
+def _write_notes_meta(username: str, notes: List[Dict], archived: Optional[Dict[str, List[str]]] = None) -> None:
+    """Unread counter plus the entry index: positions in the current file, months in the archive."""
+    if archived is None:
+        archived = (_read_notes_meta(username) or {}).get("archived", {})
+    by_entry: Dict[str, List[int]] = {}
+    for i, n in enumerate(notes):
+        if n.get("entry_id"):
+            by_entry.setdefault(n["entry_id"], []).append(i)
+    meta = {"unread": sum(1 for n in notes if not n.get("read")), "by_entry": by_entry, "archived": archived}
+    write_atomic(user_notifications_meta_path(username), json.dumps(meta).encode("utf-8"))
+
+def _notes_meta(username: str, fkey: Optional[bytes]) -> Dict:
+    """Meta file; rebuilt once from notes and archive (e.g. data from older versions)."""
+    meta = _read_notes_meta(username)
+    if meta is None:
+        archived: Dict[str, List[str]] = {}
+        for month in archive_segments(username):
+            for n in _load_list(_archive_segment_path(username, month), fkey):
+                if n.get("entry_id") and month not in archived.setdefault(n["entry_id"], []):
+                    archived[n["entry_id"]].append(month)
+        _write_notes_meta(username, load_notifications(username, fkey), archived)
+        meta = _read_notes_meta(username)
+    return meta
+
+def save_notifications(username: str, notes: List[Dict], fkey: Optional[bytes] = None, expected_etag: Optional[str] = "*") -> str:
+    with transaction():
+        etag = write_atomic(user_notifications_path(username), _dump_json_enc(notes, fkey), expected_etag)
+        _write_notes_meta(username, notes)
+    return etag
+
+def update_notifications(
+    username: str,
+    mutate: Callable[[List[Dict]], Optional[List[Dict]]],
+    fkey: Optional[bytes] = None,
+    retries: int = 3,
+) -> List[Dict]:
+    with transaction():
+        notes = _update_list(user_notifications_path(username), mutate, fkey, retries)
+        _write_notes_meta(username, notes)
+    return notes
+
+def append_notifications(username: str, new_notes: List[Dict], fkey: Optional[bytes] = None) -> None:
+    if new_notes:
+        update_notifications(username, lambda notes: notes + list(new_notes), fkey)
+
+def unread_notifications(username: str, fkey: Optional[bytes] = None) -> int:
+    """Number of unread notifications from the meta file (built once from the notes if missing)."""
+    return int(_notes_meta(username, fkey)["unread"])
+
+def mark_notifications_read(username: str, fkey: Optional[bytes] = None) -> None:
+    if unread_notifications(username, fkey):
+        update_notifications(username, lambda notes: [{**n, "read": True} for n in notes], fkey)
+
+def _note_month(n: Dict) -> str:
+    return str(n.get("effective_month") or n.get("ts") or n.get("created_at") or "")[:7]
+
+def archive_segments(username: str) -> List[str]:
+    """Months with an archive segment, newest first."""
+    adir = user_notifications_archive_dir(username)
+    if not adir.exists():
+        return []
+    return sorted((p.stem[len("notifications-"):] for p in adir.glob("notifications-*.json")), reverse=True)
+
+def archive_notifications(username: str, before_month: str, fkey: Optional[bytes] = None) -> int:
+    """Move read notes of months before ``before_month`` (``YYYY-MM``) into monthly segments."""
+    with transaction():
+        archived = _notes_meta(username, fkey)["archived"]
+        notes, etag = _load_list_versioned(user_notifications_path(username), fkey)
+        old: Dict[str, List[Dict]] = {}
+        keep = []
+        for n in notes:
+            month = _note_month(n)
+            if n.get("read") and month and month < before_month:
+                old.setdefault(month, []).append(n)
+            else:
+                keep.append(n)
+        if not old:
+            return 0
+        user_notifications_archive_dir(username).mkdir(parents=True, exist_ok=True)
+        for month, moved in old.items():
+            seg = _archive_segment_path(username, month)
+            write_atomic(seg, _dump_json_enc(_load_list(seg, fkey) + moved, fkey))
+            for n in moved:
+                if n.get("entry_id") and month not in archived.setdefault(n["entry_id"], []):
+                    archived[n["entry_id"]].append(month)
+        write_atomic(user_notifications_path(username), _dump_json_enc(keep, fkey), expected_etag=etag)
+        _write_notes_meta(username, keep, archived)
+    return len(notes) - len(keep)
+
+def purge_entry_notifications(username: str, entry_id: str, fkey: Optional[bytes] = None) -> int:
+    """Remove all notifications of a deleted entry via the entry index; returns how many.
+
+    Only the positions listed in the index are checked and only archive
+    segments that hold notes of this entry are rewritten.
+    """
+    with transaction():
+        meta = _notes_meta(username, fkey)
+        months = meta["archived"].pop(entry_id, [])
+        removed = 0
+        if entry_id in meta["by_entry"]:
+            offsets = meta["by_entry"][entry_id]
+
+            def _drop(notes: List[Dict]) -> List[Dict]:
+                nonlocal removed
+                hits = {i for i in offsets if i < len(notes) and notes[i].get("entry_id") == entry_id}
+                if len(hits) != len(offsets):  # Index veraltet (paralleler Schreiber) -> voll filtern
+                    hits = {i for i, n in enumerate(notes) if n.get("entry_id") == entry_id}
+                removed = len(hits)
+                return [n for i, n in enumerate(notes) if i not in hits]
+
+            notes = _update_list(user_notifications_path(username), _drop, fkey, retries=3)
+        else:
+            notes = load_notifications(username, fkey)
+        for month in months:
+            seg = _archive_segment_path(username, month)
+            items = _load_list(seg, fkey)
+            rest = [n for n in items if n.get("entry_id") != entry_id]
+            removed += len(items) - len(rest)
+            write_atomic(seg, _dump_json_enc(rest, fkey))
+        _write_notes_meta(username, notes, meta["archived"])
+    return removed
+
+def iter_notifications(username: str, fkey: Optional[bytes] = None, entry_id: Optional[str] = None) -> Iterator[Dict]:
+    """Notifications newest first; archive segments are only decrypted when reached.
+
+    With ``entry_id`` only that contract's notes are returned, using the entry
+    index instead of scanning (archive segments without its notes are skipped).
+    """
+    if entry_id is None:
+        yield from reversed(load_notifications(username, fkey))
+        for month in archive_segments(username):
+            yield from reversed(_load_list(_archive_segment_path(username, month), fkey))
+        return
+    meta = _notes_meta(username, fkey)
+    notes = load_notifications(username, fkey)
+    for i in reversed(meta["by_entry"].get(entry_id, [])):
+        if i < len(notes) and notes[i].get("entry_id") == entry_id:
+            yield notes[i]
+    for month in sorted(meta["archived"].get(entry_id, []), reverse=True):
+        yield from (n for n in reversed(_load_list(_archive_segment_path(username, month), fkey))
+                    if n.get("entry_id") == entry_id)
+
+def entries_version(username: str) -> Optional[str]:
+    """Cheap change marker of the user's entries (file etag)."""
+    return file_etag(user_entries_path(username))
+
+def load_notify_state(username: str, fkey: Optional[bytes] = None) -> Dict:
+    try:
+        payload, _enc = _load_json_or_enc(user_notify_state_path(username), fkey)
+    except Exception:
+        return {}  # z. B. unlesbar -> wird beim nächsten Lauf neu aufgebaut
+    return payload if isinstance(payload, dict) else {}
+
+def save_notify_state(username: str, state: Dict, fkey: Optional[bytes] = None) -> str:
+    return write_atomic(user_notify_state_path(username), _dump_json_enc(state, fkey))
+
+class UserStore:
+    """A user's entries, notifications and notify state bound to one key (for background jobs)."""
+
+    sends_mail = True  # Benachrichtigungen dürfen in den E-Mail-Digest
+
+    def __init__(self, username: str, fkey: Optional[bytes] = None):
+        self.username, self.fkey = username, fkey
+        self.cache_key = ("user", username)  # für In-Memory-Indizes (Fälligkeitskalender)
+
+    def load_entries(self) -> List[Dict]:
+        return load_entries(self.username, self.fkey)
+
+    def entries_version(self) -> Optional[str]:
+        return entries_version(self.username)
+
+    def load_notes(self) -> List[Dict]:
+        return load_notifications(self.username, self.fkey)
+
+    def save_notes(self, notes: List[Dict]) -> None:
+        save_notifications(self.username, notes, self.fkey)
+
+    def append_notes(self, notes: List[Dict]) -> None:
+        append_notifications(self.username, notes, self.fkey)
+
+    def archive_notes(self, before_month: str) -> int:
+        return archive_notifications(self.username, before_month, self.fkey)
 
-def save_notifications(username: str, notes: List[Dict], fkey: Optional[bytes] = None) -> None:
-    p = user_notifications_path(username)
-    tmp = p.with_suffix(p.suffix + ".tmp")
-    tmp.write_bytes(_dump_json_enc(notes, fkey))
-    tmp.replace(p)
+    def purge_entry_notes(self, entry_id: str) -> int:
+        return purge_entry_notifications(self.username, entry_id, self.fkey)
+
+    def load_notify_state(self) -> Dict:
+        return load_notify_state(self.username, self.fkey)
+
+    def save_notify_state(self, state: Dict) -> None:
+        save_notify_state(self.username, state, self.fkey)
 
 def backup_entries(username: str, reason: str, fkey: Optional[bytes] = None) -> None:
     try:
         bdir = _user_dir(username) / "backups"
         bdir.mkdir(parents=True, exist_ok=True)
         ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-        # sichern IMMER verschlüsselt, wenn Key vorhanden
-        src = user_entries_path(username)
-        if src.exists():
-            payload, _ = _load_json_or_enc(src, fkey)
-            data = _dump_json_enc(payload or [], fkey)
-            (bdir / f"entries_{ts}_{reason}.json").write_bytes(data)
+        # Stream-Chiffretext wird 1:1 kopiert (der DataKey ändert sich nicht);
+        # Klartext/Altformat mit Key wird beim Sichern verschlüsselt
+        raw = read_bytes(user_entries_path(username))
+        if raw is None:
+            return
+        if fkey and not is_stream_ciphertext(raw):
+            payload, _ = _load_json_or_enc(user_entries_path(username), fkey)
+            raw = _dump_json_enc(payload, fkey)
+        write_atomic(bdir / f"entries_{ts}_{reason}.json", raw)
     except Exception as ex:
         # best-effort: don't crash the app on backup failure
         #         # (could plug in a logger here)
@@ -99,36 +373,33 @@ def backup_entries(username: str, reason: str, fkey: Optional[bytes] = None) ->
 def wipe_user(username: str) -> None:
     save_entries(username, [], None)
     save_notifications(username, [], None)
-    bdir = _user_dir(username) / "backups"
-    if bdir.exists():
-        for fn in bdir.iterdir():
-            try: fn.unlink()
-            except Exception: pass
-
-def rewrap_user_data(username: str, old_fkey: Optional[bytes], new_fkey: bytes) -> None:
-    try:
-        # entries
-        entries = load_entries(username, old_fkey)
-        save_entries(username, entries, new_fkey)
-        # notifications
-        notes = load_notifications(username, old_fkey)
-        save_notifications(username, notes, new_fkey)
-        # backups rewrap (best effort)
-        bdir = _user_dir(username) / "backups"
-        if bdir.exists():
-            for fp in bdir.glob("*.json"):
-                try:
-                    payload, _ = _load_json_or_enc(fp, old_fkey)
-                    if payload is None: payload = []
-                    fp.write_bytes(_dump_json_enc(payload, new_fkey))
-                except Exception:
-                    continue
-    except Exception as ex:
-        _ = ex
+    save_notify_state(username, {}, None)
+    for d in (_user_dir(username) / "backups", user_notifications_archive_dir(username)):
+        if d.exists():
+            for fn in d.iterdir():
+                try: fn.unlink()
+                except Exception: pass
+    _write_notes_meta(username, [], {})
 
 def entries_export(username: str, fkey: bytes | None = None) -> list[dict]:
     return load_entries(username, fkey)
 
+def entries_export_encrypted(username: str, dst: BinaryIO, fkey: bytes) -> int:
+    """Write the entries to ``dst`` as a chunked AES-GCM stream (``.rpenc``).
+
+    The stream is keyed by the user's data key, which survives password changes.
+    """
+    chunks = json.JSONEncoder(ensure_ascii=False).iterencode(load_entries(username, fkey))
+    return encrypt_stream(IterStream(c.encode("utf-8") for c in chunks), dst, fkey)
+
+def entries_import_encrypted(username: str, src: BinaryIO, replace: bool, fkey: bytes) -> bool:
+    """Import an ``.rpenc`` stream written by :func:`entries_export_encrypted`."""
+    try:
+        data = _load_json_stream(src, fkey)
+    except Exception:
+        return False
+    return entries_import(username, data, replace, fkey)
+
 def entries_import(username: str, data: Any, replace: bool, fkey: bytes | None = None) -> bool:
     try:
         # 1) Eingabe ggf. entschlüsseln
@@ -152,26 +423,26 @@ def entries_import(username: str, data: Any, replace: bool, fkey: bytes | None =
             if not e.get("id"):
                 e["id"] = str(_uuid.uuid4())
 
-        # 3) Replace/Merge + Backup
-        if replace:
-            backup_entries(username, "import_replace", fkey)
-            save_entries(username, data, fkey)
-        else:
-            current = load_entries(username, fkey)
-            have = {e.get("id") for e in current}
-            merged = current + [e for e in data if e.get("id") not in have]
-            backup_entries(username, "import_merge", fkey)
-            save_entries(username, merged, fkey)
+        # 3) Replace/Merge + Backup (gemeinsam geschrieben)
+        with transaction():
+            if replace:
+                backup_entries(username, "import_replace", fkey)
+                save_entries(username, data, fkey)
+            else:
+                def _merge(current: List[Dict]) -> List[Dict]:
+                    have = {e.get("id") for e in current}
+                    return current + [e for e in data if e.get("id") not in have]
+                backup_entries(username, "import_merge", fkey)
+                update_entries(username, _merge, fkey)
 
         return True
     except Exception:
         return False
     
-def get_categories(username: str, fkey: Optional[bytes] = None, include_empty: bool = False) -> list[str]:
-    entries = load_entries(username, fkey)
+def distinct_values(entries: List[Dict], field: str, include_empty: bool = False) -> list[str]:
     vals: Set[str] = set()
     for e in entries:
-        v = (e or {}).get("category", "")
+        v = (e or {}).get(field, "")
         if v is None:
             continue
         v = str(v).strip()
@@ -179,27 +450,19 @@ def get_categories(username: str, fkey: Optional[bytes] = None, include_empty: b
             vals.add(v)
     return sorted(vals, key=str.casefold)
 
+def get_categories(username: str, fkey: Optional[bytes] = None, include_empty: bool = False) -> list[str]:
+    return distinct_values(load_entries(username, fkey), "category", include_empty)
+
 def get_accounts(username: str, fkey: Optional[bytes] = None, include_empty: bool = False) -> list[str]:
-    entries = load_entries(username, fkey)
-    vals: Set[str] = set()
-    for e in entries:
-        v = (e or {}).get("konto", "")
-        if v is None:
-            continue
-        v = str(v).strip()
-        if v or include_empty:
-            vals.add(v)
-    return sorted(vals, key=str.casefold)
+    return distinct_values(load_entries(username, fkey), "konto", include_empty)
 
 def _is_writable(p: Path) -> bool:
-    try:
-        p.mkdir(parents=True, exist_ok=True)
-        test = p / ".write_test"
-        test.write_text("ok", encoding="utf-8")
-        test.unlink(missing_ok=True)
-        return True
-    except Exception:
-        return False
+    """Whether ``p`` (or, if missing, its nearest existing parent) is writable; no test file."""
+    while not p.exists():
+        if p.parent == p:
+            return False
+        p = p.parent
+    return p.is_dir() and os.access(p, os.W_OK | os.X_OK)
 
 def ensure_streamlit_config(default_theme: str = "light") -> Path:
     """
@@ -234,4 +497,19 @@ gatherUsageStats = false
 """,
             encoding="utf-8",
         )
-    return cfg
\ No newline at end of file
+    return cfg
+
+_BOOTSTRAP: Optional[Path] = None
+_BOOTSTRAP_LOCK = threading.Lock()
+
+def bootstrap(default_theme: str = "light") -> Path:
+    """Process-wide startup checks (data dir, ``.streamlit/config.toml``), run once per worker.
+
+    Returns the config path; later reruns only hit the cached result.
+    """
+    global _BOOTSTRAP
+    with _BOOTSTRAP_LOCK:
+        if _BOOTSTRAP is None:
+            ensure_dirs()
+            _BOOTSTRAP = ensure_streamlit_config(default_theme)
+        return _BOOTSTRAP
@@ -0,0 +1,144 @@
+# core/usermeta.py
+"""High-churn per-user fields (``last_login``, ``login_count``, ``prefs``) in an append-only log.
+
+``users.json`` only changes for account data (role, password hash, keys). Logins
+and preference toggles append one line to ``usermeta.jsonl``; lines are buffered
+and written in batches, and every process replays the log incrementally.
+"""
+from __future__ import annotations
+import atexit, copy, json, os, threading
+from typing import Dict, List, Optional
+
+from .config import DATA_DIR
+from .fileio import locked, write_atomic
+
+META_FILE = DATA_DIR / "usermeta.jsonl"
+FLUSH_INTERVAL_S = 1.0
+FLUSH_MAX = 64
+COMPACT_LINES = 5_000
+
+_lock = threading.RLock()
+_pending: List[Dict] = []
+_timer: Optional[threading.Timer] = None
+_state: Dict[str, Dict] = {}                          # username -> Metadaten (bereits geschriebener Teil)
+_pos: Dict = {"ino": None, "offset": 0, "lines": 0}   # wie weit das Log eingelesen ist
+
+
+def _apply(state: Dict[str, Dict], rec: Dict) -> None:
+    name = rec.get("u")
+    if not isinstance(name, str):
+        return
+    if rec.get("del"):
+        state.pop(name, None)
+        return
+    meta = state.setdefault(name, {})
+    meta.update(rec.get("set") or {})
+    for k, n in (rec.get("inc") or {}).items():
+        meta[k] = int(meta.get(k) or 0) + int(n)
+    if rec.get("prefs"):
+        meta["prefs"] = {**meta.get("prefs", {}), **rec["prefs"]}
+
+
+def _refresh() -> None:
+    """Replay only the part of the log appended since the last call (caller holds ``_lock``)."""
+    try:
+        st = os.stat(META_FILE)
+    except FileNotFoundError:
+        if _pos["ino"] is not None:
+            _state.clear()
+            _pos.update(ino=None, offset=0, lines=0)
+        return
+    if st.st_ino != _pos["ino"] or st.st_size < _pos["offset"]:
+        # kompaktiert oder ersetzt -> von vorn
+        _state.clear()
+        _pos.update(ino=st.st_ino, offset=0, lines=0)
+    if st.st_size == _pos["offset"]:
+        return
+    with open(META_FILE, "rb") as f:
+        f.seek(_pos["offset"])
+        chunk = f.read(st.st_size - _pos["offset"])
+    end = chunk.rfind(b"\n") + 1  # unvollständige letzte Zeile beim nächsten Mal
+    for line in chunk[:end].splitlines():
+        try:
+            _apply(_state, json.loads(line))
+        except ValueError:
+            continue
+        _pos["lines"] += 1
+    _pos["offset"] += end
+
+
+def _append(rec: Dict) -> None:
+    global _timer
+    with _lock:
+        _pending.append(rec)
+        if len(_pending) >= FLUSH_MAX:
+            flush()
+        elif _timer is None:
+            _timer = threading.Timer(FLUSH_INTERVAL_S, flush)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush() -> None:
+    """Write buffered records in one append; compacts the log once it grows too long."""
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        if not _pending:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in _pending).encode("utf-8")
+        META_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with locked(META_FILE):
+            with open(META_FILE, "ab") as f:
+                f.write(data)
+            _pending.clear()
+            _refresh()
+            if _pos["lines"] > COMPACT_LINES:
+                _compact_locked()
+
+
+def _compact_locked() -> None:
+    # eine "set"-Zeile pro User; andere Prozesse erkennen die neue Datei am Inode
+    data = "".join(
+        json.dumps({"u": name, "set": meta}, ensure_ascii=False) + "\n" for name, meta in _state.items()
+    ).encode("utf-8")
+    write_atomic(META_FILE, data, transactional=False)
+    _pos.update(ino=os.stat(META_FILE).st_ino, offset=len(data), lines=len(_state))
+
+
+def touch_login(username: str, when: str) -> None:
+    _append({"u": username, "set": {"last_login": when}, "inc": {"login_count": 1}})
+
+
+def update_prefs(username: str, updates: Dict) -> None:
+    _append({"u": username, "prefs": dict(updates)})
+
+
+def forget(username: str) -> None:
+    _append({"u": username, "del": True})
+
+
+def get(username: str) -> Dict:
+    """Metadata of ``username`` including records that are not flushed yet."""
+    with _lock:
+        _refresh()
+        view = {username: copy.deepcopy(_state[username])} if username in _state else {}
+        for rec in _pending:
+            if rec.get("u") == username:
+                _apply(view, rec)
+        return view.get(username, {})
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Metadata of all users (admin list)."""
+    with _lock:
+        _refresh()
+        view = copy.deepcopy(_state)
+        for rec in _pending:
+            _apply(view, rec)
+        return view
+
+
+atexit.register(flush)
@@ -47,6 +47,16 @@ I18N: Dict[str, Dict[str, str]] = {
         "tab_overview": "Übersicht",
         "tab_history": "Kontoverlauf",
         "chart_balance_label": "Kontostand",
+        "chart_no_data": "Keine Daten für den Verlauf.",
+        "chart_resolution": "Auflösung",
+        "chart_res_auto": "Automatisch",
+        "chart_res_month": "Monate",
+        "chart_res_quarter": "Quartale",
+        "chart_res_year": "Jahre",
+        "history_group_by": "Aufteilen nach",
+        "group_none": "Gesamt",
+        "group_category": "Kategorie",
+        "group_account": "Konto",
 
         # Topbar / Buttons
         "btn_add_entry": "Eintrag hinzufügen",
@@ -77,6 +87,11 @@ I18N: Dict[str, Dict[str, str]] = {
         "monthly_sum_filtered": "Monatliche Summe (gefiltert)",
         "entries_count": "Einträge",
         "uncategorized": "Unkategorisiert",
+        "overview_page": "Seite",
+        "overview_select_hint": "Zeile auswählen, um sie zu bearbeiten oder zu löschen.",
+        "col_progress": "Fortschritt",
+        "col_saved": "Angespart",
+        "col_amount": "Betrag",
 
         # Dialog titles
         "edit_title": "✏️ Eintrag bearbeiten",
@@ -110,8 +125,32 @@ I18N: Dict[str, Dict[str, str]] = {
         "notif_due_label": "Fälligkeit geändert",
         "notif_amount_label": "Betrag geändert",
         "notif_cycle_label": "Turnus geändert",
+        "notif_due_upcoming_label": "Bald fällige Einträge (14 Tage)",
+        "notif_end_upcoming_label": "Bald endende Verträge (30 Tage)",
+        "notif_load_more": "Ältere laden",
+        "notif_digest_label": "E-Mail-Zusammenfassung",
+        "notif_digest_off": "Aus",
+        "notif_digest_daily": "Täglich",
+        "notif_digest_weekly": "Wöchentlich",
+        "notif_email_label": "E-Mail-Adresse",
+        "notif_filter_entry": "Vertrag",
+        "notif_filter_all": "Alle",
+        "notif_rules_title": "Eigene Regeln",
+        "notif_rules_none": "Noch keine eigenen Regeln.",
+        "notif_rule_kind": "Art",
+        "notif_rule_kind_due": "Fällig in N Tagen",
+        "notif_rule_kind_end": "Endet in N Tagen",
+        "notif_rule_kind_budget": "Monatsrate über Budget",
+        "notif_rule_label": "Bezeichnung",
+        "notif_rule_days": "Tage Vorlauf",
+        "notif_rule_min_amount": "Mindestbetrag (0 = alle)",
+        "notif_rule_category": "Nur Kategorie (leer = alle)",
+        "notif_rule_budget": "Budget pro Monat",
+        "notif_rule_add": "Regel hinzufügen",
+        "notif_rule_delete": "Regel löschen",
         "export": "Export",
         "download_entries": "Einträge herunterladen",
+        "download_entries_enc": "Verschlüsselte Sicherung herunterladen (.rpenc)",
         "import": "Import",
         "replace_existing": "Bestehende Daten ersetzen",
         "import_btn": "Importieren",
@@ -141,6 +180,7 @@ I18N: Dict[str, Dict[str, str]] = {
         "language_currency": "Sprache & Währung",
         "notification_settings": "Benachrichtigungseinstellungen",
         "users_list": "Benutzerliste",
+        "server_stats": "Server-Status",
 
         # Profile (password)
         "current_password": "Aktuelles Passwort",
@@ -168,9 +208,12 @@ I18N: Dict[str, Dict[str, str]] = {
         "login_submit": "Anmelden",
         "login_failed": "Benutzer inaktiv oder Passwort falsch.",
         "login_demo": "🔎 Demo ansehen (ohne Passwort)",
+        "login_backoff": "Zu viele Fehlversuche. Bitte in {seconds} s erneut versuchen.",
+        "login_busy": "Der Server ist gerade ausgelastet. Bitte gleich erneut versuchen.",
 
         # Misc
         "saved": "Gespeichert.",
+        "save_conflict": "Der Eintrag wurde zwischenzeitlich in einem anderen Fenster geändert. Bitte neu laden und erneut bearbeiten.",
         "import_ok": "Import erfolgreich.",
         "import_err": "Import fehlgeschlagen – ungültiges JSON.",
         "wiped": "Alle Daten gelöscht.",
@@ -202,6 +245,13 @@ I18N: Dict[str, Dict[str, str]] = {
         "notif_cycle_changed": "Turnus geändert für {name}: {old} → {new}.",
         "notif_deleted": "Eintrag gelöscht: {name}.",
         "notif_due_this_month": "Fälligkeit diesen Monat für {name}: {amount} fällig ({due}). Aktuelle Monatsrate: {rate}.",
+        "notif_due_upcoming_title": "Bald fällig: {name} ({due}).",
+        "notif_end_upcoming_title": "Vertrag endet bald: {name} ({end}).",
+        "notif_rule_due_title": "{label}: {name} ist fällig ({due}).",
+        "notif_rule_end_title": "{label}: {name} endet ({end}).",
+        "notif_rule_budget_title": "{label}: Monatsraten {total} über Budget {budget}.",
+        "digest_subject": "Rücklagenplaner: {count} neue Benachrichtigungen",
+        "digest_intro": "Neue Benachrichtigungen seit der letzten Zusammenfassung:",
     },
     "en": {
         # App / Tabs
@@ -209,6 +259,16 @@ I18N: Dict[str, Dict[str, str]] = {
         "tab_overview": "Overview",
         "tab_history": "Balance over time",
         "chart_balance_label": "Balance",
+        "chart_no_data": "No data for the history.",
+        "chart_resolution": "Resolution",
+        "chart_res_auto": "Automatic",
+        "chart_res_month": "Months",
+        "chart_res_quarter": "Quarters",
+        "chart_res_year": "Years",
+        "history_group_by": "Split by",
+        "group_none": "Total",
+        "group_category": "Category",
+        "group_account": "Account",
 
         # Topbar / Buttons
         "btn_add_entry": "Add entry",
@@ -239,6 +299,11 @@ I18N: Dict[str, Dict[str, str]] = {
         "monthly_sum_filtered": "Monthly total (filtered)",
         "entries_count": "Entries",
         "uncategorized": "Uncategorized",
+        "overview_page": "Page",
+        "overview_select_hint": "Select a row to edit or delete it.",
+        "col_progress": "Progress",
+        "col_saved": "Saved so far",
+        "col_amount": "Amount",
 
         # Dialog titles
         "edit_title": "✏️ Edit entry",
@@ -272,8 +337,32 @@ I18N: Dict[str, Dict[str, str]] = {
         "notif_due_label": "Due date changed",
         "notif_amount_label": "Amount changed",
         "notif_cycle_label": "Cycle changed",
+        "notif_due_upcoming_label": "Entries due soon (14 days)",
+        "notif_end_upcoming_label": "Contracts ending soon (30 days)",
+        "notif_load_more": "Load older",
+        "notif_digest_label": "E-mail digest",
+        "notif_digest_off": "Off",
+        "notif_digest_daily": "Daily",
+        "notif_digest_weekly": "Weekly",
+        "notif_email_label": "E-mail address",
+        "notif_filter_entry": "Contract",
+        "notif_filter_all": "All",
+        "notif_rules_title": "Custom rules",
+        "notif_rules_none": "No custom rules yet.",
+        "notif_rule_kind": "Kind",
+        "notif_rule_kind_due": "Due within N days",
+        "notif_rule_kind_end": "Ends within N days",
+        "notif_rule_kind_budget": "Monthly rate above budget",
+        "notif_rule_label": "Label",
+        "notif_rule_days": "Days ahead",
+        "notif_rule_min_amount": "Minimum amount (0 = all)",
+        "notif_rule_category": "Category only (empty = all)",
+        "notif_rule_budget": "Monthly budget",
+        "notif_rule_add": "Add rule",
+        "notif_rule_delete": "Delete rule",
         "export": "Export",
         "download_entries": "Download entries",
+        "download_entries_enc": "Download encrypted backup (.rpenc)",
         "import": "Import",
         "replace_existing": "Replace existing data",
         "import_btn": "Import",
@@ -302,6 +391,7 @@ I18N: Dict[str, Dict[str, str]] = {
         "language_currency": "Language & currency",
         "notification_settings": "Notification settings",
         "users_list": "Users list",
+        "server_stats": "Server status",
 
         # Profile (password)
         "current_password": "Current password",
@@ -329,9 +419,12 @@ I18N: Dict[str, Dict[str, str]] = {
         "login_submit": "Sign in",
         "login_failed": "User inactive or wrong password.",
         "login_demo": "🔎 Try demo (no password)",
+        "login_backoff": "Too many failed attempts. Please try again in {seconds} s.",
+        "login_busy": "The server is busy right now. Please try again in a moment.",
 
         # Misc
         "saved": "Saved.",
+        "save_conflict": "This entry was changed in another window in the meantime. Please reload and edit again.",
         "import_ok": "Import successful.",
         "import_err": "Import failed – invalid JSON.",
         "wiped": "All data deleted.",
@@ -364,6 +457,13 @@ I18N: Dict[str, Dict[str, str]] = {
         "notif_cycle_changed": "Cycle changed for {name}: {old} → {new}.",
         "notif_deleted": "Entry deleted: {name}.",
         "notif_due_this_month": "Due this month for {name}: {amount} due ({due}). Current monthly rate: {rate}.",
+        "notif_due_upcoming_title": "Due soon: {name} ({due}).",
+        "notif_end_upcoming_title": "Contract ending soon: {name} ({end}).",
+        "notif_rule_due_title": "{label}: {name} is due ({due}).",
+        "notif_rule_end_title": "{label}: {name} ends ({end}).",
+        "notif_rule_budget_title": "{label}: monthly rates {total} exceed budget {budget}.",
+        "digest_subject": "Rücklagenplaner: {count} new notifications",
+        "digest_intro": "New notifications since the last digest:",
     },
 }
 
@@ -1,4 +1,4 @@
-import json, os, base64, uuid
+import json, os, tempfile, uuid
 import plotly.io as pio
 import streamlit as st
 
@@ -6,53 +6,68 @@ from datetime import datetime
 from functools import partial
 from i18n import get_text
 
-from core.config import load_settings, save_settings, get_version
+from core.config import load_settings, get_version
 from core.auth import (
-    load_users, save_users, add_user, set_user_role, set_user_active,
-    set_user_password, delete_user, find_user, verify_password, make_hash, get_user_enc_params
+    has_users, save_users, add_user, set_user_role, set_user_active,
+    set_user_password, delete_user, find_user,
+    unlock_user,
+    update_user_prefs as _update_user_prefs, get_user_prefs as _get_user_prefs,
+    note_login, load_users_merged,
+    kdf_verify_password, kdf_service,
+    login_backoff_remaining, record_login_result,
 )
-from core.calc import (
-    calculate_monthly_saving_and_progress,
-    calculate_saldo_over_time,
-    get_next_due_text,
-)
-from core.crypto import derive_fernet_key, wrap_key, unwrap_key
-from core.cycles import get_turnus_mapping, turnus_label
-from core.demo import login_as_demo_and_seed, DEMO_USERNAME
-from core.notify_rules import DEFAULT_RULES
+from core.crypto import KDFBusyError
+from core.fileio import ConflictError, configure_durability, run_in_transaction, write_stats
+from core.cycles import get_turnus_mapping
+from core.demo import DemoWorkspace, DEMO_USERNAME
+from core.scheduler import notification_scheduler
+from core.due_index import drop_calendars
+from core.digest import digest_enabled, outbox_size
+from core.sessions import session_store, client_binding, forwarded_client_ip
 from core.notify import (
-    notify_on_add, notify_on_update, notify_on_delete,
-    ensure_monthly_notifications, evaluate_events
+    notify_on_add, notify_on_update, notify_on_delete, render_note,
+    run_notification_pass, NOTIF_RETENTION_MONTHS,
 )
 from core.storage import (
     load_entries as _load_entries,
     save_entries as _save_entries,
-    load_notifications as _load_notes,
-    save_notifications as _save_notes,
+    iter_notifications as _iter_notes,
+    unread_notifications as _unread_notes,
+    mark_notifications_read as _mark_notes_read,
+    purge_entry_notifications as _purge_entry_notes,
+    update_entries as _update_entries,
+    append_notifications as _append_notes,
     backup_entries as _backup_entries,
-    rewrap_user_data, wipe_user,
+    UserStore,
+    wipe_user,
     entries_export, entries_import,
+    entries_export_encrypted, entries_import_encrypted,
     get_accounts as storage_get_accounts,
     get_categories as storage_get_categories,
-    ensure_streamlit_config,
+    distinct_values,
+    entries_version as _entries_version,
+    bootstrap,
+    transaction,
 )
-from core.utils import due_month_sort_value, next_month_start
 
 from ui.add_page import add_page
-from ui.charts import saldo_chart
+from ui import cache as ui_cache
+from ui.charts import RESOLUTIONS, saldo_chart, saldo_figure
 from ui.dialogs import notifications_page, settings_page
 from ui.edit_page import edit_page
+from ui.overview import overview_table
 from ui.topbar import render_topbar
 from ui.theme import set_plotly_theme
 
 # -------------------------------
 # Settings & i18n
 # -------------------------------
-settings = load_settings()
+bootstrap(default_theme="light")  # einmal pro Prozess: Datenordner, .streamlit/config.toml
+settings = load_settings()  # aus dem Cache, neu gelesen nur wenn settings.json sich ändert
+configure_durability(settings.get("durability"), settings.get("durability_group_window_ms"))
 LANG = settings.get("language", "de")
 CURRENCY = settings.get("currency", "€")
 t = lambda key: get_text(LANG, key)
-ensure_streamlit_config(default_theme="light")
 st.set_page_config(page_title=t("app_title"), layout="wide")
 st.session_state.setdefault("route", "main")  # "main" | "settings" | "admin_users" | "notifications" | "add" | "edit"
 
@@ -72,64 +87,108 @@ def username_or_anon():
     u = current_user()
     return u["username"] if u else "_anon"
 
+def demo_ws():
+    """Return the demo workspace of this session (None for real users)."""
+    return st.session_state.get("demo_ws")
+
 def load_entries():
     """Load persisted entries for the active user."""
+    if demo_ws() is not None:
+        return demo_ws().load_entries()
     return _load_entries(username_or_anon(), _fkey())
 
 def save_entries(entries):
     """Persist entries for the active user."""
+    if demo_ws() is not None:
+        return demo_ws().save_entries(entries)
     _save_entries(username_or_anon(), entries, _fkey())
 
-def load_notes():
-    """Load notification entries for the active user."""
-    return _load_notes(username_or_anon(), _fkey())
-
-def save_notes(notes):
-    """Persist notifications for the active user."""
-    _save_notes(username_or_anon(), notes, _fkey())
+def cache_owner() -> str:
+    """Cache namespace of the active data (demo sessions each get their own)."""
+    if demo_ws() is not None:
+        return f"demo:{demo_ws().uid}"
+    return f"user:{username_or_anon()}"
+
+def data_version():
+    """Cheap version of the active user's entries (etag / demo counter) for cache keys."""
+    if demo_ws() is not None:
+        return demo_ws().entries_version()
+    return _entries_version(username_or_anon())
+
+def iter_notes(entry_id=None):
+    """Notifications of the active user, newest first (archive segments loaded lazily)."""
+    if demo_ws() is not None:
+        return demo_ws().iter_notes(entry_id)
+    return _iter_notes(username_or_anon(), _fkey(), entry_id)
+
+def purge_entry_notes(entry_id):
+    """Drop all notifications that belong to a deleted entry."""
+    if demo_ws() is not None:
+        return demo_ws().purge_entry_notes(entry_id)
+    return _purge_entry_notes(username_or_anon(), entry_id, _fkey())
+
+def unread_notes() -> int:
+    """Unread counter of the active user (no decryption of the notes)."""
+    if demo_ws() is not None:
+        return demo_ws().unread_notes()
+    return _unread_notes(username_or_anon(), _fkey())
+
+def mark_notes_read():
+    """Mark all notifications of the active user as read."""
+    if demo_ws() is not None:
+        return demo_ws().mark_notes_read()
+    _mark_notes_read(username_or_anon(), _fkey())
 
 def backup_entries(reason: str):
     """Create a backup of entries with the given reason."""
+    if demo_ws() is not None:
+        return  # Demo-Änderungen sind ohnehin flüchtig
     _backup_entries(username_or_anon(), reason, _fkey())
 
+def update_entries(mutate):
+    """Read-modify-write the active user's entries without losing concurrent updates."""
+    if demo_ws() is not None:
+        return demo_ws().update_entries(mutate)
+    return _update_entries(username_or_anon(), mutate, _fkey())
+
 def append_notes(new_notes):
     """Append notifications to the existing list if any are provided."""
-    if not new_notes:
-        return
-    notes = load_notes()
-    notes.extend(new_notes)
-    save_notes(notes)
+    if demo_ws() is not None:
+        return demo_ws().append_notes(new_notes)
+    _append_notes(username_or_anon(), new_notes, _fkey())
 
 def get_user_prefs():
     """Retrieve stored preferences for the current user."""
     u = current_user()
     if not u:
         return {}
-    usr = find_user(u["username"])
-    return usr.get("prefs", {}) if usr else {}
+    if demo_ws() is not None:
+        return dict(demo_ws().prefs)
+    return _get_user_prefs(u["username"])
 
 def update_user_prefs(updates: dict):
     """Merge preference updates into the current user's stored prefs."""
     u = current_user()
     if not u:
         return
-    users = load_users()
-    for usr in users:
-        if usr.get("username") == u["username"]:
-            prefs = usr.get("prefs", {})
-            prefs.update(updates)
-            usr["prefs"] = prefs
-            break
-    save_users(users)
+    if demo_ws() is not None:
+        return demo_ws().prefs.update(updates)
+    _update_user_prefs(u["username"], updates)
 
 def ui_accounts():
     """Return account labels with a custom placeholder prepended."""
-    base = storage_get_accounts(username_or_anon(), _fkey())
+    if demo_ws() is not None:
+        base = distinct_values(demo_ws().load_entries(), "konto")
+    else:
+        base = storage_get_accounts(username_or_anon(), _fkey())
     return [t("custom_account_label")] + base
 
 def ui_categories():
     """Return category labels with a custom placeholder prepended."""
-    base = storage_get_categories(username_or_anon(), _fkey())
+    if demo_ws() is not None:
+        base = distinct_values(demo_ws().load_entries(), "category")
+    else:
+        base = storage_get_categories(username_or_anon(), _fkey())
     return [t("custom_category_label")] + base
 
 def inject_mobile_only_css():
@@ -158,22 +217,84 @@ def inject_mobile_only_css():
 # -------------------------------
 # Login flow
 # -------------------------------
-def _sanitize_users_for_json(users_list):
-    """Convert byte values in user records to base64 strings for JSON."""
-    for user in users_list:
-        if not isinstance(user, dict):
-            continue
-        # Top-Level-Felder
-        for k, v in list(user.items()):
-            if isinstance(v, (bytes, bytearray)):
-                user[k] = base64.b64encode(v).decode("ascii")
-        # enc-Subtree
-        enc = user.get("enc")
-        if isinstance(enc, dict):
-            for k, v in list(enc.items()):
-                if isinstance(v, (bytes, bytearray)):
-                    enc[k] = base64.b64encode(v).decode("ascii")
-    return users_list
+def client_ip():
+    """Client address for the login backoff; forwarding headers only from ``"trusted_proxies"``."""
+    ctx = getattr(st, "context", None)
+    headers = getattr(ctx, "headers", None) or {}
+    # Streamlit meldet Loopback als None; das ist der Nginx aus dem README
+    peer = getattr(ctx, "ip_address", None) or "127.0.0.1"
+    trusted = load_settings().get("trusted_proxies", ["127.0.0.1", "::1"])
+    return forwarded_client_ip(peer, {k.lower(): v for k, v in headers.items()}, trusted)
+
+def _session_binding():
+    headers = getattr(getattr(st, "context", None), "headers", None) or {}
+    return client_binding(headers.get("User-Agent"))
+
+def start_session(user: dict, data_key):
+    """Set the Streamlit session and, if enabled, park the key in the server-side store."""
+    st.session_state["enc_key"] = data_key
+    st.session_state["user"] = user
+    store = session_store()
+    if store is not None and data_key:
+        token = store.create(user, data_key, _session_binding())
+        st.session_state["sid"] = token
+        st.query_params["sid"] = token
+
+def resume_session() -> bool:
+    """Resume a session from the ``sid`` query parameter without re-deriving keys."""
+    store = session_store()
+    token = st.query_params.get("sid")
+    if store is None or not token:
+        return False
+    resumed = store.resume(token, _session_binding())
+    if resumed:
+        user, data_key = resumed
+        usr = find_user(user["username"])
+        if usr and usr.get("active"):
+            st.session_state["user"] = {"username": user["username"], "role": usr.get("role", "user")}
+            st.session_state["enc_key"] = data_key
+            st.session_state["sid"] = token
+            return True
+        store.drop(token)
+    del st.query_params["sid"]
+    return False
+
+def logout():
+    """Drop the server-side key (if any) and clear the Streamlit session."""
+    store = session_store()
+    token = st.session_state.get("sid")
+    if store is not None and token:
+        store.drop(token)
+    if "sid" in st.query_params:
+        del st.query_params["sid"]
+    scheduler = notification_scheduler()
+    u = current_user()
+    if scheduler is not None and u:
+        scheduler.unregister(u["username"])
+    elif u and demo_ws() is None:
+        drop_calendars(UserStore(u["username"]).cache_key)
+    st.session_state.clear()
+
+def _drop_user_sessions(username: str):
+    store = session_store()
+    if store is not None:
+        store.drop_user(username)
+    scheduler = notification_scheduler()
+    if scheduler is not None:
+        scheduler.unregister(username)
+
+def _admin_set_active(username: str, active: bool):
+    set_user_active(username, active)
+    if not active:
+        _drop_user_sessions(username)
+
+def _admin_set_password(username: str, password: str):
+    set_user_password(username, password)
+    _drop_user_sessions(username)
+
+def _admin_delete_user(requesting_username: str, target_username: str):
+    delete_user(requesting_username, target_username)
+    _drop_user_sessions(target_username)
 
 def ensure_login():
     """Handle authentication and session setup.
@@ -183,10 +304,8 @@ def ensure_login():
     st.session_state.setdefault("user", None)
     st.session_state.setdefault("enc_key", None)        # DataKey (bytes) -> nur Session
     st.session_state.setdefault("enc_kek_pw", None)     # KEK (bytes)   -> nur Session
-    users = load_users()
-
     # Ersteinrichtung
-    if not users:
+    if not has_users():
         st.title(t("first_setup"))
         with st.form("bootstrap_admin"):
             username = st.text_input(t("admin_username"))
@@ -199,8 +318,8 @@ def ensure_login():
             st.rerun()
         return False
 
-    # Bereits eingeloggt
-    if st.session_state["user"]:
+    # Bereits eingeloggt (oder per Session-Token wieder aufgenommen)
+    if st.session_state["user"] or resume_session():
         return True
 
     # Login-Form
@@ -211,73 +330,37 @@ def ensure_login():
         ok = st.form_submit_button(t("login_submit"))
 
     if ok:
-        u = find_user(username)
-        if u and u.get("active") and verify_password(pw, u.get("pw_hash", "")):
-
-            # users laden & referenz auf diesen User
-            uu = load_users()
-            uref = None
-            for x in uu:
-                if x.get("username") == u["username"]:
-                    uref = x
-                    break
-            if not uref:
+        ip = client_ip()
+        wait = login_backoff_remaining(username, ip)
+        if wait > 0:
+            st.error(t("login_backoff").format(seconds=int(wait) + 1))
+            return False
+        try:
+            u = find_user(username)
+            pw_ok = bool(u and u.get("active") and kdf_verify_password(pw, u.get("pw_hash", "")))
+            record_login_result(username, ip, pw_ok)
+            if pw_ok:
+
+                # last_login/login_count -> Metadaten-Log (gebündelt), nicht users.json
+                note_login(u["username"])
+
+                # KEK (bytes) NUR Runtime; enc-Block/Wrap werden bei Bedarf angelegt bzw. aktualisiert
+                kek, data_key = unlock_user(u, pw)
+                st.session_state["enc_kek_pw"] = kek
+
+                # Session setzen
+                start_session({"username": u["username"], "role": u.get("role", "user")}, data_key)
+                st.rerun()
+            else:
                 st.error(t("login_failed"))
-                return False
-
-            mutated = False
-
-            # last_login als STRING
-            uref["last_login"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            mutated = True
-
-            # enc-Parameter prüfen/erzeugen (nur JSON-fähige Werte!)
-            params = get_user_enc_params(u["username"])  # -> {"salt": bytes, "iters": int} ODER None
-            if not params:
-                import os, base64 as _b64
-                uenc = uref.setdefault("enc", {})
-                # stelle sicher: salt als base64-STRING, iters als INT
-                uenc["salt"]  = _b64.b64encode(os.urandom(16)).decode("ascii")
-                uenc["iters"] = 200_000
-                mutated = True
-                # runtime params als bytes:
-                params = {"salt": _b64.b64decode(uenc["salt"]), "iters": uenc["iters"]}
-            assert params is not None
-
-            # KEK (bytes) NUR Runtime
-            kek = derive_fernet_key(pw, params["salt"], params["iters"])
-            st.session_state["enc_kek_pw"] = kek
-
-            # wrapped_data_key (STRING) anlegen, falls fehlt
-            uenc = uref.setdefault("enc", {})
-            if not isinstance(uenc.get("wrapped_data_key"), str):
-                # Migration: DataKey = kek (bytes), speichern NUR den Wrap als Base64-String
-                uenc["wrapped_data_key"] = wrap_key(kek, kek)  # -> str
-                mutated = True
-
-            # DataKey (bytes) für Session
-            try:
-                data_key = unwrap_key(uenc["wrapped_data_key"], kek)
-            except Exception:
-                data_key = kek  # Fallback
-
-            # Vor dem Speichern ALLES json-safe machen
-            if mutated:
-                _sanitize_users_for_json(uu)
-                save_users(uu)
-
-            # Session setzen
-            st.session_state["enc_key"] = data_key
-            st.session_state["user"] = {"username": u["username"], "role": u.get("role", "user")}
-            st.rerun()
-        else:
-            st.error(t("login_failed"))
+        except KDFBusyError:
+            st.error(t("login_busy"))
 
     # Demo-Login
     if st.button(t("login_demo"), type="secondary", use_container_width=True):
-        demo_username, fkey = login_as_demo_and_seed()
-        st.session_state["user"] = {"username": demo_username, "role": "user"}
-        st.session_state["enc_key"] = fkey
+        # geteiltes Demo-Portfolio + Copy-on-write je Session: kein KDF, keine Schreibzugriffe
+        st.session_state["demo_ws"] = DemoWorkspace()
+        start_session({"username": DEMO_USERNAME, "role": "user"}, None)
         st.session_state["enc_kek_pw"] = None
         st.rerun()
     return False
@@ -309,26 +392,33 @@ set_plotly_theme(theme)
 
 st.title(f"📊 {t('app_title')} · v{get_version()}")
 
-# Topbar
-try:
-    unread = sum(1 for n in load_notes() if not n.get("read"))
-except Exception:
-    unread = 0
-u = current_user()
-render_topbar(t, unread, u["username"] if u else None)
-
-# Monatliche Notifications
-new_notes = evaluate_events(load_entries(), DEFAULT_RULES, LANG)
-append_notes(new_notes)
-
-try:
-    ym_now = datetime.now().strftime("%Y-%m")
-    if settings.get("last_notif_month") != ym_now:
-        ensure_monthly_notifications(load_entries, load_notes, save_notes, LANG, CURRENCY, t)
-        settings["last_notif_month"] = ym_now
-        save_settings(settings)
-except Exception:
-    pass
+# Topbar: eigenes Fragment, frischt den Ungelesen-Zähler optional im Intervall auf
+@st.fragment(run_every=float(settings.get("topbar_refresh_s", 0)) or None)
+def topbar():
+    try:
+        unread = unread_notes()
+    except Exception:
+        unread = 0
+    u = current_user()
+    render_topbar(t, unread, u["username"] if u else None, on_logout=logout)
+
+
+topbar()
+
+# Notifications (fällig/Ende/Monat): erzeugt der Hintergrund-Scheduler, hier nur Key anmelden.
+# Demo-Sessions und abgeschalteter Scheduler: direkt, dank Watermarks meist ohne Arbeit.
+scheduler = notification_scheduler()
+if scheduler is not None and demo_ws() is None:
+    scheduler.register(username_or_anon(), _fkey(), LANG)
+else:
+    try:
+        with transaction():
+            run_notification_pass(
+                demo_ws() or UserStore(username_or_anon(), _fkey()), LANG, prefs=prefs,
+                retention_months=int(settings.get("notif_retention_months", NOTIF_RETENTION_MONTHS)),
+            )
+    except Exception:
+        pass
 
 # -------------------------------
 # Modal routing
@@ -360,36 +450,46 @@ def go_main():
     st.session_state["route"] = "main"
 
 if route == "notifications":
-    notifications_page(t, load_notes, save_notes, on_back=go_main)
+    notifications_page(
+        t, iter_notes, mark_notes_read, lambda n: render_note(n, LANG, CURRENCY), on_back=go_main,
+        entry_names={e["id"]: e.get("name", "") for e in load_entries() if e.get("id")},
+    )
     st.stop()
 
 elif route == "settings":
-    exp = lambda: entries_export(username_or_anon(), _fkey())
-    imp = lambda data, replace: entries_import(username_or_anon(), data, replace, _fkey())
+    if demo_ws() is not None:
+        exp = demo_ws().load_entries
+        imp = demo_ws().import_entries
+    else:
+        exp = lambda: entries_export(username_or_anon(), _fkey())
+        imp = lambda data, replace: entries_import(username_or_anon(), data, replace, _fkey())
+
+    def exp_enc(user=username_or_anon(), fkey=_fkey()):
+        # erst beim Klick (ohne Session-Kontext): direkt in eine Temp-Datei streamen
+        f = tempfile.TemporaryFile()
+        entries_export_encrypted(user, f, fkey)
+        f.seek(0)
+        return f
+    imp_enc = lambda src, replace: entries_import_encrypted(username_or_anon(), src, replace, _fkey())
 
     def _verify_self_password(old, pw1, pw2):
         cu = current_user()
-        if not cu: return False
+        if not cu or demo_ws() is not None: return False
         uu = find_user(cu["username"])
         if not uu: return False
-        if not (verify_password(old, uu.get("pw_hash", "")) and pw1 and pw1 == pw2):
-            return False
-
-        # alten Key (aus Session), neuen Key (aus neuem Passwort) berechnen
-        params = get_user_enc_params(cu["username"])
-        old_fkey = st.session_state.get("enc_key")
-        if params is None:
+        # DataKey bleibt, nur sein Wrap wechselt: Dateien und Sicherungen bleiben lesbar
+        data_key = st.session_state.get("enc_key")
+        try:
+            if not (pw1 and pw1 == pw2 and kdf_verify_password(old, uu.get("pw_hash", ""))):
+                return False
+            set_user_password(cu["username"], pw1, data_key=data_key)
+        except KDFBusyError:
             return False
-        new_fkey = derive_fernet_key(pw1, params["salt"], params["iters"])
-
-        # Passwort-Hash aktualisieren
-        set_user_password(cu["username"], pw1)
 
-        # Daten rewrap auf neuen Key
-        rewrap_user_data(cu["username"], old_fkey, new_fkey)
-
-        # Session-Key aktualisieren
-        st.session_state["enc_key"] = new_fkey
+        # andere Sessions des Users abmelden, die eigene mit demselben Key neu starten
+        if st.session_state.get("sid"):
+            _drop_user_sessions(cu["username"])
+            start_session(cu, data_key)
         return True
     
     settings_page(
@@ -400,22 +500,37 @@ elif route == "settings":
         current_user(),
         _verify_self_password,
         on_back=go_main,
+        entries_exporter_enc=exp_enc if _fkey() else None,
+        entries_importer_enc=imp_enc if _fkey() else None,
         # Admin-Callbacks -> Tab „Benutzer“
         admin_add_user=add_user,
-        admin_load_users=load_users,
+        admin_load_users=load_users_merged,
         admin_save_users=save_users,
         admin_set_role=set_user_role,
-        admin_set_active=set_user_active,
-        admin_set_password=set_user_password,
-        admin_delete_user=delete_user,
+        admin_set_active=_admin_set_active,
+        admin_set_password=_admin_set_password,
+        admin_delete_user=_admin_delete_user,
         admin_wipe_user_data=wipe_user,
+        admin_server_stats=lambda: {
+            "kdf": kdf_service().stats(),
+            "writes": write_stats(),
+            "scheduler": scheduler.stats() if scheduler is not None else None,
+            "outbox": outbox_size(),
+        },
+        allow_digest=demo_ws() is None and digest_enabled(),
     )
     st.stop()
 
 elif route == "add":
     def _on_add(e):
-        es = load_entries(); es.append(e); save_entries(es)
-        notify_on_add(append_notes, e, CURRENCY, LANG, t)
+        def _work():
+            update_entries(lambda es: es + [e])
+            notify_on_add(append_notes, e, LANG)
+        try:
+            run_in_transaction(_work)
+        except ConflictError:
+            st.error(t("save_conflict"))
+            st.stop()
     add_page(t, CURRENCY, LANG, TURNUS_LABELS, _on_add, on_back=go_main, known_accounts=ui_accounts(), known_categories=ui_categories())
     st.stop()
 
@@ -423,15 +538,24 @@ elif route == "edit":
     entry = next((x for x in load_entries() if x.get("id")==st.session_state.get("edit_id")), None)
     if entry:
         def _on_save(updated):
-            es = load_entries()
-            old = None
-            for i, e in enumerate(es):
-                if e.get("id")==updated["id"]:
-                    old = es[i]; es[i] = updated; break
-            save_entries(es)
-            if old:
-                prefs_local = get_user_prefs()
-                notify_on_update(append_notes, old, updated, CURRENCY, LANG, t, prefs_local)
+            found = {}
+            def _replace(es):
+                for i, e in enumerate(es):
+                    if e.get("id")==updated["id"]:
+                        # in einem anderen Tab geändert, seit die Seite geöffnet wurde?
+                        if e != st.session_state.get("edit_base", entry):
+                            raise ConflictError(updated["id"])
+                        found["old"] = es[i]; es[i] = updated; break
+            try:
+                with transaction():
+                    update_entries(_replace)
+                    old = found.get("old")
+                    if old:
+                        prefs_local = get_user_prefs()
+                        notify_on_update(append_notes, old, updated, LANG, prefs_local)
+            except ConflictError:
+                st.error(t("save_conflict"))
+                st.stop()
         edit_page(t, CURRENCY, LANG, TURNUS_LABELS, entry, _on_save, on_back=go_main, known_accounts=ui_accounts(), known_categories=ui_categories())
         st.stop()
     else:
@@ -439,10 +563,19 @@ elif route == "edit":
 # -------------------------------
 # Haupt-Tabs
 # -------------------------------
-entries = load_entries()
-tab1, tab2 = st.tabs([t("tab_overview"), t("tab_history")])
-
-with tab1:
+# Panels sind Fragmente: ein Filterwechsel rerunt nur das eigene Panel, nicht Login,
+# Topbar, Notification-Pass und das andere Tab.
+def cache_scope():
+    """Owner, entries version and month for the ui caches – per (fragment) run, never stale."""
+    return cache_owner(), data_version(), datetime.now().strftime("%Y-%m")
+
+
+@st.fragment
+def overview_panel():
+    """Filters, entry list/table and totals of the overview tab."""
+    owner, version, month = cache_scope()
+    entries = ui_cache.entries(owner, version, load_entries)
+    metrics = ui_cache.metrics(owner, version, LANG, month, t("custom_cycle_label"), entries)
     st.subheader(t("overview_header"))
     cats = sorted(set(e.get("category", "") for e in entries if e.get("category", "")))
     accs = sorted(set(e.get("konto", "") for e in entries if e.get("konto", "")))
@@ -459,25 +592,56 @@ with tab1:
                 and _match(e.get("konto", ""), selected_konto)]
 
     if sort_option == t("sort_due_month"):
-        reference = next_month_start(datetime.now())
-        filtered.sort(key=lambda x: due_month_sort_value(x, reference, LANG))
+        filtered.sort(key=lambda x: metrics[x["id"]]["due_sort"])
     elif sort_option == t("sort_monthly"):
-        filtered.sort(key=lambda x: calculate_monthly_saving_and_progress(x, LANG)[0], reverse=True)
+        filtered.sort(key=lambda x: metrics[x["id"]]["rate"], reverse=True)
     else:
         filtered.sort(key=lambda x: x["name"].lower())
 
+    def _open_edit(e):
+        st.session_state["edit_id"] = e["id"]
+        st.session_state["edit_base"] = e
+        st.session_state["open_edit"] = True
+        st.session_state["open_add"] = False
+        st.session_state["open_settings"] = False
+        st.session_state["open_notifications"] = False
+        st.rerun()
+
+    def _delete(e):
+        deleted = []
+        def _remove(es, eid=e["id"]):
+            deleted[:] = [x for x in es if x.get("id") == eid]
+            return [x for x in es if x.get("id") != eid]
+        def _work():
+            update_entries(_remove)
+            to_del = deleted[-1] if deleted else None
+            if to_del:
+                purge_entry_notes(to_del["id"])
+                notify_on_delete(append_notes, to_del)
+        try:
+            run_in_transaction(_work)
+        except ConflictError:
+            st.error(t("save_conflict"))
+            st.stop()
+        st.rerun()
+
     st.markdown("---")
-    total_rate = 0.0
-    for e in filtered:
-        rate, percent, saved, info = calculate_monthly_saving_and_progress(e, LANG)
-        total_rate += rate
+    total_rate = sum(metrics[e["id"]]["rate"] for e in filtered)
+    # große Portfolios: eine Tabelle pro Seite statt Widgets pro Eintrag
+    table_mode = len(filtered) > int(settings.get("overview_table_threshold", 50))
+    if table_mode:
+        overview_table(t, filtered, metrics, CURRENCY, _open_edit, _delete,
+                       page_size=int(settings.get("overview_page_size", 50)))
+    for e in ([] if table_mode else filtered):
+        m = metrics[e["id"]]
+        rate, percent, saved, info = m["rate"], m["percent"], m["saved"], m["info"]
         col1, col2, col3, col4, col5 = st.columns([2, 2, 2, 2, 1.5])
         with col1:
             st.markdown(f"**{e['name']}**<br/>({e.get('category', t('uncategorized'))})", unsafe_allow_html=True)
         with col2:
-            st.markdown(f"{t('turnus')}: {turnus_label(e, LANG, t('custom_cycle_label'))}")
+            st.markdown(f"{t('turnus')}: {m['turnus']}")
         with col3:
-            nd_text = get_next_due_text(e, LANG)
+            nd_text = m["next_due"]
             start_text = e.get("start_date", "-")
             end_text = e.get("end_date") or "—"
             st.markdown(
@@ -499,38 +663,59 @@ with tab1:
             b1, b2 = st.columns([0.2, 1])
             with b1:
                 if st.button(t("btn_edit"), key=f"edit_{e['id']}"):
-                    st.session_state["edit_id"] = e["id"]
-                    st.session_state["open_edit"] = True
-                    st.session_state["open_add"] = False
-                    st.session_state["open_settings"] = False
-                    st.session_state["open_notifications"] = False
-                    st.rerun()
+                    _open_edit(e)
             with b2:
                 if st.button(t("btn_delete"), key=f"delete_{e['id']}"):
-                    es = load_entries()
-                    to_del = next((x for x in es if x.get("id") == e["id"]), None)
-                    es = [x for x in es if x.get("id") != e["id"]]
-                    save_entries(es)
-                    if to_del:
-                        notify_on_delete(append_notes, to_del, t)
-                    st.rerun()
+                    _delete(e)
 
     st.markdown("---")
     s1, s2 = st.columns([2, 2])
     s1.metric(t("monthly_sum_filtered"), f"{total_rate:.2f} {CURRENCY}")
     s2.caption(f"{t('entries_count')}: {len(filtered)}")
 
-with tab2:
+
+@st.fragment
+def history_panel():
+    """Filters and saldo chart of the history tab."""
+    owner, version, month = cache_scope()
+    entries = ui_cache.entries(owner, version, load_entries)
     st.subheader(t("history_header"))
     cats2 = sorted(set(e.get("category", "") for e in entries if e.get("category", "")))
     accs2 = sorted(set(e.get("konto", "") for e in entries if e.get("konto", "")))
-    c1, c2, _ = st.columns([2, 2, 2])
+    c1, c2, c3, c4 = st.columns([2, 2, 2, 2])
     sel_cat = c1.selectbox(t("filter_category"), [t("all")] + cats2, key="fcat2")
     sel_acc = c2.selectbox(t("filter_account"), [t("all")] + accs2, key="facc2")
+    group_by = c3.selectbox(t("history_group_by"), [None, "category", "account"], key="fgroup2",
+                            format_func=lambda g: t(f"group_{g or 'none'}"))
+    resolution = c4.selectbox(t("chart_resolution"), [None, *RESOLUTIONS], key="fres2",
+                              format_func=lambda r: t(f"chart_res_{r or 'auto'}"))
+
+    cat_f = None if sel_cat == t("all") else sel_cat
+    acc_f = None if sel_acc == t("all") else sel_acc
+    key = (owner, version, LANG, month, cat_f, acc_f)
+    df = ui_cache.saldo(*key, entries)
+    if group_by == "category":
+        groups = [cat_f] if cat_f is not None else sorted(set(e.get("category", "") for e in entries))
+        series = {g or t("uncategorized"): ui_cache.saldo(owner, version, LANG, month, g, acc_f, entries)
+                  for g in groups}
+    elif group_by == "account":
+        groups = [acc_f] if acc_f is not None else sorted(set(e.get("konto", "") for e in entries))
+        series = {g or "—": ui_cache.saldo(owner, version, LANG, month, cat_f, g, entries)
+                  for g in groups}
+    else:
+        series = df
+    fig = ui_cache.saldo_figure(
+        *key, group_by, resolution, CURRENCY, theme, t("history_header"), series,
+        lambda d: saldo_figure(d, LANG, CURRENCY, t("history_header"), t=t, resolution=resolution),
+    )
+    saldo_chart(df, LANG, CURRENCY, t("history_header"), t=t, fig=fig)
 
-    def _m(v, s):
-        return s == t("all") or v == s
 
-    filtered2 = [e for e in entries if _m(e.get("category", ""), sel_cat) and _m(e.get("konto", ""), sel_acc)]
-    df = calculate_saldo_over_time(filtered2, LANG)
-    saldo_chart(df, LANG, CURRENCY, t("history_header"), t=t)
\ No newline at end of file
+# nur das sichtbare Tab wird berechnet (Tabwechsel = normaler Rerun)
+tab1, tab2 = st.tabs([t("tab_overview"), t("tab_history")], key="main_tab", on_change="rerun")
+if tab1.open is not False:
+    with tab1:
+        overview_panel()
+if tab2.open is not False:
+    with tab2:
+        history_panel()
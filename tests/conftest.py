@@ -0,0 +1,12 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _keep_main_module():
+    # AppTest führt das Skript als __main__ aus und lässt es in sys.modules stehen;
+    # danach würden spawn-Worker (KDF-Pool) dieses Skript importieren
+    main = sys.modules["__main__"]
+    yield
+    sys.modules["__main__"] = main
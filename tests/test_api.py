@@ -0,0 +1,170 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import core.api as api_mod
+import core.auth as auth
+import core.config as config
+import core.storage as storage
+import core.usermeta as usermeta
+from core.api import ApiServer
+from core.crypto import KDFService
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "SETTINGS_FILE", tmp_path / "settings.json")
+    monkeypatch.setattr(auth, "USERS_FILE", tmp_path / "users.json")
+    monkeypatch.setattr(usermeta, "META_FILE", tmp_path / "usermeta.jsonl")
+    monkeypatch.setattr(usermeta, "_state", {})
+    monkeypatch.setattr(usermeta, "_pos", {"ino": None, "offset": 0, "lines": 0})
+    monkeypatch.setattr(auth, "_KDF_SERVICE", KDFService(max_workers=0))
+    monkeypatch.setattr(auth, "_KDF_TARGET", {"kdf": "pbkdf2", "iters": 1_000})
+    monkeypatch.setattr(auth, "_backoff", {})
+    auth.add_user("anna", "geheim")
+    server = ApiServer("127.0.0.1", 0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    usermeta.flush()  # gepufferte Logins noch ins tmp-Log
+
+
+@pytest.fixture
+def api(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    yield conn
+    conn.close()
+
+
+def _call(conn, method, path, body=None, token=None, **headers):
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=data, headers=headers)
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+ENTRY = {"name": "Kfz", "amount": 600, "cycle": "Jährlich", "start_date": "2025-01", "due_month": 7}
+
+
+def test_login_crud_and_metrics_over_one_keepalive_connection(api):
+    assert _call(api, "GET", "/api/entries")[0] == 401
+    status, out = _call(api, "POST", "/api/login", {"username": "anna", "password": "geheim"})
+    assert status == 200 and out["user"] == {"username": "anna", "role": "user"}
+    token = out["token"]
+
+    status, out = _call(api, "POST", "/api/entries", ENTRY, token)
+    assert status == 201 and out["entry"]["konto"] == "" and out["entry"]["amount"] == 600.0
+    eid, version = out["entry"]["id"], out["version"]
+    assert _call(api, "POST", "/api/entries", {**ENTRY, "start_date": "2030-13"}, token)[0] == 400
+
+    status, out = _call(api, "GET", "/api/metrics", token=token)
+    assert status == 200 and out["monthly_total"] == out["entries"][0]["rate"] > 0
+
+    # veraltete Version -> 409, aktuelle -> ok
+    assert _call(api, "PUT", f"/api/entries/{eid}", {"amount": 700}, token, **{"If-Match": "alt"})[0] == 409
+    status, out = _call(api, "PUT", f"/api/entries/{eid}", {"amount": 700}, token, **{"If-Match": version})
+    assert status == 200 and out["entry"]["amount"] == 700.0 and out["entry"]["name"] == "Kfz"
+
+    status, out = _call(api, "GET", "/api/notifications?limit=10", token=token)
+    assert status == 200 and out["unread"] >= 1 and all(n["text"] for n in out["notifications"])
+
+    assert _call(api, "DELETE", f"/api/entries/{eid}", token=token)[0] == 200
+    assert _call(api, "DELETE", f"/api/entries/{eid}", token=token)[0] == 404
+    assert _call(api, "GET", "/api/entries", token=token)[1]["entries"] == []
+    assert _call(api, "POST", "/api/login", {"username": "anna", "password": "falsch"})[0] == 401
+
+
+def test_batch_runs_calls_in_order_and_revokes_on_password_change(api):
+    token = _call(api, "POST", "/api/login", {"username": "anna", "password": "geheim"})[1]["token"]
+    status, out = _call(api, "POST", "/api/batch", {"requests": [
+        {"method": "POST", "path": "/api/entries", "body": ENTRY},
+        {"method": "POST", "path": "/api/entries", "body": {**ENTRY, "name": "Haus", "category": "Wohnen"}},
+        {"method": "GET", "path": "/api/saldo?category=Wohnen"},
+    ]}, token)
+    assert status == 200
+    assert [r["status"] for r in out["responses"]] == [201, 201, 200]
+    assert len(out["responses"][2]["body"]["month"]) == len(out["responses"][2]["body"]["saldo"]) > 0
+    assert len(_call(api, "GET", "/api/entries", token=token)[1]["entries"]) == 2
+
+    # ein fehlgeschlagener Aufruf verwirft den ganzen Batch
+    status, out = _call(api, "POST", "/api/batch", {"requests": [
+        {"method": "POST", "path": "/api/entries", "body": ENTRY},
+        {"method": "GET", "path": "/api/nope"},
+        {"method": "POST", "path": "/api/entries", "body": ENTRY},
+    ]}, token)
+    assert status == 404 and out["failed"] == 1
+    assert [r["status"] for r in out["responses"]] == [201, 404]
+    assert len(_call(api, "GET", "/api/entries", token=token)[1]["entries"]) == 2
+
+    auth.set_user_password("anna", "neu")
+    assert _call(api, "GET", "/api/session", token=token) == (401, {"error": "session revoked"})
+
+
+def test_writes_retry_commit_conflicts_and_logout_drops_cached_values(server, api, monkeypatch):
+    token = _call(api, "POST", "/api/login", {"username": "anna", "password": "geheim"})[1]["token"]
+    notify_on_add = api_mod.notify_on_add
+    calls = []
+
+    def _racing_notify(append, entry, lang):
+        calls.append(entry["id"])
+        if len(calls) == 1:  # anderer Schreiber zwischen Staging und Commit
+            other = threading.Thread(target=storage.save_entries, args=("anna", [{**ENTRY, "id": "x"}]))
+            other.start()
+            other.join()
+        notify_on_add(append, entry, lang)
+
+    monkeypatch.setattr(api_mod, "notify_on_add", _racing_notify)
+    status, out = _call(api, "POST", "/api/entries", ENTRY, token)
+    assert status == 201 and len(calls) == 2
+    assert [e["id"] for e in _call(api, "GET", "/api/entries", token=token)[1]["entries"]] == ["x", out["entry"]["id"]]
+
+    assert _call(api, "GET", "/api/metrics", token=token)[0] == 200
+    assert any(k[0] == "anna" and api_mod._month() in k for k in server.cache._items)
+    assert _call(api, "POST", "/api/logout", token=token)[0] == 200
+    assert not [k for k in server.cache._items if k[0] == "anna"]
+
+
+def test_forwarding_headers_only_count_from_trusted_proxies(server):
+    spoofed = {"x-forwarded-for": "1.2.3.4", "x-real-ip": "5.6.7.8"}
+    assert server.client_ip("10.0.0.9", spoofed) == "10.0.0.9"
+
+    server.trusted_proxies = frozenset({"10.0.0.1"})
+    assert server.client_ip("10.0.0.1", {"x-forwarded-for": "6.6.6.6, 1.2.3.4"}) == "1.2.3.4"
+    assert server.client_ip("10.0.0.1", {"x-real-ip": "5.6.7.8"}) == "5.6.7.8"
+    assert server.client_ip("10.0.0.1", {}) == "10.0.0.1"
+    assert server.client_ip("10.0.0.9", spoofed) == "10.0.0.9"
+
+
+def test_batch_rolls_back_writes_staged_by_the_failing_call(api, monkeypatch):
+    token = _call(api, "POST", "/api/login", {"username": "anna", "password": "geheim"})[1]["token"]
+    eid = _call(api, "POST", "/api/entries", ENTRY, token)[1]["entry"]["id"]
+
+    def _broken(*args, **kwargs):
+        raise OSError("disk full")
+
+    # _delete_entry hat die Einträge schon gestagt, wenn das Aufräumen der Notizen scheitert
+    monkeypatch.setattr(api_mod, "purge_entry_notifications", _broken)
+    status, out = _call(api, "POST", "/api/batch", {"requests": [
+        {"method": "DELETE", "path": f"/api/entries/{eid}"},
+    ]}, token)
+    assert status == 500 and out["responses"] == [{"status": 500, "body": {"error": "internal error"}}]
+    assert [e["id"] for e in _call(api, "GET", "/api/entries", token=token)[1]["entries"]] == [eid]
+
+
+@pytest.mark.parametrize("length", ["-1", "abc"])
+def test_invalid_content_length_is_rejected_and_closes(server, length):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    conn.putrequest("POST", "/api/login")
+    conn.putheader("Content-Length", length)
+    conn.endheaders()
+    resp = conn.getresponse()
+    assert resp.status == 400 and json.loads(resp.read()) == {"error": "invalid Content-Length"}
+    assert resp.getheader("Connection") == "close"
+    conn.close()
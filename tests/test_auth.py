@@ -0,0 +1,117 @@
+import base64
+
+import pytest
+
+import core.auth as auth
+from core.crypto import derive_fernet_key, unwrap_key, KDFService
+
+
+@pytest.fixture(autouse=True)
+def _inline_kdf(monkeypatch):
+    monkeypatch.setattr(auth, "_KDF_SERVICE", KDFService(max_workers=0))
+    monkeypatch.setattr(auth, "_backoff", {})
+
+
+def test_verify_password_accepts_legacy_pbkdf2_and_scrypt_hashes():
+    legacy = auth.make_hash("geheim", iterations=1_000)
+    scrypt = auth.make_hash("geheim", params={"kdf": "scrypt", "n": 2 ** 10, "r": 8, "p": 1})
+
+    assert legacy.startswith("pbkdf2$1000$")
+    assert scrypt.startswith("scrypt$1024:8:1$")
+    assert auth.verify_password("geheim", legacy)
+    assert auth.verify_password("geheim", scrypt)
+    assert not auth.verify_password("falsch", scrypt)
+
+
+def test_upgrade_user_kdf_rehashes_and_rewraps_data_key(monkeypatch):
+    monkeypatch.setattr(auth, "_KDF_TARGET", {"kdf": "scrypt", "n": 2 ** 10, "r": 8, "p": 1})
+    data_key = derive_fernet_key("geheim", b"s" * 16, 1_000)
+    user = {
+        "pw_hash": auth.make_hash("geheim", iterations=1_000),
+        "enc": {"salt": base64.b64encode(b"s" * 16).decode("ascii"), "iters": 1_000},
+    }
+
+    assert auth.upgrade_user_kdf(user, "geheim", data_key)
+    assert user["pw_hash"].startswith("scrypt$")
+    params = auth.get_enc_params_from_record(user)
+    kek = derive_fernet_key("geheim", params["salt"], params=params["kdf"])
+    assert unwrap_key(user["enc"]["wrapped_data_key"], kek) == data_key
+    assert not auth.upgrade_user_kdf(user, "geheim", data_key)
+
+
+def test_password_change_keeps_the_data_key_and_stale_wraps_are_repaired(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "USERS_FILE", tmp_path / "users.json")
+    monkeypatch.setattr(auth, "_registry", {"etag": None, "users": [], "index": {}})
+    monkeypatch.setattr(auth, "_KDF_TARGET", {"kdf": "pbkdf2", "iters": 1_000})
+    auth.save_users([{"username": "anna", "pw_hash": auth.make_hash("alt", iterations=1_000)}])
+    _kek, data_key = auth.unlock_user(auth.find_user("anna"), "alt")
+
+    auth.set_user_password("anna", "neu", data_key=data_key)
+    assert auth.verify_password("neu", auth.find_user("anna")["pw_hash"])
+    assert auth.unlock_user(auth.find_user("anna"), "neu")[1] == data_key
+
+    # Admin-Reset ohne Key: der Wrap passt nicht mehr und wird beim Login repariert
+    auth.set_user_password("anna", "reset")
+    kek, key = auth.unlock_user(auth.find_user("anna"), "reset")
+    assert key == kek
+    assert unwrap_key(auth.find_user("anna")["enc"]["wrapped_data_key"], kek) == kek
+
+
+def test_login_backoff_doubles_per_failure_and_resets_on_success(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: clock[0])
+
+    auth.record_login_result("anna", "10.0.0.1", ok=False)
+    assert auth.login_backoff_remaining("anna") == pytest.approx(1.0)
+    auth.record_login_result("anna", "10.0.0.1", ok=False)
+    assert auth.login_backoff_remaining("bob", "10.0.0.1") == pytest.approx(2.0)
+
+    auth.record_login_result("anna", "10.0.0.1", ok=True)
+    assert auth.login_backoff_remaining("anna", "10.0.0.1") == 0.0
+
+
+def test_user_registry_caches_until_file_changes(tmp_path, monkeypatch):
+    users_file = tmp_path / "users.json"
+    monkeypatch.setattr(auth, "USERS_FILE", users_file)
+    monkeypatch.setattr(auth, "_registry", {"etag": None, "users": [], "index": {}})
+    auth.save_users([{"username": "anna", "role": "user"}, {"username": "ben", "role": "admin"}])
+
+    parsed = []
+    real_parse = auth._parse_users
+    monkeypatch.setattr(auth, "_parse_users", lambda raw: parsed.append(1) or real_parse(raw))
+
+    found = auth.find_user("ben")
+    found["role"] = "user"  # Kopie, Cache bleibt unverändert
+    assert auth.find_user("ben")["role"] == "admin"
+    assert auth.find_user("carl") is None
+    assert parsed == []
+
+    auth.set_user_role("anna", "admin")
+    assert auth.find_user("anna")["role"] == "admin"
+    assert parsed == []
+
+    # Änderung von außen (anderer Prozess) wird über die etag erkannt
+    users_file.write_text('[{"username": "carl"}]', encoding="utf-8")
+    assert auth.find_user("carl") == {"username": "carl"}
+    assert auth.find_user("anna") is None
+    assert parsed == [1]
+
+
+def test_prefs_and_login_metadata_do_not_rewrite_users_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "USERS_FILE", tmp_path / "users.json")
+    monkeypatch.setattr(auth, "_registry", {"etag": None, "users": [], "index": {}})
+    monkeypatch.setattr(auth.usermeta, "META_FILE", tmp_path / "usermeta.jsonl")
+    monkeypatch.setattr(auth.usermeta, "_state", {})
+    monkeypatch.setattr(auth.usermeta, "_pending", [])
+    monkeypatch.setattr(auth.usermeta, "_pos", {"ino": None, "offset": 0, "lines": 0})
+    auth.save_users([{"username": "anna", "prefs": {"language": "de", "theme": "light"}}])
+    before = (tmp_path / "users.json").read_bytes()
+
+    auth.update_user_prefs("anna", {"theme": "dark"})
+    auth.note_login("anna")
+    auth.usermeta.flush()
+
+    assert (tmp_path / "users.json").read_bytes() == before
+    assert auth.get_user_prefs("anna") == {"language": "de", "theme": "dark"}
+    merged = auth.load_users_merged()[0]
+    assert merged["login_count"] == 1 and merged["last_login"]
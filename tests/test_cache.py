@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def _app():
+    import streamlit as st
+    from ui import cache
+
+    calls = st.session_state.setdefault("calls", [])
+    version = st.session_state.get("version", 1)
+    for _ in range(2):
+        cache.saldo_figure("anna", version, "de", "2030-01", None, None, None, None, "€", "light", "T", None,
+                           lambda _series: calls.append(version) or f"fig{version}")
+
+
+def test_derived_values_are_cached_per_session_and_version():
+    at = AppTest.from_function(_app)
+    at.run()
+    assert at.session_state["calls"] == [1]
+
+    at.session_state["version"] = 2
+    at.run()
+    assert at.session_state["calls"] == [1, 2]
+    assert [k[2] for k in at.session_state["_cache_derived"]] == [2]  # alte Version verworfen
+
+    # kein prozessweiter Cache: eine andere Session rechnet selbst
+    other = AppTest.from_function(_app)
+    other.run()
+    assert other.session_state["calls"] == [1]
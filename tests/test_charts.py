@@ -0,0 +1,28 @@
+import pandas as pd
+
+from ui.charts import aggregate_saldo, saldo_figure
+
+
+def _series(n, start="2030-01"):
+    months = pd.period_range(start, periods=n, freq="M").strftime("%Y-%m")
+    return pd.DataFrame({"month": months, "saldo": [float(i) for i in range(n)]})
+
+
+def test_aggregate_keeps_last_balance_per_bucket_and_labels():
+    df = _series(7)
+    q = aggregate_saldo(df, "quarter", "de")
+    assert q.to_dict("list") == {"month": ["2030-03", "2030-06", "2030-07"], "saldo": [2.0, 5.0, 6.0],
+                                 "label": ["Q1 2030", "Q2 2030", "Q3 2030"]}
+    assert aggregate_saldo(df, "month", "en")["label"].tolist()[:2] == ["January 2030", "February 2030"]
+    assert aggregate_saldo(df, "year", "de")["label"].tolist() == ["2030"]
+    assert list(df.columns) == ["month", "saldo"]  # Eingabe unverändert
+
+
+def test_only_the_chosen_resolution_is_built_and_long_horizons_start_coarse():
+    fig = saldo_figure({"A": _series(800), "B": _series(800)}, "de", "€", "T")
+    assert {tr["type"] for tr in fig["data"]} == {"scattergl"}
+    assert len(fig["data"]) == 2
+    assert len(fig["data"][0]["x"]) == 67  # Jahreswerte
+    monthly = saldo_figure({"A": _series(800)}, "de", "€", "T", resolution="month")
+    assert len(monthly["data"]) == 1 and len(monthly["data"][0]["x"]) == 800
+    assert saldo_figure(_series(0), "de", "€", "T") is None
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import core.auth as auth
+import core.cli as cli
+import core.config as config
+import core.digest as digest
+import core.storage as storage
+import core.usermeta as usermeta
+from core.crypto import KDFService
+from core.smtp_debug import DebugSMTPServer
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "SETTINGS_FILE", tmp_path / "settings.json")
+    monkeypatch.setattr(auth, "USERS_FILE", tmp_path / "users.json")
+    monkeypatch.setattr(usermeta, "META_FILE", tmp_path / "usermeta.jsonl")
+    monkeypatch.setattr(usermeta, "_state", {})
+    monkeypatch.setattr(usermeta, "_pos", {"ino": None, "offset": 0, "lines": 0})
+    monkeypatch.setattr(auth, "_KDF_SERVICE", KDFService(max_workers=0))
+    monkeypatch.setattr(auth, "_KDF_TARGET", {"kdf": "pbkdf2", "iters": 1_000})
+    creds = {}
+    for name, n in (("anna", 2), ("ben", 1)):
+        auth.add_user(name, f"pw-{name}")
+        key = cli._user_key(name, f"pw-{name}")
+        storage.save_entries(name, [
+            {"id": f"{name}{i}", "name": f"E{i}", "amount": 120.0, "konto": "", "category": "K",
+             "cycle": "Jährlich", "custom_cycle": None, "due_month": 3, "start_date": "2025-01", "end_date": None}
+            for i in range(n)
+        ], key)
+        creds[name] = f"pw-{name}"
+    path = tmp_path / "creds.json"
+    path.write_text(json.dumps(creds))
+    yield path
+    usermeta.flush()
+
+
+def test_single_user_reports_stream_in_each_format(users, monkeypatch, capsys):
+    monkeypatch.setenv("RP_PASSWORD", "pw-anna")
+    assert cli.main(["metrics", "--user", "anna", "--format", "jsonl"]) == 0
+    lines = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    assert [(x["user"], x["id"]) for x in lines] == [("anna", "anna0"), ("anna", "anna1")]
+
+    assert cli.main(["due", "--user", "anna", "--today", "2030-02-20", "--days", "30"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "user,date,days,id,name,amount" and out[1].startswith("anna,2030-03-01,9,anna0,")
+
+    assert cli.main(["project", "--user", "anna", "--months", "12", "--format", "json"]) == 0
+    series = json.loads(capsys.readouterr().out)
+    assert series and all(set(r) == {"user", "month", "saldo"} for r in series)
+
+    # --today gilt auch für Projektion und Kennzahlen
+    assert cli.main(["project", "--user", "anna", "--today", "2030-02-20", "--months", "12", "--format", "jsonl"]) == 0
+    months = [json.loads(x)["month"] for x in capsys.readouterr().out.splitlines()]
+    assert months[-1] == "2031-02"
+    assert cli.main(["metrics", "--user", "anna", "--today", "2030-02-20", "--format", "jsonl"]) == 0
+    assert {json.loads(x)["next_due"] for x in capsys.readouterr().out.splitlines()} == {"2030-03"}
+
+    monkeypatch.setenv("RP_PASSWORD", "falsch")
+    assert cli.main(["metrics", "--user", "anna"]) == 1
+    assert "wrong password" in capsys.readouterr().err
+
+
+def test_all_users_in_parallel_keeps_user_order(users, capsys):
+    assert cli.main(["metrics", "--all", "--credentials", str(users), "--jobs", "2", "--format", "jsonl"]) == 0
+    ids = [json.loads(x)["id"] for x in capsys.readouterr().out.splitlines()]
+    assert ids == ["anna0", "anna1", "ben0"]
+
+    assert cli.main(["notify", "--all", "--credentials", str(users), "--today", "2030-02-20"]) == 0
+    assert capsys.readouterr().out.splitlines()[0] == "user,new"
+
+
+def test_deliver_needs_no_user_and_sends_the_outbox(users, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(digest, "OUTBOX_DIR", tmp_path / "outbox")
+    digest.enqueue("anna@example.org", "Betreff", "Text\n")
+    assert cli.main(["deliver"]) == 2
+    assert "smtp_host" in capsys.readouterr().err
+
+    server = DebugSMTPServer("127.0.0.1", 0)
+    server.start()
+    try:
+        (tmp_path / "settings.json").write_text(json.dumps({"smtp_host": "127.0.0.1",
+                                                            "smtp_port": server.server_address[1]}))
+        assert cli.main(["deliver", "--format", "jsonl"]) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert json.loads(capsys.readouterr().out) == {"sent": 1, "deferred": 0, "failed": 0}
+    assert [m["to"] for m in server.messages] == [["<anna@example.org>"]]
@@ -0,0 +1,26 @@
+import json
+
+import core.config as config
+import core.storage as storage
+
+
+def test_settings_are_cached_until_the_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "SETTINGS_FILE", tmp_path / "settings.json")
+    assert config.load_settings() == {"language": "de", "currency": "€"}
+
+    config.save_settings({"currency": "$"})
+    first = config.load_settings()
+    assert first["currency"] == "$"
+    first["currency"] = "x"  # Kopie: Cache bleibt unberührt
+    reads, real = [], config.read_bytes
+    monkeypatch.setattr(config, "read_bytes", lambda p: reads.append(p) or real(p))
+    assert config.load_settings()["currency"] == "$" and reads == []
+
+    (tmp_path / "settings.json").write_text(json.dumps({"currency": "CHF", "pad": "longer"}))
+    assert config.load_settings()["currency"] == "CHF" and len(reads) == 1
+
+def test_is_writable_probes_without_a_test_file(tmp_path):
+    assert storage._is_writable(tmp_path / "missing" / ".streamlit")
+    assert not (tmp_path / "missing").exists()
+    assert list(tmp_path.iterdir()) == []
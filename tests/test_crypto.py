@@ -1,6 +1,13 @@
 import base64
+import io
 
-from core.crypto import wrap_key, unwrap_key
+import pytest
+
+from core.crypto import (
+    wrap_key, unwrap_key, derive_fernet_key, derive_raw_key, calibrate_kdf, kdf_params_stale,
+    KDFService, KDFBusyError, PBKDF2_ITERS_MIN, SCRYPT_N_MIN,
+    encrypt_stream, decrypt_stream, iter_decrypt_stream, StreamDecryptError, IterStream, make_fernet,
+)
 
 
 def test_wrap_key_returns_base64_string_roundtrip():
@@ -21,3 +28,120 @@ def test_unwrap_key_accepts_raw_bytes_payload():
     wrapped_bytes = base64.b64decode(wrapped_str.encode("ascii"))
 
     assert unwrap_key(wrapped_bytes, kek) == data_key
+
+
+def test_derive_fernet_key_defaults_to_pbkdf2_registry_entry():
+    salt = b"s" * 16
+
+    legacy = derive_fernet_key("pw", salt, 1_000)
+    explicit = derive_fernet_key("pw", salt, params={"kdf": "pbkdf2", "iters": 1_000})
+
+    assert legacy == explicit
+
+
+def test_scrypt_kdf_is_registered_and_deterministic():
+    salt = b"s" * 16
+    params = {"kdf": "scrypt", "n": 2 ** 10, "r": 8, "p": 1}
+
+    assert derive_raw_key("pw", salt, params) == derive_raw_key("pw", salt, params)
+    assert derive_raw_key("pw", salt, params) != derive_raw_key("pw", salt, {"kdf": "pbkdf2", "iters": 1_000})
+
+
+def test_calibrate_kdf_never_goes_below_minimum():
+    assert calibrate_kdf("pbkdf2", target_ms=1)["iters"] >= PBKDF2_ITERS_MIN
+    assert calibrate_kdf("scrypt", target_ms=1)["n"] >= SCRYPT_N_MIN
+
+
+def test_kdf_params_stale_detects_much_weaker_and_other_kdf_only():
+    target = {"kdf": "pbkdf2", "iters": 300_000}
+
+    assert not kdf_params_stale({"kdf": "pbkdf2", "iters": 300_000}, target)
+    # Kalibrier-Rauschen am Rand: kein Rehash
+    assert not kdf_params_stale({"kdf": "pbkdf2", "iters": 200_000}, target)
+    assert kdf_params_stale({"kdf": "pbkdf2", "iters": 140_000}, target)
+    # nie automatisch herabstufen
+    assert not kdf_params_stale({"kdf": "pbkdf2", "iters": 900_000}, target)
+    assert kdf_params_stale({"kdf": "scrypt", "n": 2 ** 15, "r": 8, "p": 1}, target)
+    assert kdf_params_stale(None, target)
+
+
+def test_kdf_service_runs_on_process_pool_and_reports_stats():
+    svc = KDFService(max_workers=1, max_queue=0)
+    try:
+        key = svc.run(derive_fernet_key, "pw", b"s" * 16, 1_000)
+    finally:
+        svc.shutdown()
+
+    assert key == derive_fernet_key("pw", b"s" * 16, 1_000)
+    stats = svc.stats()
+    assert stats["completed"] == 1 and stats["in_flight"] == 0 and stats["queued"] == 0
+
+
+def test_kdf_service_rejects_when_queue_is_full():
+    svc = KDFService(max_workers=0, max_queue=0)
+
+    def _nested():
+        assert svc.stats()["in_flight"] == 1 and svc.stats()["queued"] == 0
+        return svc.run(len, "x")
+
+    with pytest.raises(KDFBusyError):
+        svc.run(_nested)
+    assert svc.stats()["rejected"] == 1
+
+
+def _stream_fixture(n_bytes, chunk_size=64):
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+    plaintext = bytes(i % 251 for i in range(n_bytes))
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(plaintext), out, fkey, chunk_size=chunk_size)
+    return fkey, plaintext, out.getvalue()
+
+
+@pytest.mark.parametrize("n_bytes", [0, 1, 64, 65, 640])
+def test_stream_roundtrip(n_bytes):
+    fkey, plaintext, ct = _stream_fixture(n_bytes)
+    out = io.BytesIO()
+
+    assert decrypt_stream(io.BytesIO(ct), out, fkey) == n_bytes
+    assert out.getvalue() == plaintext
+
+
+def test_stream_detects_truncation_at_chunk_boundary():
+    fkey, _plaintext, ct = _stream_fixture(640)
+    header_len, block = 24, 64 + 16
+
+    with pytest.raises(StreamDecryptError):
+        decrypt_stream(io.BytesIO(ct[:header_len + 3 * block]), io.BytesIO(), fkey)
+
+
+def test_stream_detects_reordered_chunks():
+    fkey, _plaintext, ct = _stream_fixture(640)
+    header_len, block = 24, 64 + 16
+    swapped = ct[:header_len] + ct[header_len + block:header_len + 2 * block] + ct[header_len:header_len + block] + ct[header_len + 2 * block:]
+
+    with pytest.raises(StreamDecryptError):
+        decrypt_stream(io.BytesIO(swapped), io.BytesIO(), fkey)
+
+
+def test_stream_prefix_can_be_read_without_consuming_everything():
+    fkey, plaintext, ct = _stream_fixture(640)
+    src = io.BytesIO(ct)
+
+    first = next(iter_decrypt_stream(src, fkey))
+
+    assert first == plaintext[:64]
+    assert src.tell() < len(ct)
+
+
+def test_iter_stream_fills_reads_across_small_pieces():
+    src = IterStream(bytes([i]) for i in range(10))
+
+    assert src.read(4) == bytes(range(4))
+    assert src.read(100) == bytes(range(4, 10))
+    assert src.read(4) == b""
+
+
+def test_make_fernet_keeps_no_keys_alive():
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+
+    assert make_fernet(fkey) is not make_fernet(fkey)
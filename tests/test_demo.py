@@ -0,0 +1,25 @@
+from core.demo import DemoWorkspace, demo_dataset
+
+
+def test_workspaces_copy_on_write_without_touching_shared_dataset():
+    a, b = DemoWorkspace(), DemoWorkspace()
+    first = a.load_entries()[0]
+    first_id, first_amount = first["id"], first["amount"]
+
+    first["amount"] = 1.0  # Leser bekommen Kopien
+    a.update_entries(lambda entries: [e for e in entries if e["id"] != first_id])
+    a.append_notes([{"id": "n1", "text": "x"}])
+
+    assert all(e["id"] != first_id for e in a.load_entries())
+    assert b.load_entries()[0]["amount"] == first_amount
+    assert len(b.load_entries()) == len(demo_dataset())
+    assert b.load_notes() == []
+    assert [e["id"] for e in DemoWorkspace().load_entries()] == [e["id"] for e in b.load_entries()]
+
+
+def test_import_into_workspace_merges_by_id():
+    ws = DemoWorkspace()
+    n = len(ws.load_entries())
+    assert ws.import_entries([{"name": "Neu", "amount": 10.0}, ws.load_entries()[0]], replace=False)
+    assert len(ws.load_entries()) == n + 1
+    assert not ws.import_entries({"__rp_enc__": "fernet", "ct": ""}, replace=True)
@@ -0,0 +1,105 @@
+import json
+import socket
+from datetime import date
+
+import pytest
+
+import core.digest as digest
+from core.fileio import file_etag
+from core.smtp_debug import DebugSMTPServer
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(digest, "OUTBOX_DIR", tmp_path / "outbox")
+    monkeypatch.setattr(digest, "load_settings", lambda: {"smtp_host": "127.0.0.1", "currency": "€"})
+    return tmp_path / "outbox"
+
+
+@pytest.fixture
+def smtp():
+    server = DebugSMTPServer("127.0.0.1", 0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+PREFS = {"notif_digest": "daily", "notif_email": "anna@example.org", "currency": "€"}
+NOTE = {"type": "entry_deleted", "entry_id": "x", "name": "Kfz", "params": {}}
+
+
+def _draft(outbox):
+    [path] = (outbox / "pending").glob("*.json")
+    return json.loads(path.read_text())
+
+
+def test_digest_collects_per_period_and_queues_on_rollover(outbox):
+    assert digest.collect_digest("anna", {}, [NOTE], PREFS, "de", date(2030, 1, 10)) == {}
+    assert _draft(outbox)["period"] == "2030-01-10" and _draft(outbox)["lines"] == ["Eintrag gelöscht: Kfz."]
+    etag = file_etag(next((outbox / "pending").glob("*.json")))
+    digest.collect_digest("anna", {}, [], PREFS, "de", date(2030, 1, 10))
+    assert file_etag(next((outbox / "pending").glob("*.json"))) == etag  # nichts geschrieben
+    assert digest.outbox_size() == 0
+
+    digest.collect_digest("anna", {}, [NOTE], PREFS, "de", date(2030, 1, 11))
+    assert _draft(outbox)["period"] == "2030-01-11" and len(_draft(outbox)["lines"]) == 1
+    [msg] = [json.loads(p.read_text()) for p in outbox.glob("*.json")]
+    assert msg["to"] == "anna@example.org" and "Eintrag gelöscht: Kfz." in msg["body"]
+
+    # abgeschaltet -> Entwurf verworfen
+    digest.collect_digest("anna", {}, [NOTE], {"notif_digest": "off"}, "de", date(2030, 1, 12))
+    assert _draft(outbox) == {"mode": "off", "lines": []}
+
+
+def test_no_drafts_without_a_mail_server(outbox, monkeypatch):
+    digest.collect_digest("anna", {}, [NOTE], PREFS, "de", date(2030, 1, 10))
+    monkeypatch.setattr(digest, "load_settings", lambda: {"currency": "€"})
+    assert not digest.digest_enabled()
+
+    # vorhandener Entwurf wird verworfen, neue Notizen landen nicht mehr im Klartext
+    digest.collect_digest("anna", {}, [NOTE], PREFS, "de", date(2030, 1, 10))
+    assert _draft(outbox) == {"mode": "off", "lines": []}
+    assert digest.outbox_size() == 0
+
+
+def test_digest_is_mailed_after_the_period_without_the_user(outbox, smtp):
+    # Notizen aus dem Notify-State älterer Versionen wandern in den Entwurf
+    state = digest.collect_digest("anna", {"month": "2030-01", "digest": {"period": "2030-01-09", "pending": [NOTE]}},
+                                  [], PREFS, "en", date(2030, 1, 10))
+    assert state == {"month": "2030-01"}
+    settings = {"smtp_host": "127.0.0.1", "smtp_port": smtp.server_address[1]}
+
+    assert digest.deliver_outbox(settings, today=date(2030, 1, 10))["sent"] == 0
+    assert digest.deliver_outbox(settings, today=date(2030, 1, 11))["sent"] == 1
+    assert "Entry deleted: Kfz." in smtp.messages[0]["data"]
+    assert _draft(outbox)["period"] == "2030-01-11" and _draft(outbox)["lines"] == []
+    assert digest.deliver_outbox(settings, today=date(2030, 1, 12))["sent"] == 0
+
+
+def test_deliver_outbox_reuses_one_connection(outbox, smtp):
+    for i in range(3):
+        digest.enqueue(f"u{i}@example.org", f"s{i}", "body\n.leading dot\n")
+    settings = {"smtp_host": "127.0.0.1", "smtp_port": smtp.server_address[1]}
+
+    assert digest.deliver_outbox(settings) == {"sent": 3, "deferred": 0, "failed": 0}
+    assert smtp.connections == 1
+    assert [m["to"] for m in smtp.messages] == [["<u0@example.org>"], ["<u1@example.org>"], ["<u2@example.org>"]]
+    assert ".leading dot" in smtp.messages[0]["data"]
+    assert digest.outbox_size() == 0
+
+
+def test_deliver_outbox_backs_off_and_gives_up(outbox):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # danach geschlossen -> Verbindung abgelehnt
+    digest.enqueue("anna@example.org", "s", "b")
+    settings = {"smtp_host": "127.0.0.1", "smtp_port": port, "smtp_backoff_s": 10, "smtp_max_attempts": 2}
+
+    assert digest.deliver_outbox(settings, now=1000.0) == {"sent": 0, "deferred": 1, "failed": 0}
+    [msg] = [json.loads(p.read_text()) for p in outbox.glob("*.json")]
+    assert msg["attempts"] == 1 and msg["next_try"] == 1010.0
+
+    assert digest.deliver_outbox(settings, now=1005.0) == {"sent": 0, "deferred": 0, "failed": 0}  # noch nicht fällig
+    assert digest.deliver_outbox(settings, now=1010.0) == {"sent": 0, "deferred": 0, "failed": 1}
+    assert digest.outbox_size() == 0 and len(list((outbox / "failed").glob("*.json"))) == 1
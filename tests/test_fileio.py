@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+import core.fileio as fileio
+
+
+@pytest.fixture(autouse=True)
+def _durability(monkeypatch):
+    monkeypatch.delenv("RP_DURABILITY", raising=False)
+    monkeypatch.delenv("RP_DURABILITY_WINDOW_MS", raising=False)
+    monkeypatch.setattr(fileio, "_durability", dict(fileio._durability))
+    monkeypatch.setattr(fileio, "_GROUP", None)
+
+
+@pytest.mark.parametrize("mode", fileio.DURABILITY_MODES)
+def test_write_atomic_in_every_mode(tmp_path, mode):
+    fileio.configure_durability(mode, group_window_ms=1)
+    before = fileio.write_stats()[mode]["writes"]
+    target = tmp_path / "a.json"
+
+    fileio.write_atomic(target, b"[1]")
+    fileio.write_atomic(target, b"[2]")
+
+    assert target.read_bytes() == b"[2]"
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.endswith(".lock")) == ["a.json"]
+    assert fileio.write_stats()[mode]["writes"] == before + 2
+
+
+def test_group_commit_batches_concurrent_writers(tmp_path):
+    fileio.configure_durability("group", group_window_ms=50)
+    barrier = threading.Barrier(8)
+
+    def _write(i):
+        barrier.wait()
+        fileio.write_atomic(tmp_path / f"u{i}.json", str(i).encode())
+
+    threads = [threading.Thread(target=_write, args=(i,)) for i in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert [(tmp_path / f"u{i}.json").read_bytes() for i in range(8)] == [str(i).encode() for i in range(8)]
+    group = fileio.write_stats()["group"]
+    assert group["batches"] < 8
+    assert group["avg_batch"] > 1
+
+
+def test_environment_overrides_settings(monkeypatch):
+    monkeypatch.setenv("RP_DURABILITY", "none")
+    assert fileio.configure_durability("file+dir") == "none"
+    monkeypatch.delenv("RP_DURABILITY")
+    assert fileio.configure_durability("bogus") == fileio.DURABILITY_DEFAULT
@@ -1,25 +1,146 @@
 from datetime import date
-from unittest.mock import patch
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from core.notify import evaluate_events
-from core.notify_rules import DEFAULT_RULES
-from i18n import get_text
+import core.due_index as due_index
+from core.due_index import DueCalendar, cached_calendar, drop_calendars
+from core.notify import evaluate_events, notify_on_update, render_note, run_event_pass
+from core.notify_rules import DEFAULT_RULES, rules_from_prefs
+from i18n import MONTHS, get_text
+
+
+def _entry(eid, name, due_month, start="2020-01", end=None, cycle="Jährlich", amount=100.0, category=""):
+    return {"id": eid, "name": name, "amount": amount, "cycle": cycle, "custom_cycle": None,
+            "due_month": due_month, "start_date": start, "end_date": end, "category": category}
 
 
 def test_evaluate_events_skips_when_no_next_due():
-    entries = [{"id": "1", "name": "Test"}]
-    with patch("core.notify.months_to_next_occurrence", return_value=None):
-        events = evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 1))
+    entries = [{"id": "1", "name": "Test"}, _entry("2", "Alt", 3, end="2021-12")]
+    events = evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 1))
     assert events == []
 
 
-def test_evaluate_events_generates_translated_title():
-    entries = [{"id": "2", "name": "Foo"}]
-    with patch("core.notify.months_to_next_occurrence", return_value=0):
-        events = evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 1))
-    assert events[0]["title"] == get_text("de", "notif_due_upcoming_title").format(name="Foo")
+def test_evaluate_events_renders_translated_title():
+    entries = [_entry("2", "Foo", 2)]
+    events = evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 20))
+    assert events[0]["params"] == {"due": 2024 * 12 + 1}
+    for lang in ("de", "en"):
+        assert render_note(events[0], lang, "€") == get_text(lang, "notif_due_upcoming_title").format(
+            name="Foo", due=f"{MONTHS[lang][2]} 2024"
+        )
+    assert events[0]["period"] == "2024-02"
+
+
+def test_lead_days_are_exact_days():
+    entries = [_entry("a", "A", 2), _entry("b", "B", 5, end="2024-02")]
+    # 1.2. ist 14 Tage nach dem 18.1., 15 Tage nach dem 17.1.
+    assert [e["type"] for e in evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 18))] == [
+        "due_upcoming", "end_upcoming",
+    ]
+    assert [e["type"] for e in evaluate_events(entries, DEFAULT_RULES, "de", today=date(2024, 1, 17))] == [
+        "end_upcoming",
+    ]
+
+
+def test_due_calendar_advances_passed_entries():
+    cal = DueCalendar([_entry("q", "Q", 1, cycle="Vierteljährlich"), _entry("y", "Y", 6)], "de", date(2024, 1, 1))
+    assert cal.due_within(date(2024, 1, 1), 0) == [(date(2024, 1, 1), "q")]
+    assert cal.due_within(date(2024, 3, 20), 14) == [(date(2024, 4, 1), "q")]
+    assert cal.due_within(date(2024, 5, 20), 14) == [(date(2024, 6, 1), "y")]
+
+
+
+def test_cached_calendar_expires_and_is_dropped_per_key(monkeypatch):
+    loads = []
+    def load():
+        loads.append(1)
+        return [_entry("y", "Y", 6)]
+    key = ("user", "cal-test")
+
+    first = cached_calendar(key, "v1", load, "de", date(2024, 1, 1))
+    assert cached_calendar(key, "v1", load, "de", date(2024, 1, 1)) is first and len(loads) == 1
+
+    monkeypatch.setattr(due_index, "CALENDAR_TTL_S", -1.0)
+    assert cached_calendar(key, "v1", load, "de", date(2024, 1, 1)) is not first and len(loads) == 2
+
+    monkeypatch.setattr(due_index, "CALENDAR_TTL_S", 900.0)
+    cached_calendar(key, "v1", load, "en", date(2024, 1, 1))
+    drop_calendars(key)
+    assert not [k for k in due_index._cache if k[0] == key]
+
+def test_run_event_pass_is_watermarked_and_deduplicated():
+    entries = [_entry("3", "Bar", 2)]
+    calls = []
+
+    def load():
+        calls.append(1)
+        return entries
+
+    first, state = run_event_pass(load, "v1", None, DEFAULT_RULES, "de", today=date(2024, 1, 20), cache_key="t")
+    assert [(e["type"], e["period"]) for e in first] == [("due_upcoming", "2024-02")]
+
+    # gleicher Tag, gleiche Einträge -> nichts laden
+    assert run_event_pass(load, "v1", state, DEFAULT_RULES, "de", today=date(2024, 1, 20), cache_key="t") == ([], None)
+
+    # neuer Tag: ausgewertet (Kalender aus dem Cache), aber nicht doppelt erzeugt
+    again, state = run_event_pass(load, "v1", state, DEFAULT_RULES, "de", today=date(2024, 1, 21), cache_key="t")
+    assert again == [] and state["day"] == "2024-01-21"
+    assert len(calls) == 1
+
+    # Vormonate fallen aus dem Index
+    _none, state = run_event_pass(load, "v2", state, DEFAULT_RULES, "de", today=date(2024, 3, 1), cache_key="t")
+    assert state["seen"] == []
+
+
+def test_user_rules_are_evaluated_in_one_pass():
+    entries = [
+        _entry("a", "Auto", 2, amount=1200.0, category="Versicherungen"),
+        _entry("b", "Buch", 2, amount=20.0),
+        _entry("c", "Handy", 5, end="2024-03", amount=240.0, category="Verträge"),
+    ]
+    rules = rules_from_prefs({
+        "notif_due_upcoming": False,
+        "notif_rules": [
+            {"id": "gross", "kind": "due", "days": 30, "min_amount": 500},
+            {"id": "vertrag", "kind": "end", "days": 60, "category": "verträge"},
+            {"id": "budget", "kind": "budget", "budget": 100},
+            {"id": "kaputt", "kind": "budget"},  # ohne Budget -> ignoriert
+        ],
+    })
+    assert "kaputt" not in rules
+    events = evaluate_events(entries, rules, "de", today=date(2024, 1, 10))
+    assert [(e["type"], e.get("rule_id"), e["entry_id"]) for e in events] == [
+        ("rule_due", "gross", "a"),
+        ("rule_end", "vertrag", "c"),
+        ("rule_budget", "budget", None),  # 100 + 20/12 + 20 > 100
+    ]
+    assert events[2]["period"] == "2024-01"
+
+
+def test_changed_rules_break_the_watermark():
+    entries = [_entry("a", "A", 2)]
+    _new, state = run_event_pass(lambda: entries, "v1", None, rules_from_prefs({"notif_due_upcoming": False}),
+                                 "de", today=date(2024, 1, 20))
+    assert _new == []
+    again, _state = run_event_pass(lambda: entries, "v1", state, rules_from_prefs({}), "de", today=date(2024, 1, 20))
+    assert [e["type"] for e in again] == ["due_upcoming"]
+
 
+def test_notes_are_compact_records_rendered_on_display():
+    old = _entry("x", "Kfz", 3, amount=600.0)
+    new = {**old, "amount": 720.0, "cycle": "Halbjährlich"}
+    notes = []
+    notify_on_update(notes.extend, old, new, "de", {"notif_event_due": False})  # hängt vom heutigen Datum ab
+    assert [n["type"] for n in notes] == ["rate_changed", "amount_changed", "cycle_changed"]
+    assert all("text" not in n for n in notes)
+    assert notes[0]["params"] == {"old": 5000, "new": 12000}
+    assert render_note(notes[1], "en", "$") == "Amount changed for Kfz: 600.00 $ → 720.00 $."
+    assert render_note(notes[2], "de", "€") == "Turnus geändert für Kfz: Jährlich (12 Mon.) → Halbjährlich (6 Mon.)."
+    # Altbestand mit fertigem Text bleibt lesbar
+    assert render_note({"type": "due", "text": "alt"}, "en", "€") == "alt"
+    legacy = {"type": "due_upcoming", "entry_id": "x", "title": "Bald fällig: Kfz",
+              "read": False, "ts": "2024-01-20"}
+    assert render_note(legacy, "en", "€") == "Bald fällig: Kfz"
+    assert render_note({**legacy, "type": "end_upcoming", "title": "Vertrag endet bald: Kfz (2024-03)."}, "de", "€") == "Vertrag endet bald: Kfz (2024-03)."
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def _app():
+    import streamlit as st
+    from ui.overview import overview_table
+
+    if "entries" not in st.session_state:
+        st.session_state["entries"] = [{"id": str(i), "name": f"E{i}", "amount": 10.0} for i in range(3)]
+    entries = st.session_state["entries"]
+    metrics = {e["id"]: {"turnus": "", "next_due": "", "rate": 1.0, "info": None, "percent": 0.5, "saved": 5.0}
+               for e in entries}
+
+    def _delete(e):
+        st.session_state["entries"] = [x for x in entries if x["id"] != e["id"]]
+        st.session_state["deleted"] = st.session_state.get("deleted", []) + [e["id"]]
+        st.rerun()
+
+    overview_table(lambda k: k, entries, metrics, "€", lambda e: None, _delete)
+
+
+def _select(at, row):
+    at.session_state[at.dataframe[0].key] = {"selection": {"rows": [row], "columns": [], "cells": []}}
+    at.run()
+
+
+def test_selection_does_not_survive_a_delete_or_a_changed_view():
+    at = AppTest.from_function(_app)
+    at.run()
+
+    _select(at, 2)
+    assert not at.button(key="ov_delete").disabled
+    at.button(key="ov_delete").click().run()
+    assert not at.exception
+    assert at.session_state["deleted"] == ["2"]
+    assert at.button(key="ov_delete").disabled  # keine Auswahl auf einer nicht mehr existierenden Zeile
+
+    _select(at, 0)
+    at.session_state["entries"] = list(reversed(at.session_state["entries"]))  # z. B. andere Sortierung
+    at.run()
+    assert not at.exception
+    assert at.button(key="ov_delete").disabled
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+
+import core.due_index as due_index
+import core.storage as storage
+from core.crypto import derive_fernet_key
+from core.scheduler import NotificationScheduler
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path)
+    return tmp_path
+
+
+TODAY = date(2030, 1, 10)
+
+
+def _ending_soon(eid):
+    # Ende in 22 Tagen (bezogen auf TODAY), nächste Fälligkeit weit weg
+    return {
+        "id": eid, "name": f"E{eid}", "amount": 120.0, "konto": "Giro", "category": "X",
+        "cycle": "Jährlich", "custom_cycle": None, "due_month": 7,
+        "start_date": "2020-01", "end_date": "2030-02",
+    }
+
+
+def test_scheduler_delivers_once_per_user_with_month_watermark(data_dir):
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+    storage.save_entries("anna", [_ending_soon("1")], fkey)
+    storage.save_entries("ben", [_ending_soon("2")])
+    sched = NotificationScheduler(batch_size=1)
+    sched.register("anna", fkey, "de")
+    sched.register("ben", None, "en")
+
+    assert sched.run_once(TODAY) == 2
+    assert [n["type"] for n in storage.load_notifications("anna", fkey)] == ["end_upcoming"]
+    assert storage.load_notify_state("anna", fkey)["month"] == "2030-01"
+
+    assert sched.run_once(TODAY) == 0
+    assert len(storage.load_notifications("ben")) == 1
+    assert sched.stats()["delivered"] == 2 and sched.stats()["errors"] == 0
+
+
+
+def test_monthly_due_notes_follow_the_pass_day_not_the_clock(data_dir):
+    storage.save_entries("anna", [{
+        "id": "1", "name": "Kfz", "amount": 120.0, "cycle": "Jährlich", "custom_cycle": None,
+        "due_month": 1, "start_date": "2020-03", "end_date": None,
+    }])
+    sched = NotificationScheduler()
+    sched.register("anna", None, "de")
+
+    sched.run_once(TODAY)
+
+    due = [n for n in storage.load_notifications("anna") if n["type"] == "due"]
+    assert [(n["entry_id"], n["effective_month"], n["params"]["due"]) for n in due] == [("1", "2030-01", 2030 * 12)]
+
+def test_monthly_pass_archives_old_read_notes(data_dir):
+    storage.save_notifications("anna", [
+        {"type": "due", "effective_month": "2029-09", "read": True},
+        {"type": "due", "effective_month": "2029-09", "read": False},
+        {"type": "due", "effective_month": "2029-11", "read": True},
+    ])
+    sched = NotificationScheduler(retention_months=3)
+    sched.register("anna", None, "de")
+    sched.run_once(TODAY)
+    assert storage.archive_segments("anna") == ["2029-09"]
+    assert [n["effective_month"] for n in storage.load_notifications("anna")] == ["2029-09", "2029-11"]
+    assert storage.unread_notifications("anna") == 1
+
+
+def test_scheduler_forgets_expired_and_unregistered_keys(data_dir):
+    sched = NotificationScheduler(key_ttl_s=0)
+    sched.register("anna", b"k" * 44, "de")
+    item_key = sched._users["anna"]["key"]
+
+    assert sched.run_once() == 0
+    assert len(sched) == 0
+    assert item_key == bytearray(44)
+
+    sched.key_ttl_s = 60
+    sched.register("ben", b"k" * 44, "de")
+    sched.run_once(TODAY)
+    assert (("user", "ben"), "de") in due_index._cache
+    sched.unregister("ben")
+    assert len(sched) == 0
+    assert (("user", "ben"), "de") not in due_index._cache
@@ -0,0 +1,49 @@
+import core.sessions as sessions
+from core.sessions import SessionKeyStore, client_binding, forwarded_client_ip
+
+
+def test_resume_returns_key_and_requires_matching_binding():
+    store = SessionKeyStore(idle_ttl=60)
+    binding = client_binding("Mozilla/5.0")
+    token = store.create({"username": "anna", "role": "user"}, b"k" * 44, binding)
+
+    assert store.resume(token, client_binding("curl/8")) is None
+    user, key = store.resume(token, binding)
+    assert user["username"] == "anna"
+    assert key == b"k" * 44
+    assert store.resume("unbekannt", binding) is None
+
+
+def test_idle_expiry_and_drop_zero_the_key(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: clock[0])
+    store = SessionKeyStore(idle_ttl=10)
+    token = store.create({"username": "anna"}, b"secret")
+    buf = next(iter(store._items.values()))["key"]
+
+    clock[0] += 11
+    assert store.resume(token) is None
+    assert buf == bytearray(len(b"secret"))
+    assert len(store) == 0
+
+
+def test_drop_user_removes_all_sessions_of_that_user():
+    store = SessionKeyStore()
+    t1 = store.create({"username": "anna"}, b"a")
+    store.create({"username": "anna"}, b"a")
+    t3 = store.create({"username": "bob"}, b"b")
+
+    store.drop_user("anna")
+
+    assert store.resume(t1) is None
+    assert store.resume(t3) == ({"username": "bob"}, b"b")
+
+
+def test_forwarded_client_ip_takes_the_hop_the_trusted_proxy_saw():
+    loopback = ["127.0.0.1", "::1"]
+    spoofed = {"x-forwarded-for": "1.2.3.4, 9.9.9.9", "x-real-ip": "5.6.7.8"}
+
+    assert forwarded_client_ip("203.0.113.7", spoofed, loopback) == "203.0.113.7"
+    assert forwarded_client_ip("127.0.0.1", spoofed, loopback) == "5.6.7.8"
+    assert forwarded_client_ip("127.0.0.1", {"x-forwarded-for": "1.2.3.4, 9.9.9.9"}, loopback) == "9.9.9.9"
+    assert forwarded_client_ip("127.0.0.1", {}, loopback) == "127.0.0.1"
@@ -0,0 +1,198 @@
+import base64
+import json
+import threading
+
+import pytest
+
+import core.storage as storage
+from core.crypto import derive_fernet_key, encrypt_bytes, is_stream_ciphertext
+from core.fileio import ConflictError, run_in_transaction
+from core.notify import notify_on_delete
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_save_entries_is_compare_and_swap(data_dir):
+    storage.save_entries("anna", [{"id": "1"}])
+    entries, etag = storage.load_entries_versioned("anna")
+
+    storage.save_entries("anna", entries + [{"id": "2"}], expected_etag=etag)
+
+    with pytest.raises(ConflictError):
+        storage.save_entries("anna", entries + [{"id": "3"}], expected_etag=etag)
+    assert [e["id"] for e in storage.load_entries("anna")] == ["1", "2"]
+
+
+def test_concurrent_updates_are_not_lost(data_dir):
+    storage.save_entries("anna", [])
+
+    def _add(i):
+        storage.update_entries("anna", lambda es: es + [{"id": str(i)}], retries=50)
+
+    threads = [threading.Thread(target=_add, args=(i,)) for i in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert sorted(e["id"] for e in storage.load_entries("anna")) == [str(i) for i in range(8)]
+
+
+def test_transaction_coalesces_and_reads_its_own_writes(data_dir, monkeypatch):
+    storage.save_entries("anna", [{"id": "1"}])
+    entries_file = storage.user_entries_path("anna")
+    before = entries_file.stat().st_ino
+
+    with storage.transaction() as tx:
+        storage.update_entries("anna", lambda es: es + [{"id": "2"}])
+        storage.update_entries("anna", lambda es: es + [{"id": "3"}])
+        storage.append_notifications("anna", [{"id": "n"}])
+        assert [e["id"] for e in storage.load_entries("anna")] == ["1", "2", "3"]
+        assert entries_file.stat().st_ino == before  # noch nichts geschrieben
+        assert len(tx) == 3  # entries, notifications, notifications.meta
+
+    assert [e["id"] for e in storage.load_entries("anna")] == ["1", "2", "3"]
+    assert storage.load_notifications("anna") == [{"id": "n"}]
+
+
+def test_transaction_rolls_back_on_error_and_on_commit_conflict(data_dir):
+    storage.save_entries("anna", [{"id": "1"}])
+
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.update_entries("anna", lambda es: es + [{"id": "2"}])
+            storage.append_notifications("anna", [{"id": "n"}])
+            raise RuntimeError("boom")
+    assert [e["id"] for e in storage.load_entries("anna")] == ["1"]
+    assert storage.load_notifications("anna") == []
+
+    with pytest.raises(ConflictError):
+        with storage.transaction():
+            storage.append_notifications("anna", [{"id": "n"}])
+            storage.update_entries("anna", lambda es: es + [{"id": "2"}])
+            # anderer Schreiber zwischen Staging und Commit
+            other = threading.Thread(target=storage.save_entries, args=("anna", [{"id": "x"}]))
+            other.start()
+            other.join()
+    assert [e["id"] for e in storage.load_entries("anna")] == ["x"]
+    assert storage.load_notifications("anna") == []
+
+
+
+def test_run_in_transaction_repeats_the_action_after_a_commit_conflict(data_dir):
+    storage.save_entries("anna", [{"id": "1"}])
+    attempts = []
+
+    def _work():
+        attempts.append(1)
+        storage.update_entries("anna", lambda es: es + [{"id": "2"}])
+        storage.append_notifications("anna", [{"id": f"n{len(attempts)}"}])
+        if len(attempts) == 1:
+            other = threading.Thread(target=storage.save_entries, args=("anna", [{"id": "x"}]))
+            other.start()
+            other.join()
+
+    run_in_transaction(_work)
+
+    assert len(attempts) == 2
+    assert [e["id"] for e in storage.load_entries("anna")] == ["x", "2"]
+    assert storage.load_notifications("anna") == [{"id": "n2"}]
+
+    def _always_conflicting():
+        storage.update_entries("anna", lambda es: es + [{"id": "y"}])
+        other = threading.Thread(target=storage.save_entries, args=("anna", [{"id": "z"}]))
+        other.start()
+        other.join()
+
+    with pytest.raises(ConflictError):
+        run_in_transaction(_always_conflicting, retries=1)
+
+def test_notifications_archive_unread_counter_and_paging(data_dir):
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+    storage.append_notifications("anna", [
+        {"id": "a", "effective_month": "2024-01", "read": True},
+        {"id": "b", "effective_month": "2024-02", "read": False},
+        {"id": "c", "effective_month": "2024-02", "read": True},
+        {"id": "d", "effective_month": "2024-04", "read": True},
+    ], fkey)
+    assert storage.unread_notifications("anna") == 1  # ohne Key, aus der Meta-Datei
+
+    assert storage.archive_notifications("anna", "2024-03", fkey) == 2
+    assert [n["id"] for n in storage.load_notifications("anna", fkey)] == ["b", "d"]
+    assert storage.archive_segments("anna") == ["2024-02", "2024-01"]
+
+    pages = storage.iter_notifications("anna", fkey)
+    assert [next(pages)["id"] for _ in range(3)] == ["d", "b", "c"]  # 2024-01 noch nicht entschlüsselt
+    assert [n["id"] for n in pages] == ["a"]
+
+    storage.mark_notifications_read("anna", fkey)
+    assert storage.unread_notifications("anna") == 0
+    storage.user_notifications_meta_path("anna").unlink()
+    assert storage.unread_notifications("anna", fkey) == 0
+
+
+def test_entry_index_filters_and_purges_notifications(data_dir):
+    storage.save_notifications("anna", [
+        {"entry_id": "x", "effective_month": "2024-01", "read": True},
+        {"entry_id": "y", "effective_month": "2024-01", "read": True},
+    ])
+    storage.archive_notifications("anna", "2024-02")
+    storage.append_notifications("anna", [
+        {"entry_id": "x", "effective_month": "2024-05", "read": False},
+        {"entry_id": "z", "effective_month": "2024-05", "read": False},
+    ])
+    meta = storage._read_notes_meta("anna")
+    assert meta["by_entry"] == {"x": [0], "z": [1]} and meta["archived"] == {"x": ["2024-01"], "y": ["2024-01"]}
+    assert [n["effective_month"] for n in storage.iter_notifications("anna", entry_id="x")] == ["2024-05", "2024-01"]
+
+    assert storage.purge_entry_notifications("anna", "x") == 2
+    notify_on_delete(lambda notes: storage.append_notifications("anna", notes), {"id": "x", "name": "Kfz"})
+    assert "x" not in storage._read_notes_meta("anna")["by_entry"]
+    assert list(storage.iter_notifications("anna", entry_id="x")) == []
+    notes = list(storage.iter_notifications("anna"))
+    assert [n["entry_id"] for n in notes] == [None, "z", "y"] and notes[0]["type"] == "entry_deleted"
+    assert storage.unread_notifications("anna") == 2
+
+
+def test_encrypted_export_streams_file_to_file_and_imports(data_dir):
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+    entries = [{"id": str(i), "name": f"Eintrag {i} äöü"} for i in range(2_000)]
+    storage.save_entries("anna", entries, fkey)
+
+    backup = data_dir / "entries_backup.rpenc"
+    with open(backup, "wb") as dst:
+        storage.entries_export_encrypted("anna", dst, fkey)
+    # Stream-Chiffretext wird auch als Benutzerdatei direkt aus der Datei gelesen
+    storage.user_entries_path("bert").write_bytes(backup.read_bytes())
+    assert storage.load_entries("bert", fkey) == entries
+
+    storage.save_entries("anna", [], fkey)
+    with open(backup, "rb") as src:
+        assert storage.entries_import_encrypted("anna", src, True, fkey)
+    assert storage.load_entries("anna", fkey) == entries
+    with open(backup, "rb") as src:
+        assert not storage.entries_import_encrypted("anna", src, True, derive_fernet_key("other", b"s" * 16, 1_000))
+
+
+def test_stored_files_and_backups_are_streams_and_legacy_files_still_load(data_dir):
+    fkey = derive_fernet_key("pw", b"s" * 16, 1_000)
+    storage.save_entries("anna", [{"id": "1"}], fkey)
+    raw = storage.user_entries_path("anna").read_bytes()
+    assert is_stream_ciphertext(raw)
+
+    storage.backup_entries("anna", "test", fkey)
+    backups = storage.user_entries_path("anna").parent / "backups"
+    (backup,) = backups.glob("*_test.json")
+    assert backup.read_bytes() == raw
+
+    legacy = {storage.ENC_MARK: storage.ENC_KIND,
+              "ct": base64.b64encode(encrypt_bytes(json.dumps([{"id": "alt"}]).encode("utf-8"), fkey)).decode("ascii")}
+    storage.user_entries_path("anna").write_text(json.dumps(legacy), encoding="utf-8")
+    assert storage.load_entries("anna", fkey) == [{"id": "alt"}]
+    storage.backup_entries("anna", "legacy", fkey)
+    (upgraded,) = backups.glob("*_legacy.json")
+    assert is_stream_ciphertext(upgraded.read_bytes())
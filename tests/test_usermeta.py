@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import core.usermeta as usermeta
+
+
+@pytest.fixture
+def meta_file(tmp_path, monkeypatch):
+    path = tmp_path / "usermeta.jsonl"
+    monkeypatch.setattr(usermeta, "META_FILE", path)
+    monkeypatch.setattr(usermeta, "_state", {})
+    monkeypatch.setattr(usermeta, "_pending", [])
+    monkeypatch.setattr(usermeta, "_pos", {"ino": None, "offset": 0, "lines": 0})
+    monkeypatch.setattr(usermeta, "FLUSH_INTERVAL_S", 3600.0)
+    yield path
+    usermeta.flush()
+
+
+def _reopen(monkeypatch):
+    # wie ein zweiter Prozess: eigener, leerer Zustand
+    monkeypatch.setattr(usermeta, "_state", {})
+    monkeypatch.setattr(usermeta, "_pos", {"ino": None, "offset": 0, "lines": 0})
+
+
+def test_writes_are_batched_but_visible_immediately(meta_file, monkeypatch):
+    monkeypatch.setattr(usermeta, "FLUSH_MAX", 3)
+    usermeta.touch_login("anna", "2025-01-01 10:00:00")
+    usermeta.update_prefs("anna", {"theme": "dark"})
+
+    assert not meta_file.exists()
+    assert usermeta.get("anna") == {"last_login": "2025-01-01 10:00:00", "login_count": 1, "prefs": {"theme": "dark"}}
+
+    usermeta.touch_login("anna", "2025-01-02 10:00:00")  # Schwelle erreicht -> ein Append
+    assert len(meta_file.read_text(encoding="utf-8").splitlines()) == 3
+
+    _reopen(monkeypatch)
+    assert usermeta.get("anna")["login_count"] == 2
+    assert usermeta.get("anna")["last_login"] == "2025-01-02 10:00:00"
+
+
+def test_replay_is_incremental_and_skips_partial_lines(meta_file, monkeypatch):
+    usermeta.update_prefs("ben", {"language": "en"})
+    usermeta.flush()
+    offset = usermeta._pos["offset"]
+
+    with open(meta_file, "ab") as f:
+        f.write(json.dumps({"u": "ben", "prefs": {"currency": "$"}}).encode() + b"\n{\"u\": \"ben\", ")
+    assert usermeta.get("ben")["prefs"] == {"language": "en", "currency": "$"}
+    assert usermeta._pos["offset"] > offset
+    assert usermeta._pos["offset"] < meta_file.stat().st_size
+
+
+def test_compaction_and_forget(meta_file, monkeypatch):
+    monkeypatch.setattr(usermeta, "COMPACT_LINES", 4)
+    for i in range(5):
+        usermeta.touch_login("carl", f"2025-01-0{i + 1} 08:00:00")
+        usermeta.flush()
+
+    assert len(meta_file.read_text(encoding="utf-8").splitlines()) == 1
+    assert usermeta.get("carl")["login_count"] == 5
+
+    usermeta.forget("carl")
+    usermeta.flush()
+    _reopen(monkeypatch)
+    assert usermeta.snapshot() == {}
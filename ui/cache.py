@@ -0,0 +1,94 @@
+# ui/cache.py
+"""Per-session caches for the derived values of the main tabs.
+
+Every result is keyed by ``owner`` (username, or a per-session id for demo
+workspaces), the entries ``version`` (file etag / demo counter) and whatever
+else it depends on (language, month, filters). Arguments starting with ``_``
+are not part of the key: they are only read on a miss. A write changes the
+version, so stale results are never hit and are dropped with the next store.
+Decrypted entries and everything derived from them live in the session state
+only and go away with it on logout.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import streamlit as st
+
+from core.calc import calculate_monthly_saving_and_progress, calculate_saldo_over_time, get_next_due_text
+from core.cycles import turnus_label
+from core.utils import due_month_sort_value, next_month_start
+
+CACHE_MAX = 64  # abgeleitete Ergebnisse pro Session
+
+
+def _filtered(entries: List[Dict], category: Optional[str], account: Optional[str]) -> List[Dict]:
+    return [e for e in entries
+            if (category is None or e.get("category", "") == category)
+            and (account is None or e.get("konto", "") == account)]
+
+
+_ENTRIES_KEY = "_cache_entries"
+_DERIVED_KEY = "_cache_derived"
+
+
+def entries(owner: str, version: Any, _load: Callable[[], List[Dict]]) -> List[Dict]:
+    """Decrypted entries of ``owner`` at ``version``, cached in this session only (read-only)."""
+    hit = st.session_state.get(_ENTRIES_KEY)
+    if hit is not None and hit[0] == (owner, version):
+        return hit[1]
+    data = _load()
+    st.session_state[_ENTRIES_KEY] = ((owner, version), data)
+    return data
+
+
+def _memo(key: tuple, compute: Callable[[], Any]) -> Any:
+    """Result for ``key = (name, owner, version, ...)`` from this session, computed on a miss (read-only)."""
+    memo = st.session_state.get(_DERIVED_KEY)
+    if memo is None:
+        memo = st.session_state[_DERIVED_KEY] = OrderedDict()
+    if key in memo:
+        memo.move_to_end(key)
+        return memo[key]
+    # Ergebnisse älterer Versionen werden nie mehr getroffen
+    for k in [k for k in memo if k[1:3] != key[1:3]]:
+        del memo[k]
+    value = memo[key] = compute()
+    while len(memo) > CACHE_MAX:
+        memo.popitem(last=False)
+    return value
+
+
+def metrics(owner: str, version: Any, lang: str, month: str, custom_label: str, _entries: List[Dict]) -> Dict[str, Dict]:
+    """Per-entry rate, progress, next due text and sort keys (``month`` = current ``YYYY-MM``)."""
+    return _memo(("metrics", owner, version, lang, month, custom_label), lambda: _metrics(_entries, lang, custom_label))
+
+
+def _metrics(entries: List[Dict], lang: str, custom_label: str) -> Dict[str, Dict]:
+    reference = next_month_start(datetime.now())
+    out = {}
+    for e in entries:
+        rate, percent, saved, info = calculate_monthly_saving_and_progress(e, lang)
+        out[e["id"]] = {
+            "rate": rate, "percent": percent, "saved": saved, "info": info,
+            "next_due": get_next_due_text(e, lang),
+            "turnus": turnus_label(e, lang, custom_label),
+            "due_sort": due_month_sort_value(e, reference, lang),
+        }
+    return out
+
+
+def saldo(owner: str, version: Any, lang: str, month: str, category: Optional[str], account: Optional[str],
+          _entries: List[Dict]):
+    """Saldo DataFrame for the filtered entries."""
+    return _memo(("saldo", owner, version, lang, month, category, account),
+                 lambda: calculate_saldo_over_time(_filtered(_entries, category, account), lang))
+
+
+def saldo_figure(owner: str, version: Any, lang: str, month: str, category: Optional[str], account: Optional[str],
+                 group_by: Optional[str], resolution: Optional[str], currency: str, theme: str, title: str,
+                 _series, _build: Callable):
+    """Plotly figure JSON of the saldo series (``theme`` is part of the key: the template is baked in)."""
+    return _memo(("saldo_figure", owner, version, lang, month, category, account, group_by, resolution, currency,
+                  theme, title), lambda: _build(_series))
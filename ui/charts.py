@@ -1,46 +1,107 @@
-import plotly.express as px
-import plotly.io as pio
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
 import streamlit as st
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional, Union
 
 from i18n import MONTHS, get_text
 
+RESOLUTIONS = ("month", "quarter", "year")
+# ab dieser Punktzahl (längste Serie) wird "automatisch" gröber
+AUTO_QUARTER_POINTS = 240
+AUTO_YEAR_POINTS = 720
+MARKER_MAX_POINTS = 120
 
-def saldo_chart(df_saldo, lang: str, currency: str, title: str, t: Optional[Callable[[str], str]] = None):
-    if df_saldo.empty:
-        fallback = (lambda k: get_text(lang, k))
-        st.info(fallback("chart_no_data"))
-        return
+
+def auto_resolution(points: int) -> str:
+    """Initial resolution for a series of ``points`` months."""
+    if points > AUTO_YEAR_POINTS:
+        return "year"
+    if points > AUTO_QUARTER_POINTS:
+        return "quarter"
+    return "month"
+
+
+def aggregate_saldo(df_saldo: pd.DataFrame, resolution: str, lang: str) -> pd.DataFrame:
+    """Balance at the end of each month/quarter/year with hover labels.
+
+    ``month`` is the last month of each bucket. Labels are built column-wise;
+    the caller's frame is left untouched.
+    """
+    months = df_saldo["month"].astype(str)
+    if resolution == "month":
+        m = pd.to_numeric(months.str[5:7], errors="coerce").fillna(0).astype(int).clip(0, 12)
+        names = np.asarray(MONTHS[lang], dtype=object)[m.to_numpy()]
+        return pd.DataFrame({
+            "month": months.to_numpy(),
+            "saldo": df_saldo["saldo"].to_numpy(dtype=float),
+            "label": names + " " + months.str[:4].to_numpy(dtype=object),
+        })
+    period = pd.PeriodIndex(months, freq="M").asfreq("Q" if resolution == "quarter" else "Y")
+    grouped = pd.DataFrame({"month": months.to_numpy(), "saldo": df_saldo["saldo"].to_numpy(dtype=float)})
+    last = grouped.groupby(period, sort=True).last()
+    years = last.index.year.astype(str).to_numpy(dtype=object)
+    if resolution == "quarter":
+        labels = "Q" + last.index.quarter.astype(str).to_numpy(dtype=object) + " " + years
+    else:
+        labels = years
+    return pd.DataFrame({
+        "month": last["month"].to_numpy(),
+        "saldo": last["saldo"].to_numpy(),
+        "label": labels,
+    })
+
+
+def saldo_figure(
+    df_saldo: Union[pd.DataFrame, Dict[str, pd.DataFrame]],
+    lang: str,
+    currency: str,
+    title: str,
+    t: Optional[Callable[[str], str]] = None,
+    resolution: Optional[str] = None,
+) -> Optional[dict]:
+    """WebGL figure (as plotly JSON dict) of one saldo series or a ``{name: series}`` dict.
+
+    Only ``resolution`` is built (default: :func:`auto_resolution` of the longest
+    series). Returns None when there is nothing to plot.
+    """
     if t is None:
         t = lambda k: get_text(lang, k)
-    def _month_label(x: str) -> str:
-        try:
-            y, m = x.split("-")[:2]
-            return f"{MONTHS[lang][int(m)]} {y}"
-        except Exception:
-            return x
-    df_saldo["Monatsname"] = df_saldo["month"].apply(_month_label)
-    fig = px.line(
-        df_saldo,
-        x="month",
-        y="saldo",
-        markers=True,
-        labels={"saldo": t("chart_balance_label").format(currency=currency)},
-        title=title,
-        hover_name="Monatsname",
-        hover_data={"saldo": ":.2f", "month": False},
-    )
-    fig.update_traces(
-        hovertemplate="<b>%{customdata[0]}</b><br>" + f"{currency} " + "%{y:.2f}<extra></extra>",
-        customdata=df_saldo[["Monatsname"]].values
-    )
+    series = {"": df_saldo} if isinstance(df_saldo, pd.DataFrame) else dict(df_saldo)
+    series = {name: df for name, df in series.items() if not df.empty}
+    if not series:
+        return None
+    if resolution not in RESOLUTIONS:
+        resolution = auto_resolution(max(len(df) for df in series.values()))
+    balance_label = t("chart_balance_label").format(currency=currency)
+    hover = "<b>%{customdata}</b><br>" + f"{currency} " + "%{y:.2f}"
+
+    traces = []
+    for name, df in series.items():
+        agg = aggregate_saldo(df, resolution, lang)
+        traces.append(go.Scattergl(
+            x=agg["month"], y=agg["saldo"], customdata=agg["label"],
+            name=name or balance_label, legendgroup=name, showlegend=len(series) > 1,
+            mode="lines+markers" if len(agg) <= MARKER_MAX_POINTS else "lines",
+            hovertemplate=hover + ("" if name else "<extra></extra>"),
+        ))
+
+    fig = go.Figure(traces)
     fig.update_layout(
+        title=title,
         autosize=True, height=600,
         margin=dict(l=40, r=40, t=80, b=40),
-        yaxis=dict(autorange=True, fixedrange=False),
-        xaxis=dict(autorange=True, fixedrange=False)
+        yaxis=dict(title=balance_label, autorange=True, fixedrange=False),
+        xaxis=dict(autorange=True, fixedrange=False),
     )
-    st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
+    return fig.to_plotly_json()
+
 
-def set_plotly_theme(theme: str):
-    pio.templates.default = "plotly_dark" if theme == "dark" else "plotly"
\ No newline at end of file
+def saldo_chart(df_saldo, lang: str, currency: str, title: str, t: Optional[Callable[[str], str]] = None, fig=None):
+    """Render the saldo chart; pass a prebuilt (e.g. cached) ``fig`` to skip building it."""
+    if fig is None:
+        fig = saldo_figure(df_saldo, lang, currency, title, t)
+    if fig is None:
+        st.info(get_text(lang, "chart_no_data"))
+        return
+    st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
@@ -2,8 +2,9 @@
 from __future__ import annotations
 import json, streamlit as st
 from datetime import datetime
+from itertools import islice
 
-from typing import Callable, Optional, Dict, List
+from typing import BinaryIO, Callable, Iterable, Optional, Dict, List
 from ui.theme import set_streamlit_theme
 
 
@@ -11,25 +12,39 @@ from ui.theme import set_streamlit_theme
 # =========================
 # Notifications (als Seite)
 # =========================
+NOTIF_PAGE_SIZE = 50
+
 def notifications_page(
     t,
-    load_notes_fn: Callable[[], list],
-    save_notes_fn: Callable[[list], None],
+    iter_notes_fn: Callable[[Optional[str]], Iterable[dict]],
+    mark_all_read_fn: Callable[[], None],
+    render_fn: Callable[[dict], str],
     on_back: Callable[[], None],
+    entry_names: Optional[Dict[str, str]] = None,
 ):
     _page_title_with_back(t("notifications_title"), t, on_back)
-    notes = load_notes_fn()
+    entry_id = None
+    if entry_names:
+        options = [None] + sorted(entry_names, key=lambda k: entry_names[k].casefold())
+        entry_id = st.selectbox(
+            t("notif_filter_entry"), options,
+            format_func=lambda k: t("notif_filter_all") if k is None else entry_names[k],
+            key="notif_filter_entry",
+        )
+    limit = st.session_state.setdefault("notif_limit", NOTIF_PAGE_SIZE)
+    # nur so viel lesen (und rendern) wie angezeigt wird; +1 für "mehr laden"
+    notes = list(islice(iter_notes_fn(entry_id), limit + 1))
     if not notes:
         st.info(t("no_notifications"))
     else:
-        for n in notes:
-            ts = n.get("effective_month") or n.get("created_at", "")
-            txt = n.get("text") or n.get("type", "event")
-            st.write(f"• {ts}: {txt}")
+        for n in notes[:limit]:
+            ts = n.get("effective_month") or n.get("period") or n.get("created_at", "")
+            st.write(f"• {ts}: {render_fn(n)}")
+        if len(notes) > limit and st.button(t("notif_load_more")):
+            st.session_state["notif_limit"] = limit + NOTIF_PAGE_SIZE
+            st.rerun()
         if st.button(t("mark_all_read")):
-            for n in notes:
-                n["read"] = True
-            save_notes_fn(notes)
+            mark_all_read_fn()
             st.success(t("saved"))
 
 
@@ -46,6 +61,8 @@ def settings_page(
     current_user_ctx: Optional[dict] = None,
     verify_self_password: Optional[Callable[[str, str, str], bool]] = None,
     on_back: Optional[Callable[[], None]] = None,
+    entries_exporter_enc: Optional[Callable[[], BinaryIO]] = None,
+    entries_importer_enc: Optional[Callable[[object, bool], bool]] = None,
     # Admin-Callbacks für den Tab „Benutzer“
     admin_add_user: Optional[Callable[[str, str, str], None]] = None,
     admin_load_users: Optional[Callable[[], List[dict]]] = None,
@@ -55,6 +72,8 @@ def settings_page(
     admin_set_password: Optional[Callable[[str, str], None]] = None,
     admin_delete_user: Optional[Callable[[str, str], None]] = None,
     admin_wipe_user_data: Optional[Callable[[str], None]] = None,
+    admin_server_stats: Optional[Callable[[], dict]] = None,
+    allow_digest: bool = True,
 ):
     # Seiten-Titel (ohne Back, der Back ist im Bereich "Sprache & Währung" und unten)
     st.title("⚙️ " + t("settings"))
@@ -132,17 +151,36 @@ def settings_page(
             with colB: notif_due = st.checkbox(t("notif_due_label"), value=prefs.get("notif_event_due", True))
             with colC: notif_amount = st.checkbox(t("notif_amount_label"), value=prefs.get("notif_event_amount", True))
             with colD: notif_cycle = st.checkbox(t("notif_cycle_label"), value=prefs.get("notif_event_cycle", True))
+            colE, colF = st.columns(2)
+            with colE: notif_due_soon = st.checkbox(t("notif_due_upcoming_label"), value=prefs.get("notif_due_upcoming", True))
+            with colF: notif_end_soon = st.checkbox(t("notif_end_upcoming_label"), value=prefs.get("notif_end_upcoming", True))
+            digest_prefs = {}
+            if allow_digest:
+                modes = {"off": t("notif_digest_off"), "daily": t("notif_digest_daily"), "weekly": t("notif_digest_weekly")}
+                colG, colH = st.columns(2)
+                with colG:
+                    digest_mode = st.selectbox(
+                        t("notif_digest_label"), list(modes), format_func=modes.get,
+                        index=list(modes).index(prefs.get("notif_digest", "off")) if prefs.get("notif_digest") in modes else 0,
+                    )
+                with colH: digest_email = st.text_input(t("notif_email_label"), value=prefs.get("notif_email", ""))
+                digest_prefs = {"notif_digest": digest_mode, "notif_email": digest_email.strip()}
 
             if st.form_submit_button(t("btn_save"), use_container_width=True):
                 prefs_updater({
+                    **digest_prefs,
                     "notif_monthly_due": notif_monthly,
                     "notif_event_rate": notif_rate,
                     "notif_event_due": notif_due,
                     "notif_event_amount": notif_amount,
                     "notif_event_cycle": notif_cycle,
+                    "notif_due_upcoming": notif_due_soon,
+                    "notif_end_upcoming": notif_end_soon,
                 })
                 st.success(t("saved"))
 
+        _render_notif_rules(t, prefs, prefs_updater)
+
         st.markdown("---")
 
         # Export / Import
@@ -154,16 +192,26 @@ def settings_page(
                 file_name="entries_backup.json",
                 mime="application/json",
             )
+            if entries_exporter_enc:
+                st.download_button(
+                    t("download_entries_enc"),
+                    data=entries_exporter_enc,
+                    file_name="entries_backup.rpenc",
+                    mime="application/octet-stream",
+                )
 
         if entries_importer:
             st.subheader(t("import"))
             with st.form("settings_import_form_user"):
-                file = st.file_uploader("JSON", type=["json"])
+                file = st.file_uploader("JSON", type=["json", "rpenc"] if entries_importer_enc else ["json"])
                 replace = st.checkbox(t("replace_existing"))
                 if st.form_submit_button(t("import_btn")) and file is not None:
                     try:
-                        data = json.load(file)
-                        ok = entries_importer(data, bool(replace))
+                        if entries_importer_enc and file.name.endswith(".rpenc"):
+                            ok = entries_importer_enc(file, bool(replace))
+                        else:
+                            data = json.load(file)
+                            ok = entries_importer(data, bool(replace))
                         if ok:
                             st.success(t("import_ok"))
                         else:
@@ -228,6 +276,9 @@ def settings_page(
                     admin_delete_user,
                     admin_wipe_user_data,
                 )
+                if admin_server_stats:
+                    with st.expander(t("server_stats")):
+                        st.json(admin_server_stats())
                 _bottom_right_back(t, on_back, key="usermanagement_bottom")
 
 
@@ -366,6 +417,43 @@ def _render_user_management(
 # =========================
 # UI‑Hilfsfunktionen
 # =========================
+def _render_notif_rules(t, prefs: Dict, prefs_updater: Callable[[Dict], None]):
+    """Eigene Benachrichtigungsregeln (``prefs["notif_rules"]``) anzeigen, anlegen, löschen."""
+    st.markdown(f"**{t('notif_rules_title')}**")
+    rules: List[Dict] = list(prefs.get("notif_rules") or [])
+    kinds = {"due": t("notif_rule_kind_due"), "end": t("notif_rule_kind_end"), "budget": t("notif_rule_kind_budget")}
+    if not rules:
+        st.caption(t("notif_rules_none"))
+    for r in rules:
+        c1, c2 = st.columns([5, 1])
+        detail = r.get("budget") if r.get("kind") == "budget" else f"{r.get('days')} d"
+        with c1: st.write(f"• {r.get('label') or r.get('id')} — {kinds.get(r.get('kind'), r.get('kind'))} ({detail})")
+        with c2:
+            if st.button("🗑️", key=f"notif_rule_del_{r.get('id')}", help=t("notif_rule_delete")):
+                prefs_updater({"notif_rules": [x for x in rules if x.get("id") != r.get("id")]})
+                st.rerun()
+
+    with st.form("settings_notif_rule_add", clear_on_submit=True):
+        c1, c2 = st.columns(2)
+        with c1:
+            kind = st.selectbox(t("notif_rule_kind"), list(kinds), format_func=kinds.get)
+            label = st.text_input(t("notif_rule_label"))
+            category = st.text_input(t("notif_rule_category"))
+        with c2:
+            days = st.number_input(t("notif_rule_days"), min_value=0, max_value=366, value=14, step=1)
+            min_amount = st.number_input(t("notif_rule_min_amount"), min_value=0.0, value=0.0, step=10.0)
+            budget = st.number_input(t("notif_rule_budget"), min_value=0.0, value=0.0, step=10.0)
+        if st.form_submit_button(t("notif_rule_add"), use_container_width=True):
+            rule = {"id": f"r{int(datetime.now().timestamp() * 1000):x}", "kind": kind, "label": label.strip(),
+                    "days": int(days), "min_amount": float(min_amount) or None,
+                    "category": category.strip() or None}
+            if kind == "budget":
+                rule["budget"] = float(budget)
+            prefs_updater({"notif_rules": rules + [rule]})
+            st.success(t("saved"))
+            st.rerun()
+
+
 def _page_title_with_back(title: str, t, on_back: Optional[Callable[[], None]]):
     c1, c2 = st.columns([6, 1])
     with c1:
@@ -0,0 +1,78 @@
+# ui/overview.py
+"""Table mode of the overview tab for large portfolios.
+
+One ``st.dataframe`` per page instead of five columns, a progress bar and two
+buttons per entry; edit/delete act on the selected row.
+"""
+from __future__ import annotations
+import zlib
+from math import ceil
+from typing import Callable, Dict, List
+
+import pandas as pd
+import streamlit as st
+
+
+def overview_table(
+    t,
+    entries: List[Dict],
+    metrics: Dict[str, Dict],
+    currency: str,
+    on_edit: Callable[[Dict], None],
+    on_delete: Callable[[Dict], None],
+    page_size: int = 50,
+    key: str = "ov",
+) -> None:
+    pages = max(1, ceil(len(entries) / page_size))
+    page = 1
+    if pages > 1:
+        page = int(st.number_input(f"{t('overview_page')} (1–{pages})", min_value=1, max_value=pages,
+                                   value=1, step=1, key=f"{key}_page"))
+    chunk = entries[(page - 1) * page_size: page * page_size]
+    # Die Auswahl gilt genau diesen Zeilen: ändern Löschen, Filter oder Sortierung die
+    # Seite, entsteht ein neues Widget ohne veraltete Auswahl
+    view = zlib.crc32("\x1f".join(str(e.get("id")) for e in chunk).encode("utf-8"))
+    table_key = f"{key}_table_{page}_{view:08x}"
+
+    # nur die aktuelle Seite wird serialisiert
+    m = [metrics[e["id"]] for e in chunk]
+    df = pd.DataFrame({
+        "name": [e.get("name", "") for e in chunk],
+        "category": [e.get("category") or t("uncategorized") for e in chunk],
+        "turnus": [x["turnus"] for x in m],
+        "next_due": [x["next_due"] for x in m],
+        "rate": [x["rate"] for x in m],
+        "progress": [0.0 if x["info"] else 100 * x["percent"] for x in m],
+        "saved": [x["saved"] for x in m],
+        "amount": [float(e.get("amount") or 0) for e in chunk],
+    })
+    money = f"%.2f {currency}"
+    event = st.dataframe(
+        df,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=table_key,
+        column_config={
+            "name": st.column_config.TextColumn(t("sort_name")),
+            "category": st.column_config.TextColumn(t("filter_category")),
+            "turnus": st.column_config.TextColumn(t("turnus")),
+            "next_due": st.column_config.TextColumn(t("next_due")),
+            "rate": st.column_config.NumberColumn(t("monthly_save"), format=money),
+            "progress": st.column_config.ProgressColumn(t("col_progress"), min_value=0, max_value=100, format="%.1f%%"),
+            "saved": st.column_config.NumberColumn(t("col_saved"), format=money),
+            "amount": st.column_config.NumberColumn(t("col_amount"), format=money),
+        },
+    )
+    rows = event.selection.rows if event is not None else []
+    selected = chunk[rows[0]] if rows and 0 <= rows[0] < len(chunk) else None
+    c1, c2, c3 = st.columns([1, 1, 6])
+    if c1.button(t("btn_edit"), key=f"{key}_edit", disabled=selected is None):
+        st.session_state.pop(table_key, None)
+        on_edit(selected)
+    if c2.button(t("btn_delete"), key=f"{key}_delete", disabled=selected is None):
+        st.session_state.pop(table_key, None)
+        on_delete(selected)
+    if selected is None:
+        c3.caption(t("overview_select_hint"))
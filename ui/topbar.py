@@ -1,8 +1,13 @@
 import streamlit as st
-from typing import Callable
+from typing import Callable, Optional
 
 
-def render_topbar(t: Callable[[str], str], unread_count: int, username: str | None) -> None:
+def render_topbar(
+    t: Callable[[str], str],
+    unread_count: int,
+    username: str | None,
+    on_logout: Optional[Callable[[], None]] = None,
+) -> None:
     """Render the application top bar with navigation buttons."""
 
     st.markdown(
@@ -46,5 +51,8 @@ def render_topbar(t: Callable[[str], str], unread_count: int, username: str | No
             with c3:
                 logout_label = f"🚪 {t('logout')}" + (f" ({username})" if username else "")
                 if st.button(logout_label, key="btn_logout_top", use_container_width=True):
-                    st.session_state.clear()
+                    if on_logout:
+                        on_logout()
+                    else:
+                        st.session_state.clear()
                     st.rerun()